@@ -0,0 +1,181 @@
+"""
+Contrôle d'admission et délestage des endpoints de chat.
+
+Au plus CHAT_MAX_CONCURRENCY exécutions de l'agent en parallèle par process;
+au-delà, les requêtes attendent dans une file courte (CHAT_QUEUE_SIZE places,
+CHAT_QUEUE_TIMEOUT_S secondes au plus). File pleine ou attente trop longue:
+réponse 503 immédiate avec Retry-After, plutôt qu'une latence qui s'effondre
+pour tout le monde et des quotas LLM / Tavily dépassés.
+
+Avant la saturation, le service se dégrade par paliers selon la charge
+(requêtes en cours + en attente, rapportées à CHAT_MAX_CONCURRENCY):
+
+- no_web: pas de recherche web Tavily
+- reduced: idem, et moins d'articles par recherche Conso News
+- retrieval_first: une recherche Conso News puis un seul appel LLM, sans
+  boucle d'outils
+
+Le palier est fixé à l'admission et porté par un contextvar (lu par l'agent).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUED,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT,
+    DEGRADED_REQUESTS,
+)
+from resilience import remaining
+
+logger = logging.getLogger(__name__)
+
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "16"))
+CHAT_QUEUE_TIMEOUT_S = float(os.getenv("CHAT_QUEUE_TIMEOUT_S", "5"))
+CHAT_RETRY_AFTER_S = int(os.getenv("CHAT_RETRY_AFTER_S", "5"))
+
+# Paliers de dégradation: appliqués au-delà de ces charges (0 = palier désactivé)
+DEGRADE_NO_WEB_AT = float(os.getenv("DEGRADE_NO_WEB_AT", "0.75"))
+DEGRADE_REDUCED_AT = float(os.getenv("DEGRADE_REDUCED_AT", "1.0"))
+DEGRADE_RETRIEVAL_FIRST_AT = float(os.getenv("DEGRADE_RETRIEVAL_FIRST_AT", "1.5"))
+
+# Articles par recherche Conso News (normal / à partir du palier reduced)
+NEWS_TOP_K = 5
+DEGRADED_NEWS_TOP_K = int(os.getenv("DEGRADED_NEWS_TOP_K", "3"))
+
+# Endpoints qui exécutent l'agent (/ws/chat: admission par message, dans main.py)
+ADMISSION_PATHS = {"/chat", "/chat/simple", "/session/chat"}
+
+OVERLOADED_DETAIL = "Service momentanément surchargé, veuillez réessayer dans quelques secondes."
+
+
+class Degradation:
+    """Palier de service appliqué à une requête."""
+
+    def __init__(self, level: int, name: str, skip_web: bool = False,
+                 top_k: int = NEWS_TOP_K, retrieval_first: bool = False):
+        self.level = level
+        self.name = name
+        self.skip_web = skip_web
+        self.top_k = top_k
+        self.retrieval_first = retrieval_first
+
+    def __repr__(self) -> str:
+        return f"Degradation({self.name})"
+
+
+NORMAL = Degradation(0, "normal")
+LEVELS = (
+    (DEGRADE_NO_WEB_AT, Degradation(1, "no_web", skip_web=True)),
+    (DEGRADE_REDUCED_AT, Degradation(2, "reduced", skip_web=True, top_k=DEGRADED_NEWS_TOP_K)),
+    (DEGRADE_RETRIEVAL_FIRST_AT, Degradation(
+        3, "retrieval_first", skip_web=True, top_k=DEGRADED_NEWS_TOP_K, retrieval_first=True,
+    )),
+)
+
+_current_degradation: ContextVar[Degradation] = ContextVar("degradation", default=NORMAL)
+
+
+def current_degradation() -> Degradation:
+    """Palier de la requête en cours (NORMAL hors requête: warm-up, CLI)."""
+    return _current_degradation.get()
+
+
+class Overloaded(Exception):
+    """Requête refusée: trop de requêtes en cours et en attente."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """Sémaphore + file d'attente bornée (boucle d'événements du process)."""
+
+    def __init__(self, max_concurrency: int = CHAT_MAX_CONCURRENCY, queue_size: int = CHAT_QUEUE_SIZE,
+                 queue_timeout: float = CHAT_QUEUE_TIMEOUT_S):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def load(self) -> float:
+        """Charge relative: (en cours + en attente) / capacité."""
+        return (self.in_flight + self.queued) / self.max_concurrency
+
+    def degradation_for(self, load: float) -> Degradation:
+        degradation = NORMAL
+        for threshold, level in LEVELS:
+            if threshold > 0 and load > threshold:
+                degradation = level
+        return degradation
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str):
+        """Attend une place (ou lève Overloaded) et fixe le palier de la requête."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # queued compte aussi les requêtes en train d'acquérir une place libre
+        if self.in_flight + self.queued >= self.max_concurrency + self.queue_size:
+            ADMISSION_REJECTED.labels(endpoint, "queue_full").inc()
+            raise Overloaded("queue_full", CHAT_RETRY_AFTER_S)
+
+        # Palier selon la charge à l'arrivée, cette requête comprise
+        degradation = self.degradation_for((self.in_flight + self.queued + 1) / self.max_concurrency)
+        started = time.perf_counter()
+        self.queued += 1
+        ADMISSION_QUEUED.set(self.queued)
+        try:
+            # Attente bornée aussi par le budget de la requête (resilience.request_deadline)
+            left = remaining()
+            timeout = self.queue_timeout if left is None else max(0.0, min(self.queue_timeout, left))
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.labels(endpoint, "queue_timeout").inc()
+            raise Overloaded("queue_timeout", CHAT_RETRY_AFTER_S) from None
+        finally:
+            self.queued -= 1
+            ADMISSION_QUEUED.set(self.queued)
+            ADMISSION_WAIT.observe(time.perf_counter() - started)
+
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        DEGRADED_REQUESTS.labels(degradation.name).inc()
+        if degradation is not NORMAL:
+            logger.info(
+                f"🪫 Degraded mode {degradation.name} (load {self.load:.2f})",
+                extra={"endpoint": endpoint, "degradation": degradation.name},
+            )
+        token = _current_degradation.set(degradation)
+        try:
+            yield degradation
+        finally:
+            _current_degradation.reset(token)
+            self.in_flight -= 1
+            ADMISSION_IN_FLIGHT.set(self.in_flight)
+            self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "load": round(self.load, 2),
+            "degradation": self.degradation_for(self.load).name,
+        }
+
+
+admission_gate = AdmissionGate()
@@ -1,13 +1,84 @@
-from typing import TypedDict, Annotated, Sequence
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_core.tools import tool
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import TypedDict, Annotated, Callable, Dict, List, Optional, Sequence
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool, tool
 from langchain_openai import ChatOpenAI
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
-from config import LLM_API_KEY, LLM_BASE_URL, TAVILY_API_KEY, MODEL_NAME, TEMPERATURE, get_system_prompt
-from news_store import search_news
+from config import (
+    AGENT_MAX_CALLS_PER_TOOL,
+    AGENT_MAX_MODEL_TURNS,
+    AGENT_MAX_TOOL_CALLS,
+    AGENT_TOOL_CALL_LIMITS,
+    LLM_API_KEY,
+    LLM_BASE_URL,
+    LLM_STREAM_USAGE,
+    MODEL_NAME,
+    TAVILY_API_KEY,
+    TEMPERATURE,
+    get_final_answer_prompt,
+    get_system_prompt,
+)
+from news_store import embed_query, search_news
+from admission import current_degradation
+from resilience import (
+    LLM_TIMEOUT_S,
+    NEWS_SEARCH_TIMEOUT_S,
+    TAVILY_TIMEOUT_S,
+    DeadlineExceeded,
+    breakers,
+    call_timeout,
+    remaining,
+)
+from metrics import (
+    AGENT_FORCED_FINAL,
+    AGENT_MODEL_TURNS,
+    AGENT_REQUEST_TOOL_CALLS,
+    TOOL_WALL_TIME,
+    metrics_callback,
+    timed,
+)
+from retrieval_cache import current_retrieval_cache, record_lookup
+from tracing import set_attributes, tracing_callback
+from usage import usage_callback
+
+logger = logging.getLogger(__name__)
+
+WEB_SEARCH_UNAVAILABLE = (
+    "⚠️ Recherche web momentanément indisponible. Réponds à partir des articles Conso News "
+    "et signale à l'utilisateur que les toutes dernières actualités n'ont pas pu être vérifiées."
+)
+NEWS_SEARCH_UNAVAILABLE = (
+    "⚠️ Recherche dans les articles Conso News momentanément indisponible. "
+    "Utilise la recherche web et signale-le à l'utilisateur."
+)
+
+
+def find_news(query: str, query_vec: Optional[List[float]], top_k: int, days_back: Optional[int]) -> List[Dict]:
+    """Articles pour la requête: cache de la conversation d'abord, Qdrant si la couverture est insuffisante."""
+    cache = current_retrieval_cache()
+    if cache is not None and len(cache):
+        min_date = None
+        if days_back is not None:
+            min_date = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%dT%H:%M:%S")
+        results = cache.search(query, query_vec, top_k, min_date=min_date)
+        record_lookup("news", results is not None)
+        if results is not None:
+            return results
+    results = search_news(
+        query, top_k=top_k, days_back=days_back, query_vec=query_vec, embed=False, with_vectors=cache is not None,
+    )
+    if cache is not None:
+        cache.add_documents(results, query_vec)
+    return results
 
 
 @tool("search_conso_news")
@@ -21,20 +92,24 @@ def search_conso_news_tool(query: str) -> str:
     Utilise cet outil pour toute question liée aux contenus Conso News.
     APRÈS cette recherche, utilise AUSSI la recherche web Tavily pour compléter avec les dernières actualités.
     """
-    print(f"[search_conso_news_tool] Called with query: {query}")
+    logger.debug("[search_conso_news_tool] Called with query: %s", query)
     output_parts = []
+    # Moins d'articles (et pas de web) quand le service est en mode dégradé
+    degradation = current_degradation()
     
     try:
+        # Un seul embedding pour les deux recherches (et le cache de la conversation)
+        query_vec = embed_query(query)
+        
         # 1. BROAD SEARCH - All articles (historical context)
-        print("[search_conso_news_tool] Starting broad search...")
-        results_all = search_news(query, top_k=5, days_back=None)
-        print(f"[search_conso_news_tool] Broad search returned {len(results_all)} results")
+        results_all = find_news(query, query_vec, top_k=degradation.top_k, days_back=None)
         
         if results_all:
             lines = []
             for i, r in enumerate(results_all, 1):
                 date_str = r['date'][:10] if r['date'] else 'Date inconnue'
-                snippet = r["content"][:300].replace("\n", " ") if r.get("content") else ""
+                # Meilleur passage de l'article (index par passages), sinon début du texte
+                snippet = (r.get("snippet") or r.get("content", "")[:300]).replace("\n", " ")
                 lines.append(
                     f"  [{i}] 📅 {date_str} | Score: {r.get('score', 0):.2f}\n"
                     f"      Titre: {r['title']}\n"
@@ -46,15 +121,17 @@ def search_conso_news_tool(query: str) -> str:
             output_parts.append("📚 ARCHIVES: Aucun article trouvé.")
         
         # 2. RECENT SEARCH - Last 6 months only
-        print("[search_conso_news_tool] Starting recent search (last 180 days)...")
-        results_recent = search_news(query, top_k=5, days_back=180)
-        print(f"[search_conso_news_tool] Recent search returned {len(results_recent)} results")
+        results_recent = find_news(query, query_vec, top_k=degradation.top_k, days_back=180)
+        
+        if not results_all and not results_recent and breakers["qdrant"].is_open:
+            return NEWS_SEARCH_UNAVAILABLE
         
         if results_recent:
             lines = []
             for i, r in enumerate(results_recent, 1):
                 date_str = r['date'][:10] if r['date'] else 'Date inconnue'
-                snippet = r["content"][:300].replace("\n", " ") if r.get("content") else ""
+                # Meilleur passage de l'article (index par passages), sinon début du texte
+                snippet = (r.get("snippet") or r.get("content", "")[:300]).replace("\n", " ")
                 lines.append(
                     f"  [{i}] 📅 {date_str} | Score: {r.get('score', 0):.2f}\n"
                     f"      Titre: {r['title']}\n"
@@ -65,21 +142,115 @@ def search_conso_news_tool(query: str) -> str:
         else:
             output_parts.append("\n🆕 ARTICLES RÉCENTS: Aucun article des 6 derniers mois trouvé.")
         
-        output_parts.append("\n💡 CONSEIL: Utilise aussi la recherche web Tavily pour les toutes dernières actualités.")
+        if not degradation.skip_web:
+            output_parts.append("\n💡 CONSEIL: Utilise aussi la recherche web Tavily pour les toutes dernières actualités.")
         
-        print("[search_conso_news_tool] Search completed successfully")
+        cached = sum(1 for r in results_all + results_recent if r.get("cached"))
+        logger.info(
+            "[search_conso_news_tool] %d archive + %d recent results (%d from conversation cache)",
+            len(results_all), len(results_recent), cached,
+            extra={"query": query, "results_all": len(results_all), "results_recent": len(results_recent),
+                   "cached": cached},
+        )
         return "\n".join(output_parts)
         
     except Exception as e:
-        print(f"[search_conso_news_tool] ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[search_conso_news_tool] Search failed", extra={"query": query})
         return f"❌ Erreur lors de la recherche dans Conso News: {str(e)}"
 
 
+def guarded_web_search(search_tool) -> StructuredTool:
+    """Outil de recherche web sous disjoncteur et budget de temps.
+
+    Même nom et même description que l'outil Tavily; en cas de panne, de
+    timeout ou de disjoncteur ouvert, renvoie un message dégradé au LLM
+    au lieu d'une erreur. Une requête déjà faite dans la conversation est
+    servie depuis son cache (retrieval_cache).
+    """
+    breaker = breakers["tavily"]
+
+    def cached(query: str):
+        """Résultat d'une recherche identique plus tôt dans la conversation."""
+        cache = current_retrieval_cache()
+        if cache is None:
+            return None
+        result = cache.web_lookup(query)
+        record_lookup("web", result is not None)
+        return result
+
+    def remember(query: str, result):
+        cache = current_retrieval_cache()
+        # Liste de résultats seulement (pas les messages d'erreur de l'outil)
+        if cache is not None and isinstance(result, list):
+            cache.add_web(query, result)
+        return result
+
+    def run(query: str) -> str:
+        result = cached(query)
+        if result is not None:
+            return result
+        try:
+            with breaker.guard():
+                # Le client Tavily n'a pas de timeout: appel borné dans un thread,
+                # un dépassement compte comme un échec pour le disjoncteur
+                timeout = call_timeout(TAVILY_TIMEOUT_S)
+                pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="web-search")
+                try:
+                    future = pool.submit(contextvars.copy_context().run, search_tool.invoke, {"query": query})
+                    return remember(query, future.result(timeout=timeout))
+                finally:
+                    pool.shutdown(wait=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Web search unavailable: {type(e).__name__}: {e}", extra={"query": query})
+            return WEB_SEARCH_UNAVAILABLE
+
+    async def arun(query: str) -> str:
+        result = cached(query)
+        if result is not None:
+            return result
+        try:
+            with breaker.guard():
+                return remember(query, await asyncio.wait_for(
+                    search_tool.ainvoke({"query": query}), timeout=call_timeout(TAVILY_TIMEOUT_S)
+                ))
+        except Exception as e:
+            logger.warning(f"⚠️ Web search unavailable: {type(e).__name__}: {e}", extra={"query": query})
+            return WEB_SEARCH_UNAVAILABLE
+
+    return StructuredTool.from_function(
+        func=run, coroutine=arun, name=search_tool.name, description=search_tool.description,
+    )
+
+
 class AgentState(TypedDict):
-    """État de l'agent avec historique des messages."""
+    """État de l'agent: historique des messages et compteurs du budget de la requête."""
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    model_turns: int
+    tool_calls: int
+    tool_counts: Dict[str, int]
+    budget_exhausted: bool
+
+
+# Marge du timeout par outil du noeud "tools" sur le timeout propre de l'outil
+TOOL_TIMEOUT_GRACE_S = 0.5
+
+# Noeuds dont le texte généré est la réponse à l'utilisateur (streaming)
+ANSWER_NODES = {"agent", "final"}
+
+# Supersteps LangGraph: agent + tools par tour, plus la réponse finale
+RECURSION_LIMIT = 2 * AGENT_MAX_MODEL_TURNS + 2
+
+
+def initial_state(messages: list) -> Dict:
+    return {"messages": messages, "model_turns": 0, "tool_calls": 0, "tool_counts": {}, "budget_exhausted": False}
+
+
+def record_run(model_turns: int, tool_calls: int) -> Dict:
+    """Enregistre les itérations d'une requête (métriques + span de la requête)."""
+    AGENT_MODEL_TURNS.observe(model_turns)
+    AGENT_REQUEST_TOOL_CALLS.observe(tool_calls)
+    set_attributes(**{"agent.model_turns": model_turns, "agent.tool_calls": tool_calls})
+    return {"model_turns": model_turns, "tool_calls": tool_calls}
 
 
 class ConsoNewsAgent:
@@ -91,7 +262,9 @@ class ConsoNewsAgent:
             model=MODEL_NAME,
             temperature=TEMPERATURE,
             api_key=LLM_API_KEY,
-            base_url=LLM_BASE_URL
+            base_url=LLM_BASE_URL,
+            timeout=LLM_TIMEOUT_S,
+            stream_usage=LLM_STREAM_USAGE,
         )
         
         # Initialisation de l'outil de recherche web Tavily
@@ -108,14 +281,24 @@ class ConsoNewsAgent:
         )
         
         # Liste des outils disponibles (recherche web + recherche dans les articles Conso News)
-        self.tools = [self.search_tool, search_conso_news_tool]
+        self.tools = [guarded_web_search(self.search_tool), search_conso_news_tool]
+        self.tools_by_name = {t.name: t for t in self.tools}
+        # Timeout propre à chaque outil (borné aussi par le budget de la requête)
+        self.tool_timeouts = {self.search_tool.name: TAVILY_TIMEOUT_S, search_conso_news_tool.name: NEWS_SEARCH_TIMEOUT_S}
         
         # LLM avec outils bindés
         self.llm_with_tools = self.llm.bind_tools(self.tools)
+        # Mode dégradé (admission.py): sans recherche web
+        self.llm_without_web = self.llm.bind_tools([search_conso_news_tool])
         
         # Construction du graph
         self.graph = self._build_graph()
     
+    def _tool_timeout(self, name: str) -> float:
+        # Marge: le timeout interne d'un outil (ex: recherche web) se déclenche
+        # d'abord et compte pour le disjoncteur; celui du noeud est le filet
+        return call_timeout(self.tool_timeouts.get(name, NEWS_SEARCH_TIMEOUT_S) + TOOL_TIMEOUT_GRACE_S)
+    
     def _should_continue(self, state: AgentState):
         """Détermine si l'agent doit continuer ou terminer."""
         messages = state["messages"]
@@ -124,20 +307,215 @@ class ConsoNewsAgent:
         # Si le dernier message a des tool_calls, on continue
         if hasattr(last_message, "tool_calls") and last_message.tool_calls:
             return "tools"
+        # Réponse écartée (elle ne demandait que des outils hors budget)
+        if not isinstance(last_message, AIMessage):
+            return "final"
         # Sinon, on termine
         return END
     
+    def _after_tools(self, state: AgentState):
+        """Retour au modèle, ou réponse finale forcée si le budget est épuisé."""
+        if state.get("budget_exhausted") or state.get("model_turns", 0) + 1 >= AGENT_MAX_MODEL_TURNS:
+            return "final"
+        return "agent"
+    
+    def _apply_tool_budget(self, response: AIMessage, state: AgentState) -> Dict:
+        """Ne garde que les appels d'outils dans le budget (total et par outil)."""
+        total = state.get("tool_calls", 0)
+        counts = dict(state.get("tool_counts") or {})
+        kept = []
+        for call in response.tool_calls:
+            name = call["name"]
+            if total < AGENT_MAX_TOOL_CALLS and counts.get(name, 0) < AGENT_TOOL_CALL_LIMITS.get(
+                name, AGENT_MAX_CALLS_PER_TOOL
+            ):
+                kept.append(call)
+                total += 1
+                counts[name] = counts.get(name, 0) + 1
+        update = {"tool_calls": total, "tool_counts": counts, "budget_exhausted": total >= AGENT_MAX_TOOL_CALLS}
+        if len(kept) < len(response.tool_calls):
+            logger.info(
+                f"🧮 Tool budget: {len(response.tool_calls) - len(kept)} tool call(s) dropped",
+                extra={"tool_calls": total, "tool_counts": counts},
+            )
+            # additional_kwargs garde les appels bruts renvoyés au fournisseur
+            kept_ids = {call["id"] for call in kept}
+            additional_kwargs = dict(response.additional_kwargs)
+            raw_calls = [c for c in additional_kwargs.pop("tool_calls", []) if c.get("id") in kept_ids]
+            if raw_calls:
+                additional_kwargs["tool_calls"] = raw_calls
+            response = response.model_copy(update={"tool_calls": kept, "additional_kwargs": additional_kwargs})
+            update["budget_exhausted"] = True
+            if not kept and not response.content:
+                # Rien à exécuter ni à montrer: la réponse finale forcée la remplace
+                return update
+        update["messages"] = [response]
+        return update
+    
     def _call_model(self, state: AgentState):
         """Appelle le modèle avec le contexte système (avec date/heure UTC actuelle)."""
         messages = state["messages"]
         
         # Ajouter le prompt système au début si ce n'est pas déjà fait
-        # Utilise get_system_prompt() pour avoir la date/heure actuelle
+        # get_system_prompt() est en cache: instructions fixes en tête (préfixe
+        # cachable côté fournisseur), date/heure UTC à l'heure près à la fin
         if not messages or not isinstance(messages[0], SystemMessage):
             messages = [SystemMessage(content=get_system_prompt())] + list(messages)
         
-        response = self.llm_with_tools.invoke(messages)
-        return {"messages": [response]}
+        skip_web = current_degradation().skip_web or breakers["tavily"].is_open
+        llm = self.llm_without_web if skip_web else self.llm_with_tools
+        # Le span de l'appel (avec tokens) est créé par tracing_callback
+        with breakers["llm"].guard(), timed("llm", traced=False):
+            response = llm.invoke(messages, timeout=call_timeout(LLM_TIMEOUT_S))
+        update = {"messages": [response], "model_turns": state.get("model_turns", 0) + 1}
+        if response.tool_calls:
+            update.update(self._apply_tool_budget(response, state))
+        return update
+    
+    def _tool_result(self, call: Dict, content, status: str, started: float) -> ToolMessage:
+        """ToolMessage d'un appel (résultat, timeout ou erreur) + temps d'attente."""
+        TOOL_WALL_TIME.labels(call["name"], status).observe(time.perf_counter() - started)
+        if status == "timeout":
+            content = (
+                f"⏱️ L'outil {call['name']} n'a pas répondu à temps. Réponds avec les autres "
+                "résultats disponibles et signale-le à l'utilisateur si nécessaire."
+            )
+        elif status == "error":
+            content = f"❌ Erreur de l'outil {call['name']}: {content}"
+        elif not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        return ToolMessage(
+            content=content,
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="success" if status == "ok" else "error",
+        )
+    
+    def _call_tools(self, state: AgentState, config: dict):
+        """Exécute les appels d'outils du dernier message en parallèle, chacun avec son timeout.
+        
+        Un outil lent ou en erreur ne retarde ni ne fait échouer les autres:
+        son résultat est remplacé par un message de timeout ou d'erreur.
+        """
+        calls = state["messages"][-1].tool_calls
+        started = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="tool")
+        try:
+            futures = []
+            for call in calls:
+                tool = self.tools_by_name.get(call["name"])
+                if tool is None:
+                    futures.append(None)
+                    continue
+                # Chaque thread reprend le contexte de la requête (budget, usage, trace)
+                context = contextvars.copy_context()
+                futures.append(pool.submit(context.run, tool.invoke, call["args"], config))
+            messages = []
+            for call, future in zip(calls, futures):
+                if future is None:
+                    messages.append(self._tool_result(call, "outil inconnu", "error", started))
+                    continue
+                try:
+                    timeout = self._tool_timeout(call["name"])
+                    # Timeout compté depuis le lancement commun des outils
+                    result = future.result(timeout=max(0.0, timeout - (time.perf_counter() - started)))
+                    messages.append(self._tool_result(call, result, "ok", started))
+                except TimeoutError:
+                    messages.append(self._tool_result(call, None, "timeout", started))
+                except Exception as e:
+                    messages.append(self._tool_result(call, e, "error", started))
+        finally:
+            # Un outil en timeout termine en arrière-plan, sans bloquer la réponse
+            pool.shutdown(wait=False)
+        return {"messages": messages}
+    
+    async def _acall_tools(self, state: AgentState, config: dict):
+        """Version asynchrone de _call_tools."""
+        started = time.perf_counter()
+        
+        async def run(call: Dict) -> ToolMessage:
+            tool = self.tools_by_name.get(call["name"])
+            if tool is None:
+                return self._tool_result(call, "outil inconnu", "error", started)
+            try:
+                timeout = self._tool_timeout(call["name"])
+                result = await asyncio.wait_for(tool.ainvoke(call["args"], config=config), timeout=timeout)
+                return self._tool_result(call, result, "ok", started)
+            except TimeoutError:
+                return self._tool_result(call, None, "timeout", started)
+            except Exception as e:
+                return self._tool_result(call, e, "error", started)
+        
+        messages = await asyncio.gather(*(run(call) for call in state["messages"][-1].tool_calls))
+        return {"messages": list(messages)}
+    
+    def _final_answer(self, state: AgentState):
+        """Réponse finale forcée, sans outils, quand le budget de la requête est épuisé."""
+        reason = "tool_calls" if state.get("budget_exhausted") else "model_turns"
+        AGENT_FORCED_FINAL.labels(reason).inc()
+        messages = [SystemMessage(content=get_final_answer_prompt())] + [
+            m for m in state["messages"] if not isinstance(m, SystemMessage)
+        ]
+        with breakers["llm"].guard(), timed("llm", traced=False):
+            response = self.llm.invoke(messages, timeout=call_timeout(LLM_TIMEOUT_S))
+        return {"messages": [response], "model_turns": state.get("model_turns", 0) + 1}
+    
+    def _retrieval_messages(self, message: str, chat_history: list, context: str) -> list:
+        """Recherche Conso News faite d'office, présentée au LLM comme un appel d'outil."""
+        return [
+            SystemMessage(content=get_system_prompt()),
+            *(chat_history or []),
+            HumanMessage(content=message),
+            AIMessage(content="", tool_calls=[
+                {"name": search_conso_news_tool.name, "args": {"query": message}, "id": "retrieval_first"},
+            ]),
+            ToolMessage(content=context, tool_call_id="retrieval_first"),
+        ]
+    
+    def _retrieval_first(self, message: str, chat_history: list, config: dict):
+        """Mode dégradé retrieval_first: une recherche puis un seul appel LLM, sans outils."""
+        context = search_conso_news_tool.invoke({"query": message}, config=config)
+        messages = self._retrieval_messages(message, chat_history, context)
+        with breakers["llm"].guard(), timed("llm", traced=False):
+            response = self.llm.invoke(messages, config=config, timeout=call_timeout(LLM_TIMEOUT_S))
+        return {"response": response.content, "chat_history": messages[1:] + [response], **record_run(1, 1)}
+    
+    async def _aretrieval_first(self, message: str, chat_history: list, config: dict,
+                                on_token: Optional[Callable[[str], None]] = None):
+        """Version asynchrone de _retrieval_first."""
+        # Outil synchrone (Qdrant, embeddings): exécuté dans un thread par LangChain
+        context = await search_conso_news_tool.ainvoke({"query": message}, config=config)
+        messages = self._retrieval_messages(message, chat_history, context)
+        with breakers["llm"].guard(), timed("llm", traced=False):
+            if on_token is None:
+                response = await self.llm.ainvoke(messages, config=config, timeout=call_timeout(LLM_TIMEOUT_S))
+            else:
+                response = None
+                async for chunk in self.llm.astream(messages, config=config, timeout=call_timeout(LLM_TIMEOUT_S)):
+                    if isinstance(chunk.content, str) and chunk.content:
+                        on_token(chunk.content)
+                    response = chunk if response is None else response + chunk
+        return {"response": response.content, "chat_history": messages[1:] + [response], **record_run(1, 1)}
+    
+    async def _astream_graph(self, messages: list, config: dict, on_token: Callable[[str], None]) -> Dict:
+        """Exécute le graph en transmettant les tokens des noeuds de réponse; renvoie l'état final."""
+        result = None
+        async for mode, chunk in self.graph.astream(
+            initial_state(messages), config=config, stream_mode=["messages", "values"],
+        ):
+            if mode == "values":
+                result = chunk
+                continue
+            message_chunk, metadata = chunk
+            # Les tours avec appels d'outils n'ont en général pas de texte
+            if (
+                isinstance(message_chunk, AIMessageChunk)
+                and isinstance(message_chunk.content, str)
+                and message_chunk.content
+                and metadata.get("langgraph_node") in ANSWER_NODES
+            ):
+                on_token(message_chunk.content)
+        return result
     
     def _build_graph(self):
         """Construit le graph LangGraph."""
@@ -145,7 +523,8 @@ class ConsoNewsAgent:
         
         # Définir les noeuds
         workflow.add_node("agent", self._call_model)
-        workflow.add_node("tools", ToolNode(self.tools))
+        workflow.add_node("tools", RunnableLambda(self._call_tools, afunc=self._acall_tools, name="tools"))
+        workflow.add_node("final", self._final_answer)
         
         # Définir le point d'entrée
         workflow.set_entry_point("agent")
@@ -156,12 +535,14 @@ class ConsoNewsAgent:
             self._should_continue,
             {
                 "tools": "tools",
+                "final": "final",
                 END: END
             }
         )
         
-        # Après les outils, retourner à l'agent
-        workflow.add_edge("tools", "agent")
+        # Après les outils, retourner à l'agent (ou réponse finale si budget épuisé)
+        workflow.add_conditional_edges("tools", self._after_tools, {"agent": "agent", "final": "final"})
+        workflow.add_edge("final", END)
         
         return workflow.compile()
     
@@ -176,6 +557,13 @@ class ConsoNewsAgent:
         Returns:
             La réponse de l'agent et l'historique mis à jour
         """
+        config = {
+            "callbacks": [metrics_callback, tracing_callback, usage_callback],
+            "recursion_limit": RECURSION_LIMIT,
+        }
+        if current_degradation().retrieval_first:
+            return self._retrieval_first(message, chat_history, config)
+        
         # Préparer les messages
         if chat_history is None:
             messages = [HumanMessage(content=message)]
@@ -183,7 +571,7 @@ class ConsoNewsAgent:
             messages = chat_history + [HumanMessage(content=message)]
         
         # Exécuter le graph
-        result = self.graph.invoke({"messages": messages})
+        result = self.graph.invoke(initial_state(messages), config=config)
         
         # Extraire la réponse
         response_message = result["messages"][-1]
@@ -191,11 +579,40 @@ class ConsoNewsAgent:
         
         return {
             "response": response_content,
-            "chat_history": result["messages"]
+            "chat_history": result["messages"],
+            **record_run(result["model_turns"], result["tool_calls"]),
+        }
+    
+    async def achat(self, message: str, chat_history: list = None,
+                    on_token: Optional[Callable[[str], None]] = None):
+        """
+        Version asynchrone de la fonction chat.
+        
+        L'exécution complète est bornée par le budget de la requête
+        (resilience.request_deadline): DeadlineExceeded au-delà.
+        
+        on_token reçoit les morceaux de la réponse au fil de leur génération
+        (LLM en streaming); la réponse complète reste dans le résultat.
+        """
+        config = {
+            "callbacks": [metrics_callback, tracing_callback, usage_callback],
+            "recursion_limit": RECURSION_LIMIT,
         }
+        task = asyncio.ensure_future(self._arun(message, chat_history, config, on_token))
+        done, _ = await asyncio.wait({task}, timeout=remaining())
+        if task in done:
+            return task.result()
+        # Pas d'attente de l'annulation: les noeuds synchrones en cours dans un
+        # thread (outils, LLM) finissent en arrière-plan, bornés par leurs timeouts
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise DeadlineExceeded("request deadline exceeded")
     
-    async def achat(self, message: str, chat_history: list = None):
-        """Version asynchrone de la fonction chat."""
+    async def _arun(self, message: str, chat_history: list, config: dict,
+                    on_token: Optional[Callable[[str], None]] = None):
+        if current_degradation().retrieval_first:
+            return await self._aretrieval_first(message, chat_history, config, on_token)
+        
         # Préparer les messages
         if chat_history is None:
             messages = [HumanMessage(content=message)]
@@ -203,7 +620,10 @@ class ConsoNewsAgent:
             messages = chat_history + [HumanMessage(content=message)]
         
         # Exécuter le graph de manière asynchrone
-        result = await self.graph.ainvoke({"messages": messages})
+        if on_token is None:
+            result = await self.graph.ainvoke(initial_state(messages), config=config)
+        else:
+            result = await self._astream_graph(messages, config, on_token)
         
         # Extraire la réponse
         response_message = result["messages"][-1]
@@ -211,5 +631,6 @@ class ConsoNewsAgent:
         
         return {
             "response": response_content,
-            "chat_history": result["messages"]
+            "chat_history": result["messages"],
+            **record_run(result["model_turns"], result["tool_calls"]),
         }
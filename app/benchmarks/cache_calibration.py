@@ -0,0 +1,206 @@
+"""
+Calibration of the conversation cache relevance floor (RETRIEVAL_CACHE_MIN_COSINE).
+
+The floor depends on the embedding model: most query/article cosines fall in
+a narrow band, so it must be measured with the real model, not with the hash
+embeddings of benchmarks.fakes. For each conversation, the first query runs
+against the configured Qdrant as in search_conso_news and its results fill a
+ConversationCache. Each follow-up (same topic) and topic change is then
+embedded and compared with the cached articles. The report gives:
+
+- the best cosine between each query and the cached articles, per kind
+- how often the cache would answer (RETRIEVAL_CACHE_MIN_HITS relevant
+  articles) at the current floor (if set) and at the suggested one
+
+A topic change answered from the cache is a stale answer, while a follow-up
+missing the cache only costs a Qdrant query. The suggested floor is the lowest
+that keeps every topic change out of the cache.
+
+Queries are tool queries as the agent writes them for search_conso_news
+(follow-ups already rewritten with their context), not raw user messages.
+A JSONL file of {"query", "follow_ups": [...], "topic_changes": [...]}
+replaces the built-in conversations.
+
+    cd app
+    python -m benchmarks.cache_calibration
+    python -m benchmarks.cache_calibration --conversations logged_queries.jsonl
+
+Uses the embedding API (one call per query) and the configured Qdrant.
+"""
+
+import argparse
+import json
+import math
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from benchmarks.load_test import RESULTS_DIR, git_revision, percentile
+
+CONVERSATIONS = [
+    {
+        "query": "prix de l'huile de table au Maroc",
+        "follow_ups": ["évolution du prix de l'huile de table depuis un an", "prix de l'huile de table à Casablanca"],
+        "topic_changes": ["tarifs des forfaits internet fibre", "prix des billets d'avion pour Marrakech"],
+    },
+    {
+        "query": "hausse du prix du carburant au Maroc",
+        "follow_ups": ["prix du gasoil et de l'essence à la pompe", "raisons de la hausse des prix des carburants"],
+        "topic_changes": ["promotions ramadan supermarchés", "règles ONSSA étiquetage des produits alimentaires"],
+    },
+    {
+        "query": "promotions dans les supermarchés pendant le ramadan",
+        "follow_ups": ["prix des produits alimentaires pendant le ramadan", "offres ramadan Marjane Carrefour"],
+        "topic_changes": ["crédit automobile taux d'intérêt", "prix du carburant à la pompe"],
+    },
+    {
+        "query": "contrôles de l'ONSSA sur l'étiquetage des produits",
+        "follow_ups": ["amendes pour étiquetage non conforme ONSSA", "nouvelle loi sur l'étiquetage alimentaire"],
+        "topic_changes": ["prix des tomates à Rabat", "réservations d'hôtels à Agadir"],
+    },
+    {
+        "query": "prix des voitures électriques importées",
+        "follow_ups": ["droits de douane sur les voitures électriques", "aides à l'achat de voitures électriques"],
+        "topic_changes": ["tarifs des forfaits mobiles 4G", "prix du sucre et de la farine"],
+    },
+    {
+        "query": "tarifs des forfaits internet et de la fibre",
+        "follow_ups": ["baisse des prix de la fibre optique", "comparaison des offres internet des opérateurs"],
+        "topic_changes": ["prix de la viande pendant l'Aïd", "assurance automobile obligatoire"],
+    },
+]
+
+
+def load_conversations(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def relevant_hits(scores: List[Tuple[float, float]], floor: float, min_similarity: float) -> int:
+    """Cached articles the cache would consider relevant (same rule as ConversationCache.search)."""
+    return sum(1 for cosine, anchor in scores if cosine >= max(floor, min_similarity * anchor))
+
+
+def required_floor(scores: List[Tuple[float, float]], min_similarity: float, min_hits: int) -> float:
+    """Lowest floor keeping this query out of the cache (0 if it already is)."""
+    eligible = sorted((c for c, anchor in scores if c >= min_similarity * anchor), reverse=True)
+    if len(eligible) < min_hits:
+        return 0.0
+    return math.ceil((eligible[min_hits - 1] + 1e-6) * 100) / 100
+
+
+def cosine_summary(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        **{f"p{p}": round(percentile(values, p), 3) if values else None for p in (10, 50, 90)},
+        "max": round(values[-1], 3) if values else None,
+    }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Calibrate RETRIEVAL_CACHE_MIN_COSINE on real embeddings")
+    parser.add_argument("--conversations", help="JSONL of {query, follow_ups, topic_changes}")
+    parser.add_argument("--top-k", type=int, default=5, help="articles per search (search_conso_news: 5)")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+    import news_store
+    from retrieval_cache import (
+        RETRIEVAL_CACHE_MIN_COSINE,
+        RETRIEVAL_CACHE_MIN_HITS,
+        RETRIEVAL_CACHE_MIN_SIMILARITY,
+        ConversationCache,
+    )
+
+    conversations = load_conversations(args.conversations) if args.conversations else CONVERSATIONS
+    min_hits = min(RETRIEVAL_CACHE_MIN_HITS, args.top_k)
+    # Floor not set: the cache never answers (embeddings enabled)
+    current_floor = math.inf if RETRIEVAL_CACHE_MIN_COSINE is None else RETRIEVAL_CACHE_MIN_COSINE
+
+    def embed(query: str) -> List[float]:
+        vec = news_store.embed_query(query)
+        if vec is None:
+            raise SystemExit("Embeddings unavailable: calibration needs the real embedding model")
+        return vec
+
+    rows: List[Dict] = []
+    for conversation in conversations:
+        query_vec = embed(conversation["query"])
+        results = news_store.search_news(
+            conversation["query"], top_k=args.top_k, query_vec=query_vec, embed=False, with_vectors=True,
+        )
+        cache = ConversationCache()
+        cache.add_documents(results, query_vec)
+        for kind in ("follow_ups", "topic_changes"):
+            for query in conversation.get(kind, []):
+                scores = cache.similarities(embed(query))
+                rows.append({"kind": kind, "query": query, "scores": scores})
+
+    suggested = max(
+        (required_floor(r["scores"], RETRIEVAL_CACHE_MIN_SIMILARITY, min_hits)
+         for r in rows if r["kind"] == "topic_changes"),
+        default=0.0,
+    )
+
+    def cache_rate(kind: str, floor: float) -> float:
+        selected = [r for r in rows if r["kind"] == kind]
+        served = sum(
+            1 for r in selected
+            if relevant_hits(r["scores"], floor, RETRIEVAL_CACHE_MIN_SIMILARITY) >= min_hits
+        )
+        return round(served / len(selected), 3) if selected else 0.0
+
+    result = {
+        "benchmark": "cache_calibration",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": args.label,
+        "git": git_revision(),
+        "config": {
+            "conversations": args.conversations or "built-in",
+            "top_k": args.top_k,
+            "min_hits": min_hits,
+            "min_similarity": RETRIEVAL_CACHE_MIN_SIMILARITY,
+            "min_cosine": RETRIEVAL_CACHE_MIN_COSINE,
+        },
+        "summary": {
+            "best_cosine": {
+                kind: cosine_summary([max((c for c, _ in r["scores"]), default=0.0)
+                                      for r in rows if r["kind"] == kind])
+                for kind in ("follow_ups", "topic_changes")
+            },
+            "suggested_min_cosine": suggested,
+            "served_from_cache": {
+                "current": {kind: cache_rate(kind, current_floor)
+                            for kind in ("follow_ups", "topic_changes")},
+                "suggested": {kind: cache_rate(kind, suggested) for kind in ("follow_ups", "topic_changes")},
+            },
+        },
+        "queries": [
+            {"kind": r["kind"], "query": r["query"],
+             "cosines": sorted((round(c, 3) for c, _ in r["scores"]), reverse=True)}
+            for r in rows
+        ],
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(args.out, f"cache-calibration-{stamp}-{(result['git']['commit'] or 'nogit')[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    summary = result["summary"]
+    for kind, stats in summary["best_cosine"].items():
+        print(f"{kind:14s} best cosine p10={stats['p10']} p50={stats['p50']} p90={stats['p90']} max={stats['max']}")
+    print(f"served from cache at RETRIEVAL_CACHE_MIN_COSINE={RETRIEVAL_CACHE_MIN_COSINE}: "
+          f"{summary['served_from_cache']['current']}")
+    print(f"suggested RETRIEVAL_CACHE_MIN_COSINE={suggested}: {summary['served_from_cache']['suggested']}")
+    print(f"📄 {path}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
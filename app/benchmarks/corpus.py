@@ -0,0 +1,194 @@
+"""
+Synthetic corpus generator: WordPress-shaped posts with French text.
+
+Posts look like /wp-json/wp/v2/posts items (id, date, link, title.rendered,
+content.rendered as HTML with entities), dated over several years. Words
+follow a Zipf distribution over a large pseudo-French vocabulary so index
+sizes, posting-list lengths and BM25 statistics resemble a real archive.
+Generation is streamed: 1M posts never need to fit in memory.
+
+    python -m benchmarks.corpus --count 100000 --out posts_batches
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+from typing import Dict, Iterator, List, Tuple
+
+TOPICS = [
+    ("prix", ["huile", "sucre", "farine", "carburant", "lait", "tomates", "viande", "pain"]),
+    ("consommation", ["ramadan", "soldes", "marché", "supermarché", "hanout", "promotion"]),
+    ("tourisme", ["marrakech", "agadir", "hôtels", "vols", "été", "réservations"]),
+    ("réglementation", ["onssa", "loi", "contrôle", "inspection", "amende", "étiquetage"]),
+    ("automobile", ["voitures", "crédit", "assurance", "importations", "électriques"]),
+    ("télécoms", ["internet", "forfaits", "fibre", "opérateurs", "tarifs", "4g"]),
+]
+CITIES = ["Casablanca", "Rabat", "Tanger", "Fès", "Marrakech", "Agadir", "Oujda", "Meknès"]
+FILLER = (
+    "Selon les professionnels du secteur, la tendance devrait se confirmer dans les prochaines "
+    "semaines. Les associations de consommateurs appellent à davantage de transparence et à un "
+    "suivi régulier des prix pratiqués. Les autorités annoncent des contrôles renforcés."
+).split()
+_COMMON = (
+    "le la les de des du un une et à en pour sur dans par avec au aux est sont a ont plus ce cette "
+    "qui que ne pas se son sa ses leur leurs entre selon après avant depuis contre sans sous"
+).split()
+_SYLLABLES = [
+    "ma", "ro", "ca", "ti", "on", "ment", "pri", "con", "sa", "ble", "té", "ré", "dé", "ve", "nou",
+    "ar", "che", "gou", "lan", "mi", "nis", "ter", "pro", "duc", "teur", "mar", "ché", "ten", "dance",
+    "é", "co", "no", "mie", "fi", "nan", "ces", "pu", "bli", "que", "so", "cial", "ex", "port", "im",
+]
+_ENTITIES = ["&nbsp;", "&rsquo;", "&laquo;&nbsp;", "&nbsp;&raquo;", "&#8211;", "&amp;"]
+
+
+class _Vocabulary:
+    """Pseudo-French vocabulary sampled with a Zipf law (rank^-s)."""
+
+    def __init__(self, size: int, seed: int, exponent: float = 1.07):
+        rng = random.Random(seed)
+        words = list(_COMMON)
+        seen = set(words)
+        while len(words) < size:
+            word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.choice((2, 2, 3, 3, 4))))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        self.words = words
+        weights = [1.0 / (rank ** exponent) for rank in range(1, size + 1)]
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def sample(self, rng: random.Random, count: int) -> List[str]:
+        return rng.choices(self.words, cum_weights=self.cum_weights, k=count)
+
+
+def _article_length(rng: random.Random) -> int:
+    """Lognormal article length in words (median ~320, long tail up to 2500)."""
+    return int(min(2500, max(60, rng.lognormvariate(math.log(320), 0.55))))
+
+
+def _article(rng: random.Random, vocab: _Vocabulary, post_id: int, now: float,
+             years: float) -> Tuple[str, List[str], str]:
+    """(title, paragraphs, ISO date) for one article."""
+    topic, keywords = TOPICS[rng.randrange(len(TOPICS))]
+    picked = rng.sample(keywords, k=min(3, len(keywords)))
+    city = rng.choice(CITIES)
+    title = f"{topic.capitalize()}: {picked[0]} à {city}, {picked[1]} en hausse de {rng.randint(2, 40)}%"
+
+    remaining = _article_length(rng)
+    paragraphs = []
+    while remaining > 0:
+        sentences = []
+        for _ in range(rng.randint(2, 5)):
+            length = rng.randint(8, 25)
+            words = vocab.sample(rng, length)
+            # Topic keywords, places and prices appear in most sentences
+            for _ in range(rng.randint(1, 3)):
+                words.insert(rng.randrange(len(words)), rng.choice(picked + [topic, city]))
+            if rng.random() < 0.3:
+                words.append(f"{rng.randint(1, 999)},{rng.randint(0, 99):02d} DH")
+            sentences.append(" ".join(words).capitalize() + ".")
+            remaining -= len(words)
+        paragraphs.append(" ".join(sentences))
+
+    published = time.gmtime(now - rng.uniform(0, years * 365 * 86400))
+    return title, paragraphs, time.strftime("%Y-%m-%dT%H:%M:%S", published)
+
+
+def _to_html(rng: random.Random, paragraphs: List[str], post_id: int) -> str:
+    """WordPress-like HTML: paragraphs, headings, links, emphasis and entities."""
+    parts = []
+    for index, paragraph in enumerate(paragraphs):
+        if index and rng.random() < 0.15:
+            parts.append(f"<h2>{' '.join(paragraph.split()[:6])}</h2>")
+        words = paragraph.split()
+        if len(words) > 8 and rng.random() < 0.4:
+            i = rng.randrange(len(words) - 3)
+            words[i] = f"<strong>{words[i]}</strong>"
+        if len(words) > 8 and rng.random() < 0.2:
+            i = rng.randrange(len(words) - 3)
+            words[i] = f'<a href="https://consonews.ma/?p={rng.randint(1, post_id + 1)}">{words[i]}</a>'
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words)), rng.choice(_ENTITIES))
+        parts.append(f"<p>{' '.join(words)}</p>")
+    return "\n".join(parts)
+
+
+def wordpress_posts(count: int, seed: int = 42, start_id: int = 1, years: float = 8.0,
+                    vocabulary_size: int = 50000, empty_ratio: float = 0.005) -> Iterator[Dict]:
+    """Yield `count` WordPress REST API posts (ids start_id, start_id + 1, ...)."""
+    rng = random.Random(seed + start_id)
+    vocab = _Vocabulary(vocabulary_size, seed)
+    now = time.time()
+    for post_id in range(start_id, start_id + count):
+        title, paragraphs, date = _article(rng, vocab, post_id, now, years)
+        # A few posts have no text (galleries, embeds): the indexer must skip them
+        content = "" if rng.random() < empty_ratio else _to_html(rng, paragraphs, post_id)
+        yield {
+            "id": post_id,
+            "date": date,
+            "link": f"https://consonews.ma/{date[:4]}/{date[5:7]}/article-{post_id}/",
+            "title": {"rendered": title.replace("'", "&rsquo;")},
+            "content": {"rendered": content, "protected": False},
+        }
+
+
+def payloads(count: int, seed: int = 42, start_id: int = 1, years: float = 3.0,
+             vocabulary_size: int = 20000) -> Iterator[Dict]:
+    """Yield index payloads directly (same shape as news_store.post_payload, no HTML step)."""
+    rng = random.Random(seed + start_id)
+    vocab = _Vocabulary(vocabulary_size, seed)
+    now = time.time()
+    for post_id in range(start_id, start_id + count):
+        title, paragraphs, date = _article(rng, vocab, post_id, now, years)
+        yield {
+            "post_id": post_id,
+            "title": title,
+            "content": "\n\n".join(paragraphs),
+            "url": f"https://consonews.ma/bench/{post_id}",
+            "date": date,
+        }
+
+
+def write_batch_files(directory: str, count: int, batch_size: int = 100, seed: int = 42,
+                      start_id: int = 1) -> int:
+    """Write posts as <directory>/batch_NNNNN.json, the input of refresh_all_posts. Returns bytes written."""
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    posts = wordpress_posts(count, seed=seed, start_id=start_id)
+    for batch_num in itertools.count(1):
+        batch = list(itertools.islice(posts, batch_size))
+        if not batch:
+            break
+        data = json.dumps(batch, ensure_ascii=False)
+        with open(os.path.join(directory, f"batch_{batch_num:05d}.json"), "w", encoding="utf-8") as f:
+            f.write(data)
+        written += len(data.encode("utf-8"))
+    return written
+
+
+def sample_queries(count: int, seed: int = 7) -> List[str]:
+    """Search queries built from the corpus topics (so they have matches)."""
+    rng = random.Random(seed)
+    templates = ["prix {k} {c}", "{k} {t}", "hausse {k} à {c}", "{t} {k} {k2}", "nouvelles règles {k}"]
+    queries = []
+    for _ in range(count):
+        topic, keywords = TOPICS[rng.randrange(len(TOPICS))]
+        k, k2 = rng.sample(keywords, 2)
+        queries.append(rng.choice(templates).format(k=k, k2=k2, t=topic, c=rng.choice(CITIES)))
+    return queries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic WordPress batch files")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="posts_batches")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    size = write_batch_files(args.out, args.count, args.batch_size, args.seed)
+    print(f"✅ {args.count} posts → {args.out}/ ({size / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,310 @@
+"""
+Offline stand-ins for the chatbot's external services, for benchmarking.
+
+- FakeLLMServer: OpenAI-compatible /chat/completions stub (deterministic,
+  configurable latency, answers with tool calls first and a final answer once
+  tool results are in the conversation)
+- in-memory Qdrant seeded with a synthetic corpus
+- hash_embedding: deterministic feature-hashing embedder (no API call)
+- FakeTavilySearch: Tavily tool returning canned results after a delay
+
+install_fakes() must run BEFORE `main` is imported: config.py, news_store.py
+and agent.py read their settings and build clients at import time.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import FILLER, payloads
+
+BENCH_MODEL_NAME = "bench-model"
+DEFAULT_TOOL_CALLS = ("search_conso_news", "tavily_search_results_json")
+
+# ============================================================
+# LLM stub
+# ============================================================
+
+class FakeLLMServer:
+    """OpenAI-compatible chat completions stub running in a background thread.
+
+    Turn logic: when the conversation has no tool result after the last user
+    message and tools are offered, answer with `tool_calls`; otherwise return
+    a final text answer. Token usage is estimated at ~4 characters per token.
+    Streaming requests ("stream": true) get the same answer as server-sent
+    events, one word per chunk, token_ms apart after the initial latency.
+    """
+
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 0.0,
+                 tool_calls=DEFAULT_TOOL_CALLS, answer_words: int = 120, seed: int = 0,
+                 token_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_ms = token_ms
+        self.tool_calls = tuple(tool_calls)
+        self.answer_words = answer_words
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                payload = stub.complete(body)
+                if body.get("stream"):
+                    # HTTP/1.0: the end of the event stream is the end of the connection
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    include_usage = (body.get("stream_options") or {}).get("include_usage")
+                    for chunk in stub.stream_chunks(payload, include_usage):
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def _sleep(self) -> None:
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def complete(self, body: Dict) -> Dict:
+        """Build a chat.completion response for an OpenAI request body."""
+        self._sleep()
+        messages = body.get("messages", [])
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        has_tool_results = any(m.get("role") == "tool" for m in messages[last_user + 1:])
+        offered = {t.get("function", {}).get("name") for t in body.get("tools") or []}
+        question = messages[last_user].get("content", "") if last_user >= 0 else ""
+        if isinstance(question, list):
+            question = " ".join(part.get("text", "") for part in question if isinstance(part, dict))
+
+        prompt_chars = sum(len(json.dumps(m.get("content") or "", ensure_ascii=False)) for m in messages)
+        message: Dict = {"role": "assistant", "content": None}
+        calls = [name for name in self.tool_calls if name in offered]
+        if calls and not has_tool_results:
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{index}_{zlib.crc32(question.encode()) & 0xffff:x}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps({"query": question}, ensure_ascii=False)},
+                }
+                for index, name in enumerate(calls)
+            ]
+            finish_reason = "tool_calls"
+            completion_chars = 40 * len(calls)
+        else:
+            words = (f"Réponse de test à « {question} ». " + " ".join(FILLER * 4)).split()
+            message["content"] = " ".join(words[: self.answer_words])
+            finish_reason = "stop"
+            completion_chars = len(message["content"])
+
+        prompt_tokens, completion_tokens = prompt_chars // 4, completion_chars // 4
+        return {
+            "id": f"chatcmpl-bench-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", BENCH_MODEL_NAME),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def stream_chunks(self, payload: Dict, include_usage: bool = False):
+        """chat.completion.chunk events for a completion built by complete()."""
+        choice = payload["choices"][0]
+        message = choice["message"]
+
+        def chunk(delta: Dict, finish_reason=None, choices=True) -> Dict:
+            return {
+                "id": payload["id"],
+                "object": "chat.completion.chunk",
+                "created": payload["created"],
+                "model": payload["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+            }
+
+        yield chunk({"role": "assistant", "content": ""})
+        for index, call in enumerate(message.get("tool_calls") or []):
+            yield chunk({"tool_calls": [{"index": index, **call}]})
+        words = (message.get("content") or "").split(" ")
+        for i, word in enumerate(w for w in words if w):
+            if self.token_ms:
+                time.sleep(self.token_ms / 1000)
+            yield chunk({"content": word if i == 0 else f" {word}"})
+        yield chunk({}, finish_reason=choice["finish_reason"])
+        if include_usage:
+            yield {**chunk({}, choices=False), "usage": payload["usage"]}
+
+
+# ============================================================
+# Embeddings, corpus, Qdrant
+# ============================================================
+
+def hash_embedding(text: str, dim: int = 768) -> List[float]:
+    """Deterministic embedding: signed feature hashing of the BM25 terms, L2-normalized.
+
+    Texts sharing terms get similar vectors, which is enough to exercise the
+    dense search path with realistic result sets.
+    """
+    from lexical import tokenize
+
+    vec = [0.0] * dim
+    for term in tokenize(text) or ["_empty_"]:
+        h = zlib.crc32(term.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def synthetic_posts(count: int, seed: int = 42) -> List[Dict]:
+    """Article payloads (same shape as news_store.post_payload)."""
+    return list(payloads(count, seed=seed))
+
+
+def seed_qdrant(qclient, posts: List[Dict], batch_size: int = 256) -> None:
+    """Create the articles collection and index posts with hash embeddings."""
+    import news_store
+
+    if not qclient.collection_exists(news_store.QDRANT_COLLECTION):
+        news_store.create_collection(qclient, news_store.QDRANT_COLLECTION)
+    for start in range(0, len(posts), batch_size):
+        points = [
+            news_store.build_point(
+                qclient, p["post_id"], hash_embedding(f"{p['title']}\n\n{p['content']}"), p,
+            )
+            for p in posts[start:start + batch_size]
+        ]
+        qclient.upsert(collection_name=news_store.QDRANT_COLLECTION, points=points)
+
+
+# ============================================================
+# Tavily
+# ============================================================
+
+def make_fake_tavily(latency_ms: float = 300.0, results: int = 5):
+    """TavilySearchResults subclass returning canned results after latency_ms."""
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    def canned(query: str):
+        items = [
+            {
+                "title": f"Résultat web {i} pour {query}",
+                "url": f"https://example.com/{zlib.crc32(query.encode()) & 0xffff:x}/{i}",
+                "content": f"Information web {i} sur {query}. " + " ".join(FILLER),
+                "score": round(1.0 - i * 0.1, 2),
+            }
+            for i in range(results)
+        ]
+        return items, {"results": items, "query": query}
+
+    class FakeTavilySearch(TavilySearchResults):
+        def _run(self, query: str, run_manager=None):
+            time.sleep(latency_ms / 1000)
+            return canned(query)
+
+        async def _arun(self, query: str, run_manager=None):
+            await asyncio.sleep(latency_ms / 1000)
+            return canned(query)
+
+    return FakeTavilySearch
+
+
+# ============================================================
+# Wiring
+# ============================================================
+
+def install_fakes(llm_latency_ms: float = 800.0, llm_jitter_ms: float = 0.0,
+                  embed_latency_ms: float = 50.0, tavily_latency_ms: float = 300.0,
+                  corpus_size: int = 2000, tool_calls=DEFAULT_TOOL_CALLS, seed: int = 42,
+                  qdrant_location: str = ":memory:", llm_url: Optional[str] = None,
+                  llm_token_ms: float = 0.0) -> Dict:
+    """Start the stubs and patch the app modules. Call before importing `main`.
+
+    Returns the running fakes ({"llm": FakeLLMServer, "qdrant": QdrantClient, ...}).
+    qdrant_location may point to a real local Qdrant (e.g. http://localhost:6333)
+    to benchmark against the server instead of the in-process engine.
+    llm_url reuses an LLM stub running elsewhere (e.g. shared by gunicorn
+    workers); "llm" is then None.
+    """
+    llm = None
+    if llm_url is None:
+        llm = FakeLLMServer(latency_ms=llm_latency_ms, jitter_ms=llm_jitter_ms,
+                            tool_calls=tool_calls, seed=seed, token_ms=llm_token_ms).start()
+        llm_url = llm.url
+    os.environ.update({
+        "LLM_BASE_URL": llm_url,
+        "LLM_API_KEY": "bench",
+        "TAVILY_API_KEY": "bench",
+        "MODEL_NAME": BENCH_MODEL_NAME,
+        "DISABLE_EMBEDDING": "",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+    # All benchmark traffic comes from one client IP
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    import news_store
+    from metrics import timed
+    from qdrant_client import QdrantClient
+    from usage import record_embedding
+
+    def fake_embed_text(text: str) -> List[float]:
+        with timed("embed_query", model="bench-hash", chars=len(text)):
+            time.sleep(embed_latency_ms / 1000)
+            vec = hash_embedding(text, news_store.EMBEDDING_DIMENSION)
+        record_embedding("bench-hash", len(text))
+        return vec
+
+    qclient = QdrantClient(qdrant_location) if qdrant_location != ":memory:" else QdrantClient(location=":memory:")
+    news_store._QDRANT_CLIENT = qclient
+    news_store.DISABLE_EMBEDDING = False
+    news_store.embed_text = fake_embed_text
+    seed_qdrant(qclient, synthetic_posts(corpus_size, seed=seed))
+
+    import agent
+    agent.TavilySearchResults = make_fake_tavily(tavily_latency_ms)
+
+    import main
+    # No WordPress polling during a benchmark
+    main.index_new_posts = lambda hours=24: None
+    return {"llm": llm, "qdrant": qclient, "app": main.app}
@@ -0,0 +1,274 @@
+"""
+Offline load test for /session/chat (no API quota used).
+
+Starts the real FastAPI app under uvicorn with the stand-ins from
+benchmarks.fakes, replays conversations at a fixed arrival rate (open loop:
+a slow server does not slow the client down) and reports latency
+percentiles, throughput and memory. Results are written as JSON tagged with
+the git commit, so runs can be compared across commits.
+
+The in-memory Qdrant runs inside the benchmarked process and competes with
+the app for CPU; pass --qdrant http://localhost:6333 to measure against a
+separate Qdrant server instead.
+
+    cd app
+    python -m benchmarks.load_test --rps 5 --duration 30
+    python -m benchmarks.load_test --rps 5 --duration 30 --compare benchmarks/results/<previous>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+QUESTIONS = [
+    "Quel est le prix de l'huile à Casablanca ?",
+    "Les tarifs des forfaits internet ont-ils baissé ?",
+    "Quelles sont les nouvelles règles de l'ONSSA sur l'étiquetage ?",
+    "Combien coûte un vol pour Marrakech cet été ?",
+    "Le prix du carburant va-t-il augmenter ?",
+    "Quelles promotions pour le ramadan dans les supermarchés ?",
+    "Les voitures électriques sont-elles moins chères à l'importation ?",
+    "Pourquoi le prix des tomates a augmenté à Rabat ?",
+]
+FOLLOW_UPS = ["Et par rapport à l'année dernière ?", "Peux-tu préciser les sources ?", "Et à Tanger ?"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict:
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (MB)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # Not Linux: fall back to the peak value
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision() -> Dict:
+    def run(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ""
+    return {"commit": run("rev-parse", "HEAD"), "dirty": bool(run("status", "--porcelain", "--untracked-files=no"))}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port: int):
+    """Run uvicorn in a background thread and wait until it accepts requests."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("uvicorn did not start within 30s")
+        time.sleep(0.05)
+    return server, thread
+
+
+async def run_conversation(client, index: int, turns: int, records: List[Dict]) -> None:
+    """One user: a first question then follow-ups in the same session."""
+    session_id = None
+    for turn in range(turns):
+        message = QUESTIONS[index % len(QUESTIONS)] if turn == 0 else FOLLOW_UPS[(index + turn) % len(FOLLOW_UPS)]
+        started = time.perf_counter()
+        status, error = None, None
+        try:
+            resp = await client.post("/session/chat", json={"message": message, "session_id": session_id})
+            status = resp.status_code
+            if status == 200:
+                session_id = resp.json().get("session_id")
+        except Exception as e:
+            error = type(e).__name__
+        records.append({
+            "turn": turn,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "status": status,
+            "error": error,
+        })
+        if status != 200:
+            return
+
+
+async def run_load(base_url: str, rps: float, duration: float, turns: int, timeout: float) -> Dict:
+    """Open-loop arrivals: conversation i starts at t0 + i / rps."""
+    import httpx
+
+    records: List[Dict] = []
+    rss_samples: List[float] = []
+    total = max(1, int(rps * duration))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(run_conversation(client, i, turns, records)))
+            rss_samples.append(rss_mb())
+        while not all(t.done() for t in tasks):
+            rss_samples.append(rss_mb())
+            await asyncio.sleep(0.25)
+        elapsed = time.perf_counter() - started
+
+    ok = [r for r in records if r["status"] == 200]
+    return {
+        "conversations": total,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_statuses": sorted({str(r["status"] or r["error"]) for r in records if r["status"] != 200}),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "latency_ms": latency_summary([r["latency_ms"] for r in ok]),
+        "latency_ms_by_turn": {
+            str(turn): latency_summary([r["latency_ms"] for r in ok if r["turn"] == turn])
+            for turn in range(turns)
+        },
+        "rss_peak_sampled_mb": round(max(rss_samples), 1) if rss_samples else None,
+    }
+
+
+def compare(current: Dict, previous: Dict) -> None:
+    """Print the key numbers of two runs side by side."""
+    rows = [("throughput_rps", ("summary", "throughput_rps"))]
+    rows += [(f"latency {p}", ("summary", "latency_ms", p)) for p in ("p50", "p95", "p99")]
+    rows += [("rss_end_mb", ("memory", "rss_end_mb")), ("errors", ("summary", "errors"))]
+    print(f"\n{'metric':<16}{'previous':>12}{'current':>12}{'delta':>10}")
+    print(f"   ({previous['git']['commit'][:8]} → {current['git']['commit'][:8]})")
+    for label, path in rows:
+        a, b = previous, current
+        for key in path:
+            a, b = (a or {}).get(key), (b or {}).get(key)
+        delta = f"{(b - a) / a * 100:+.1f}%" if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a else "-"
+        print(f"{label:<16}{str(a):>12}{str(b):>12}{delta:>10}")
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Offline /session/chat load test")
+    parser.add_argument("--rps", type=float, default=2.0, help="new conversations per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="arrival window in seconds")
+    parser.add_argument("--turns", type=int, default=2, help="messages per conversation")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tavily-latency-ms", type=float, default=300.0)
+    parser.add_argument("--tool-calls", default=",".join(("search_conso_news", "tavily_search_results_json")),
+                        help="tools the fake LLM calls on the first step (comma separated, empty for none)")
+    parser.add_argument("--corpus", type=int, default=2000, help="synthetic articles in Qdrant")
+    parser.add_argument("--qdrant", default=":memory:", help="':memory:' or a Qdrant URL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="", help="free-form tag stored in the result")
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for the JSON result")
+    parser.add_argument("--compare", help="previous result JSON to compare with")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fakes import install_fakes
+
+    rss_start = rss_mb()
+    setup_started = time.perf_counter()
+    fakes = install_fakes(
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        tavily_latency_ms=args.tavily_latency_ms,
+        corpus_size=args.corpus,
+        tool_calls=[t for t in args.tool_calls.split(",") if t],
+        seed=args.seed,
+        qdrant_location=args.qdrant,
+    )
+    port = free_port()
+    server, thread = start_server(fakes["app"], port)
+    setup_s = time.perf_counter() - setup_started
+    rss_ready = rss_mb()
+
+    try:
+        summary = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.rps, args.duration, args.turns, args.timeout))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        fakes["llm"].stop()
+
+    result = {
+        "benchmark": "session_chat_load",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": args.label,
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "setup_s": round(setup_s, 2),
+        "llm_stub_calls": fakes["llm"].calls,
+        "summary": summary,
+        "memory": {
+            "rss_start_mb": round(rss_start, 1),
+            "rss_ready_mb": round(rss_ready, 1),
+            "rss_end_mb": round(rss_mb(), 1),
+            "rss_peak_mb": round(peak_rss_mb(), 1),
+        },
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(args.out, f"{stamp}-{(result['git']['commit'] or 'nogit')[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    lat = summary["latency_ms"]
+    print(f"requests={summary['requests']} errors={summary['errors']} "
+          f"throughput={summary['throughput_rps']} req/s "
+          f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms "
+          f"rss_end={result['memory']['rss_end_mb']}MB")
+    print(f"📄 {path}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+    return result
+
+
+if __name__ == "__main__":
+    main()
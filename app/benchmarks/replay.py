@@ -0,0 +1,165 @@
+"""
+Deterministic replay of a recorded session (see cassette.py).
+
+Record real traffic once:
+
+    CASSETTE_MODE=record CASSETTE_PATH=cassettes/prod.jsonl uvicorn main:app
+
+then measure our own code offline, as often as needed:
+
+    cd app
+    python -m benchmarks.replay cassettes/prod.jsonl
+    python -m benchmarks.replay cassettes/prod.jsonl --latency-scale 0    # our code only
+    python -m benchmarks.replay cassettes/prod.jsonl --compare benchmarks/results/<previous>.json
+
+Conversations are rebuilt from the recorded LLM requests (each turn's first
+call ends with the user message; earlier user messages identify the
+conversation) and sent to /session/chat in recording order. LLM, embedding,
+Tavily and WordPress answers come from the cassette with the original
+latencies times --latency-scale; Qdrant is queried for real (the configured
+server, or --synthetic-corpus N for an in-memory one).
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from benchmarks.load_test import RESULTS_DIR, compare, git_revision, latency_summary, peak_rss_mb, rss_mb
+
+
+def conversation_turns(path: str) -> Tuple[List[Tuple[Tuple[str, ...], str]], str]:
+    """[(previous user messages, message)] in recording order, and the recorded model."""
+    turns, seen, model = [], set(), None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry["target"] != "llm":
+                continue
+            model = model or entry["request"]["model"]
+            messages = entry["request"]["messages"]
+            if not messages or messages[-1]["type"] != "human":
+                continue
+            humans = tuple(str(m["content"]) for m in messages if m["type"] == "human")
+            # /session/chat passes the session's own message list as history, so
+            # the new user message can appear twice at the end
+            if len(humans) > 1 and humans[-1] == humans[-2]:
+                humans = humans[:-1]
+            if humans not in seen:
+                seen.add(humans)
+                turns.append((humans[:-1], humans[-1]))
+    return turns, model
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Replay a recorded cassette through /session/chat")
+    parser.add_argument("cassette", help="cassette file recorded with CASSETTE_MODE=record")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiplier on recorded latencies (0 = our code only)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the whole session N times")
+    parser.add_argument("--strict", action="store_true", help="fail on requests missing from the cassette")
+    parser.add_argument("--synthetic-corpus", type=int, default=0,
+                        help="search an in-memory Qdrant seeded with N synthetic posts")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="previous result JSON to compare with")
+    args = parser.parse_args(argv)
+
+    turns, model = conversation_turns(args.cassette)
+    if not turns:
+        raise SystemExit(f"No conversation found in {args.cassette}")
+
+    # Settings are read at import time: set them before importing the app
+    os.environ.update({
+        "CASSETTE_MODE": "replay",
+        "CASSETTE_PATH": os.path.abspath(args.cassette),
+        "CASSETTE_LATENCY_SCALE": str(args.latency_scale),
+        "CASSETTE_STRICT": "1" if args.strict else "0",
+    })
+    if model:
+        os.environ["MODEL_NAME"] = model
+    for name in ("LLM_API_KEY", "TAVILY_API_KEY"):
+        os.environ.setdefault(name, "replay")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+
+    rss_start = rss_mb()
+    if args.synthetic_corpus:
+        import news_store
+        from qdrant_client import QdrantClient
+        from benchmarks.fakes import seed_qdrant, synthetic_posts
+
+        news_store._QDRANT_CLIENT = QdrantClient(location=":memory:")
+        seed_qdrant(news_store._QDRANT_CLIENT, synthetic_posts(args.synthetic_corpus))
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+    from cassette import get_cassette
+
+    # No lifespan: the startup indexing job would consume WordPress interactions
+    client = TestClient(app_main.app)
+    records: List[Dict] = []
+    started = time.perf_counter()
+    for iteration in range(args.repeat):
+        sessions: Dict[Tuple[str, ...], str] = {}
+        for previous, message in turns:
+            turn_started = time.perf_counter()
+            resp = client.post("/session/chat", json={"message": message, "session_id": sessions.get(previous)})
+            if resp.status_code == 200:
+                sessions[previous + (message,)] = resp.json()["session_id"]
+            records.append({
+                "iteration": iteration,
+                "turn": len(previous),
+                "latency_ms": round((time.perf_counter() - turn_started) * 1000, 1),
+                "status": resp.status_code,
+            })
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in records if r["status"] == 200]
+    result = {
+        "benchmark": "cassette_replay",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": args.label,
+        "git": git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "cassette": get_cassette().stats,
+        "summary": {
+            "requests": len(records),
+            "errors": len(records) - len(ok),
+            "elapsed_s": round(elapsed, 2),
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+            "latency_ms": latency_summary([r["latency_ms"] for r in ok]),
+            "latency_ms_by_turn": {
+                str(turn): latency_summary([r["latency_ms"] for r in ok if r["turn"] == turn])
+                for turn in sorted({r["turn"] for r in ok})
+            },
+        },
+        "memory": {
+            "rss_start_mb": round(rss_start, 1),
+            "rss_end_mb": round(rss_mb(), 1),
+            "rss_peak_mb": round(peak_rss_mb(), 1),
+        },
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(args.out, f"replay-{stamp}-{(result['git']['commit'] or 'nogit')[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    lat = result["summary"]["latency_ms"]
+    print(f"requests={len(records)} errors={result['summary']['errors']} "
+          f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms cassette={result['cassette']}")
+    print(f"📄 {path}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+    return result
+
+
+if __name__ == "__main__":
+    main()
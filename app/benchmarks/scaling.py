@@ -0,0 +1,258 @@
+"""
+Scaling benchmark for indexing and search at growing corpus sizes.
+
+For each size, in a fresh subprocess (so memory numbers don't leak between
+sizes), it:
+1. writes synthetic WordPress batch files (benchmarks.corpus)
+2. runs refresh_all_posts(fresh=True) with a hash embedder (no API call),
+   including the blue/green validation and alias swap
+3. times the embeddings cache load and its memory footprint
+4. runs index_new_posts on a batch of new posts
+5. measures search_news latency (dense + BM25 hybrid) over sample queries
+6. optionally (--lexical) builds the local BM25 index and measures its search
+
+Qdrant defaults to a local server (docker run -p 6333:6333 qdrant/qdrant);
+':memory:' works for small sizes only.
+
+    cd app
+    python -m benchmarks.scaling --sizes 10000,100000,1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.corpus import sample_queries, wordpress_posts, write_batch_files
+from benchmarks.load_test import RESULTS_DIR, git_revision, latency_summary, peak_rss_mb, rss_mb
+
+BENCH_COLLECTION_PREFIX = "bench_scaling"
+
+
+def _install(args, collection: str):
+    """Point news_store at the benchmark Qdrant/collection and a hash embedder."""
+    os.environ.update({
+        "QDRANT_COLLECTION": collection,
+        "DISABLE_EMBEDDING": "",
+        "HYBRID_SEARCH": "1",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from logging_config import setup_logging
+    setup_logging(default_format="text", queued=False)
+
+    import news_store
+    from qdrant_client import QdrantClient
+    from benchmarks.fakes import hash_embedding
+
+    news_store._QDRANT_CLIENT = (
+        QdrantClient(location=":memory:") if args.qdrant == ":memory:"
+        else QdrantClient(url=args.qdrant, timeout=300)
+    )
+
+    def fake_batch(texts: List[str], batch_size: int = 10) -> List[List[float]]:
+        if args.embed_ms_per_batch:
+            time.sleep(args.embed_ms_per_batch / 1000 * ((len(texts) + batch_size - 1) // batch_size))
+        return [hash_embedding(t, news_store.EMBEDDING_DIMENSION) for t in texts]
+
+    news_store.embed_texts_batch = fake_batch
+    news_store.embed_text = lambda text: hash_embedding(text, news_store.EMBEDDING_DIMENSION)
+
+    # Cache writes are timed separately: they grow with the cache size
+    timings = {"cache_save_s": 0.0, "cache_saves": 0}
+    original_save = news_store.save_embeddings_cache
+
+    def timed_save(cache, path=news_store.EMBEDDINGS_CACHE_FILE):
+        started = time.perf_counter()
+        original_save(cache, path)
+        timings["cache_save_s"] += time.perf_counter() - started
+        timings["cache_saves"] += 1
+
+    news_store.save_embeddings_cache = timed_save
+    news_store._recent_posts = []
+    news_store.fetch_recent_posts = lambda hours=24: news_store._recent_posts
+    return news_store, timings
+
+
+def run_size(size: int, args) -> Dict:
+    """Benchmark one corpus size in the current process."""
+    workdir = os.path.join(args.workdir, f"n{size}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    os.chdir(workdir)
+    result: Dict = {"size": size, "rss_start_mb": round(rss_mb(), 1)}
+
+    started = time.perf_counter()
+    batch_bytes = write_batch_files("posts_batches", size, batch_size=args.batch_size, seed=args.seed)
+    result["generate_s"] = round(time.perf_counter() - started, 2)
+    result["batch_files_mb"] = round(batch_bytes / 1e6, 1)
+
+    collection = f"{BENCH_COLLECTION_PREFIX}_{size}"
+    news_store, timings = _install(args, collection)
+    qclient = news_store.get_qdrant_client()
+
+    # 1. Full indexing (batch files → embeddings → Qdrant, validation, alias swap)
+    started = time.perf_counter()
+    news_store.refresh_all_posts(fresh=True)
+    elapsed = time.perf_counter() - started
+    indexed = qclient.count(collection, exact=True).count if qclient.collection_exists(collection) else 0
+    result["full_index"] = {
+        "seconds": round(elapsed, 1),
+        "posts_indexed": indexed,
+        "posts_per_s": round(indexed / elapsed, 1) if elapsed else None,
+        "cache_save_s": round(timings["cache_save_s"], 1),
+        "cache_saves": timings["cache_saves"],
+        "rss_after_mb": round(rss_mb(), 1),
+    }
+
+    # 2. Embeddings cache: file size, load time and resident memory once loaded
+    gc.collect()
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    cache = news_store.load_embeddings_cache()
+    result["embeddings_cache"] = {
+        "entries": len(cache),
+        "file_mb": round(os.path.getsize(news_store.EMBEDDINGS_CACHE_FILE) / 1e6, 1)
+        if os.path.exists(news_store.EMBEDDINGS_CACHE_FILE) else 0,
+        "load_s": round(time.perf_counter() - started, 2),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+    }
+    del cache
+    gc.collect()
+
+    # 3. Incremental indexing of new posts (loads and rewrites the cache)
+    news_store._recent_posts = list(wordpress_posts(args.incremental, seed=args.seed, start_id=size + 1))
+    timings.update(cache_save_s=0.0, cache_saves=0)
+    started = time.perf_counter()
+    news_store.index_new_posts(hours=14)
+    result["incremental_index"] = {
+        "posts": args.incremental,
+        "seconds": round(time.perf_counter() - started, 2),
+        "cache_save_s": round(timings["cache_save_s"], 2),
+    }
+    news_store._recent_posts = []
+
+    # 4. Search latency (hybrid), alternating all-time and 180-day searches
+    queries = sample_queries(args.queries, seed=args.seed)
+    for query in queries[:5]:
+        news_store.search_news(query, top_k=5)
+    latencies = {"all": [], "recent": []}
+    for i, query in enumerate(queries):
+        days_back = None if i % 2 == 0 else 180
+        started = time.perf_counter()
+        news_store.search_news(query, top_k=5, days_back=days_back)
+        latencies["all" if days_back is None else "recent"].append((time.perf_counter() - started) * 1000)
+    result["search_ms"] = {key: latency_summary([round(v, 2) for v in values]) for key, values in latencies.items()}
+
+    # 5. Optional: local BM25 index (DISABLE_EMBEDDING deployments)
+    if args.lexical:
+        started = time.perf_counter()
+        index = news_store.build_lexical_index("batches")
+        build_s = time.perf_counter() - started
+        lexical_latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, top_k=5)
+            lexical_latencies.append(round((time.perf_counter() - started) * 1000, 2))
+        result["lexical"] = {
+            "build_s": round(build_s, 1),
+            "docs": len(index),
+            "search_ms": latency_summary(lexical_latencies),
+        }
+
+    result["rss_end_mb"] = round(rss_mb(), 1)
+    result["rss_peak_mb"] = round(peak_rss_mb(), 1)
+
+    if not args.keep:
+        for existing in qclient.get_collections().collections:
+            if existing.name.startswith(collection):
+                qclient.delete_collection(existing.name)
+        os.chdir(args.workdir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"\n{'size':>9} {'index s':>9} {'posts/s':>9} {'cache MB':>9} {'cache load s':>13} "
+          f"{'incr s':>8} {'search p50':>11} {'p95':>8} {'p99':>8} {'peak RSS':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['size']:>9}  ERROR: {r['error']}")
+            continue
+        s = r["search_ms"]["all"]
+        print(f"{r['size']:>9} {r['full_index']['seconds']:>9} {r['full_index']['posts_per_s']:>9} "
+              f"{r['embeddings_cache']['file_mb']:>9} {r['embeddings_cache']['load_s']:>13} "
+              f"{r['incremental_index']['seconds']:>8} {s['p50']:>11} {s['p95']:>8} {s['p99']:>8} "
+              f"{r['rss_peak_mb']:>9}")
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Indexing / search scaling benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated corpus sizes")
+    parser.add_argument("--qdrant", default="http://localhost:6333", help="Qdrant URL or ':memory:'")
+    parser.add_argument("--batch-size", type=int, default=100, help="posts per batch file")
+    parser.add_argument("--incremental", type=int, default=200, help="posts for the index_new_posts run")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embed-ms-per-batch", type=float, default=0.0,
+                        help="simulated embedding API latency per 10-text request")
+    parser.add_argument("--lexical", action="store_true", help="also benchmark the local BM25 index")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "conso_scaling"))
+    parser.add_argument("--keep", action="store_true", help="keep batch files, caches and collections")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.workdir = os.path.abspath(args.workdir)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    if args.single:
+        # Child process: one size, result written for the parent
+        result = run_size(args.single, args)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return result
+
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    forwarded = [a for a in (argv if argv is not None else sys.argv[1:])]
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        print(f"📏 {size} posts...", flush=True)
+        result_file = os.path.join(args.workdir, f"result_{size}.json")
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.scaling", *forwarded, "--single", str(size),
+             "--result-file", result_file],
+            cwd=app_dir,
+        )
+        if proc.returncode != 0 or not os.path.exists(result_file):
+            results.append({"size": size, "error": f"exit code {proc.returncode}"})
+            continue
+        with open(result_file, encoding="utf-8") as f:
+            results.append(json.load(f))
+        os.remove(result_file)
+
+    report = {
+        "benchmark": "indexing_search_scaling",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "single", "result_file", "workdir")},
+        "results": results,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(args.out, f"scaling-{stamp}-{(report['git']['commit'] or 'nogit')[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print_table(results)
+    print(f"📄 {path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
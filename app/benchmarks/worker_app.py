@@ -0,0 +1,21 @@
+"""
+Gunicorn entry point for benchmarks.workers: main.app wired to the offline fakes.
+
+Settings come from BENCH_* environment variables set by benchmarks.workers.
+Loaded once in the gunicorn master (preload): the in-memory Qdrant corpus is
+copied into every worker, the LLM stub runs in the benchmark process.
+"""
+
+import os
+
+from benchmarks.fakes import install_fakes
+
+_fakes = install_fakes(
+    llm_url=os.environ["BENCH_LLM_URL"],
+    embed_latency_ms=float(os.getenv("BENCH_EMBED_LATENCY_MS", "50")),
+    tavily_latency_ms=float(os.getenv("BENCH_TAVILY_LATENCY_MS", "300")),
+    corpus_size=int(os.getenv("BENCH_CORPUS", "2000")),
+    seed=int(os.getenv("BENCH_SEED", "42")),
+    qdrant_location=os.getenv("BENCH_QDRANT", ":memory:"),
+)
+app = _fakes["app"]
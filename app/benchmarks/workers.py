@@ -0,0 +1,218 @@
+"""
+Throughput scaling with the number of gunicorn workers (offline, no API quota).
+
+For each worker count, starts the production server (gunicorn.conf.py:
+preloaded app, uvicorn workers) on benchmarks.worker_app, waits for /ready,
+replays /session/chat conversations at a fixed arrival rate (same open-loop
+driver as benchmarks.load_test) and reports throughput, latency percentiles
+and the memory of the master and its workers (RSS and PSS). The LLM stub
+runs in this process and is shared by all runs.
+
+Pick an arrival rate above what one worker can serve: throughput then
+measures capacity. Each worker has its own copy of the in-memory Qdrant and
+runs the vector search and request handling on its own core, so throughput
+grows with workers until cores (or the LLM stub) run out. Follow-up turns
+need a shared session store: pass --redis redis://localhost:6379/0, otherwise
+they may land on another worker and start a new session.
+
+    cd app
+    python -m benchmarks.workers --workers 1,2,4 --rps 8 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.fakes import DEFAULT_TOOL_CALLS, FakeLLMServer
+from benchmarks.load_test import RESULTS_DIR, free_port, git_revision, run_load
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _smaps_rollup_kb(pid: int) -> Dict[str, int]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def tree_memory_mb(pid: int) -> Optional[Dict]:
+    """Memory of a process and its children (Linux), in MB.
+
+    rss counts pages shared by the preloaded master and its workers once per
+    process; pss splits them between the processes sharing them, so its sum
+    is the real footprint.
+    """
+    tree = [pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    tree.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    totals = {"rss": 0, "pss": 0}
+    try:
+        for p in tree:
+            rollup = _smaps_rollup_kb(p)
+            totals["rss"] += rollup.get("Rss", 0)
+            totals["pss"] += rollup.get("Pss", 0)
+    except OSError:
+        return None
+    return {f"{key}_mb": round(kb / 1024, 1) for key, kb in totals.items()}
+
+
+def wait_ready(base_url: str, workers: int, timeout: float) -> float:
+    """Poll /ready until every worker is likely warm; returns the wait in seconds."""
+    import httpx
+
+    started = time.perf_counter()
+    consecutive = 0
+    # Requests land on arbitrary workers: require a streak of successes
+    while consecutive < 3 * workers:
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"server not ready within {timeout:.0f}s")
+        try:
+            ok = httpx.get(f"{base_url}/ready", timeout=5).status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        consecutive = consecutive + 1 if ok else 0
+        time.sleep(0.1 if ok else 0.5)
+    return time.perf_counter() - started
+
+
+def run_workers(count: int, args, llm: FakeLLMServer, workdir: str) -> Dict:
+    """One gunicorn run with `count` workers under the configured load."""
+    port = free_port()
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "WEB_CONCURRENCY": str(count),
+        "BENCH_LLM_URL": llm.url,
+        "BENCH_EMBED_LATENCY_MS": str(args.embed_latency_ms),
+        "BENCH_TAVILY_LATENCY_MS": str(args.tavily_latency_ms),
+        "BENCH_CORPUS": str(args.corpus),
+        "BENCH_SEED": str(args.seed),
+        "BENCH_QDRANT": args.qdrant,
+        "INDEXING_LOCK_FILE": os.path.join(workdir, f"indexing-{port}.lock"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    if args.redis:
+        env.update({"SESSION_BACKEND": "redis", "REDIS_URL": args.redis, "REDIS_KEY_PREFIX": f"bench:{port}:"})
+
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "benchmarks.worker_app:app"],
+        cwd=APP_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url, count, args.ready_timeout)
+        startup_s = time.perf_counter() - started
+        memory_ready = tree_memory_mb(proc.pid)
+        calls_before = llm.calls
+        summary = asyncio.run(run_load(base_url, args.rps, args.duration, args.turns, args.timeout))
+        memory_end = tree_memory_mb(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    # The driver's own RSS sample is meaningless here
+    summary.pop("rss_peak_sampled_mb", None)
+    return {
+        "workers": count,
+        "startup_s": round(startup_s, 2),
+        "llm_stub_calls": llm.calls - calls_before,
+        "summary": summary,
+        "memory": {"ready": memory_ready, "end": memory_end},
+    }
+
+
+def print_table(results: List[Dict]) -> None:
+    base = next((r["summary"]["throughput_rps"] for r in results if "summary" in r), None)
+    print(f"\n{'workers':>8} {'req/s':>8} {'speedup':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'PSS MB':>8} {'RSS MB':>8} {'startup s':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['workers']:>8}  ERROR: {r['error']}")
+            continue
+        s, lat = r["summary"], r["summary"]["latency_ms"]
+        memory = r["memory"]["end"] or {}
+        speedup = f"{s['throughput_rps'] / base:.2f}x" if base and s["throughput_rps"] else "-"
+        print(f"{r['workers']:>8} {s['throughput_rps']:>8} {speedup:>8} {s['errors']:>7} {lat['p50']:>9} "
+              f"{lat['p95']:>9} {lat['p99']:>9} {memory.get('pss_mb', '-'):>8} {memory.get('rss_mb', '-'):>8} "
+              f"{r['startup_s']:>10}")
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Throughput vs gunicorn worker count")
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--rps", type=float, default=8.0, help="new conversations per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="arrival window in seconds")
+    parser.add_argument("--turns", type=int, default=1, help="messages per conversation")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tavily-latency-ms", type=float, default=300.0)
+    parser.add_argument("--tool-calls", default=",".join(DEFAULT_TOOL_CALLS),
+                        help="tools the fake LLM calls on the first step (comma separated, empty for none)")
+    parser.add_argument("--corpus", type=int, default=2000, help="synthetic articles in Qdrant")
+    parser.add_argument("--qdrant", default=":memory:", help="':memory:' or a Qdrant URL")
+    parser.add_argument("--redis", help="Redis URL for shared sessions (needed for --turns > 1)")
+    parser.add_argument("--ready-timeout", type=float, default=180.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="", help="free-form tag stored in the result")
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for the JSON result")
+    args = parser.parse_args(argv)
+
+    llm = FakeLLMServer(latency_ms=args.llm_latency_ms, seed=args.seed,
+                        tool_calls=[t for t in args.tool_calls.split(",") if t]).start()
+    workdir = tempfile.mkdtemp(prefix="conso_workers_")
+    results = []
+    try:
+        for count in [int(w) for w in args.workers.split(",") if w]:
+            print(f"👷 {count} worker(s)...", flush=True)
+            try:
+                results.append(run_workers(count, args, llm, workdir))
+            except Exception as e:
+                results.append({"workers": count, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        llm.stop()
+
+    report = {
+        "benchmark": "worker_scaling",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": args.label,
+        "git": git_revision(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(args.out, f"workers-{stamp}-{(report['git']['commit'] or 'nogit')[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print_table(results)
+    print(f"📄 {path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
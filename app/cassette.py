@@ -0,0 +1,359 @@
+"""
+Enregistrement / rejeu des appels externes (cassettes) pour des mesures de
+performance reproductibles.
+
+- CASSETTE_MODE=record: les appels réels (LLM compatible OpenAI, embeddings
+  Gemini/Vertex, Tavily, WordPress) s'exécutent normalement; chaque couple
+  requête/réponse est ajouté avec sa durée au fichier CASSETTE_PATH (JSON lines).
+- CASSETTE_MODE=replay: aucun appel réseau; la réponse enregistrée est servie
+  après la durée d'origine multipliée par CASSETTE_LATENCY_SCALE (0 = immédiat).
+
+L'interception se fait au plus près du réseau (ChatOpenAI._generate,
+genai.embed_content, TavilySearchAPIWrapper.raw_results, requests.get de
+news_store): graph, callbacks, métriques et parsing restent dans le chemin
+mesuré. Qdrant n'est pas enregistré (service local).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()  # off | record | replay
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/session.jsonl")
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+# Une requête absente de la cassette lève une erreur au lieu de servir l'entrée suivante
+CASSETTE_STRICT = os.getenv("CASSETTE_STRICT", "0").lower() in ("1", "true", "yes")
+
+# Paramètres WordPress dépendant de l'heure, exclus de la clé
+_VOLATILE_PARAMS = {"after"}
+
+
+class CassetteMiss(RuntimeError):
+    """Requête sans réponse enregistrée (mode replay)."""
+
+
+class ReplayedError(RuntimeError):
+    """Erreur rejouée: l'appel enregistré avait échoué."""
+
+
+def request_key(target: str, request: Any) -> str:
+    data = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(f"{target}\n{data}".encode("utf-8")).hexdigest()[:20]
+
+
+class Cassette:
+    """Fichier de cassette: enregistrement en append, index (cible, clé) en rejeu.
+
+    Une même requête rejouée plusieurs fois reçoit les réponses dans l'ordre
+    d'enregistrement (puis la dernière en boucle).
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0, strict: bool = False):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, str], List[Dict]] = {}
+        self.by_target: Dict[str, List[Dict]] = {}
+        self._served: Dict[Tuple[str, str], int] = {}
+        self._fallback: Dict[str, int] = {}
+        self.stats = {"recorded": 0, "hits": 0, "misses": 0}
+        if mode == "replay":
+            self.load()
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.entries.setdefault((entry["target"], entry["key"]), []).append(entry)
+                self.by_target.setdefault(entry["target"], []).append(entry)
+        logger.info(
+            f"📼 Cassette loaded: {sum(len(v) for v in self.by_target.values())} interactions",
+            extra={"path": self.path, "targets": {t: len(v) for t, v in self.by_target.items()}},
+        )
+
+    # ---------- enregistrement ----------
+
+    def _record(self, target: str, key: str, request: Any, started: float,
+                response: Any = None, error: Optional[BaseException] = None) -> None:
+        entry = {
+            "target": target,
+            "key": key,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "request": request,
+        }
+        if error is not None:
+            entry["error"] = {"type": type(error).__name__, "message": str(error)}
+        else:
+            entry["response"] = response
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.stats["recorded"] += 1
+
+    # ---------- rejeu ----------
+
+    def _lookup(self, target: str, key: str) -> Dict:
+        with self.lock:
+            matches = self.entries.get((target, key))
+            if matches:
+                index = self._served.get((target, key), 0)
+                self._served[(target, key)] = index + 1
+                self.stats["hits"] += 1
+                return matches[min(index, len(matches) - 1)]
+            self.stats["misses"] += 1
+            recorded = self.by_target.get(target) or []
+            if self.strict or not recorded:
+                raise CassetteMiss(f"No recorded {target} interaction for key {key}")
+            # Requête inconnue (prompt modifié...): réponse suivante de la même cible
+            index = self._fallback.get(target, 0)
+            self._fallback[target] = index + 1
+        logger.warning(f"⚠️ Cassette miss for {target}, serving recorded interaction #{index % len(recorded)}")
+        return recorded[index % len(recorded)]
+
+    def _delay(self, entry: Dict) -> float:
+        return entry.get("elapsed_ms", 0) * self.latency_scale / 1000
+
+    @staticmethod
+    def _result(entry: Dict, decode: Callable) -> Any:
+        if "error" in entry:
+            raise ReplayedError(f"{entry['error']['type']}: {entry['error']['message']}")
+        return decode(entry["response"])
+
+    # ---------- appels ----------
+
+    def call(self, target: str, request: Any, real: Callable[[], Any],
+             encode: Callable = lambda r: r, decode: Callable = lambda r: r) -> Any:
+        key = request_key(target, request)
+        if self.mode == "replay":
+            entry = self._lookup(target, key)
+            time.sleep(self._delay(entry))
+            return self._result(entry, decode)
+        started = time.perf_counter()
+        try:
+            result = real()
+        except Exception as e:
+            self._record(target, key, request, started, error=e)
+            raise
+        self._record(target, key, request, started, response=encode(result))
+        return result
+
+    async def acall(self, target: str, request: Any, real: Callable[[], Any],
+                    encode: Callable = lambda r: r, decode: Callable = lambda r: r) -> Any:
+        key = request_key(target, request)
+        if self.mode == "replay":
+            entry = self._lookup(target, key)
+            await asyncio.sleep(self._delay(entry))
+            return self._result(entry, decode)
+        started = time.perf_counter()
+        try:
+            result = await real()
+        except Exception as e:
+            self._record(target, key, request, started, error=e)
+            raise
+        self._record(target, key, request, started, response=encode(result))
+        return result
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Cassette active (None si CASSETTE_MODE=off)."""
+    return _cassette
+
+
+# ============================================================
+# Points d'interception
+# ============================================================
+
+def _llm_request(llm, messages, kwargs) -> Dict:
+    """Clé LLM: conversation sans le prompt système (il contient l'heure) ni le
+    contenu des résultats d'outils (il dépend de l'index Qdrant local)."""
+    return {
+        "model": llm.model_name,
+        "tools": [t.get("function", {}).get("name") for t in kwargs.get("tools") or []],
+        "messages": [
+            {
+                "type": m.type,
+                "content": None if m.type == "tool" else m.content,
+                "tool_call_id": getattr(m, "tool_call_id", None),
+                "tool_calls": [[c["name"], c["args"]] for c in getattr(m, "tool_calls", None) or []],
+            }
+            for m in messages if m.type != "system"
+        ],
+    }
+
+
+def _patch_llm(cassette: Cassette) -> None:
+    from langchain_core.messages import message_to_dict, messages_from_dict
+    from langchain_core.outputs import ChatGeneration, ChatResult
+    from langchain_openai import ChatOpenAI
+
+    def encode(result):
+        return {
+            "generations": [
+                {"message": message_to_dict(g.message), "generation_info": g.generation_info}
+                for g in result.generations
+            ],
+            "llm_output": result.llm_output,
+        }
+
+    def decode(data):
+        return ChatResult(
+            generations=[
+                ChatGeneration(message=messages_from_dict([g["message"]])[0], generation_info=g["generation_info"])
+                for g in data["generations"]
+            ],
+            llm_output=data["llm_output"],
+        )
+
+    original, original_async = ChatOpenAI._generate, ChatOpenAI._agenerate
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return cassette.call(
+            "llm", _llm_request(self, messages, kwargs),
+            lambda: original(self, messages, stop=stop, run_manager=run_manager, **kwargs),
+            encode, decode,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await cassette.acall(
+            "llm", _llm_request(self, messages, kwargs),
+            lambda: original_async(self, messages, stop=stop, run_manager=run_manager, **kwargs),
+            encode, decode,
+        )
+
+    ChatOpenAI._generate, ChatOpenAI._agenerate = _generate, _agenerate
+    # Pas de streaming (il contournerait _generate): les réponses enregistrées
+    # sont transmises d'un bloc au lieu de token par token
+    ChatOpenAI._should_stream = lambda self, **kwargs: False
+
+
+def _patch_embeddings(cassette: Cassette) -> None:
+    import google.generativeai as genai
+
+    original = genai.embed_content
+
+    def embed_content(**kwargs):
+        # Le timeout varie avec le budget restant de la requête: hors de la clé
+        request = {k: v for k, v in kwargs.items() if k != "request_options"}
+        return cassette.call(
+            "gemini_embedding", request, lambda: original(**kwargs),
+            lambda result: {"embedding": list(result["embedding"])},
+        )
+
+    genai.embed_content = embed_content
+
+    try:
+        from vertexai.language_models import TextEmbeddingModel
+    except ImportError:
+        # Vertex AI n'est utilisé que pour l'indexation batch (optionnel)
+        return
+
+    original_batch = TextEmbeddingModel.get_embeddings
+
+    def get_embeddings(self, texts, **kwargs):
+        return cassette.call(
+            "vertex_embedding", {"texts": list(texts), **kwargs},
+            lambda: original_batch(self, texts, **kwargs),
+            lambda result: [list(e.values) for e in result],
+            lambda data: [SimpleNamespace(values=values) for values in data],
+        )
+
+    TextEmbeddingModel.get_embeddings = get_embeddings
+
+
+def _patch_tavily(cassette: Cassette) -> None:
+    from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+    original, original_async = TavilySearchAPIWrapper.raw_results, TavilySearchAPIWrapper.raw_results_async
+
+    def raw_results(self, *args, **kwargs):
+        return cassette.call(
+            "tavily", {"args": args, "kwargs": kwargs}, lambda: original(self, *args, **kwargs),
+        )
+
+    async def raw_results_async(self, *args, **kwargs):
+        return await cassette.acall(
+            "tavily", {"args": args, "kwargs": kwargs}, lambda: original_async(self, *args, **kwargs),
+        )
+
+    TavilySearchAPIWrapper.raw_results = raw_results
+    TavilySearchAPIWrapper.raw_results_async = raw_results_async
+
+
+class _RecordedRequests:
+    """Remplace le module requests dans news_store (API WordPress)."""
+
+    _HEADERS = ("Content-Type", "X-WP-Total", "X-WP-TotalPages")
+
+    def __init__(self, cassette: Cassette, module):
+        self._cassette = cassette
+        self._module = module
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def get(self, url, params=None, **kwargs):
+        request = {
+            "url": url,
+            "params": {k: v for k, v in (params or {}).items() if k not in _VOLATILE_PARAMS},
+        }
+        return self._cassette.call(
+            "wordpress", request, lambda: self._module.get(url, params=params, **kwargs),
+            self._encode, lambda data: self._decode(url, data),
+        )
+
+    def _encode(self, resp) -> Dict:
+        return {
+            "status": resp.status_code,
+            "headers": {h: resp.headers[h] for h in self._HEADERS if h in resp.headers},
+            "body": resp.text,
+        }
+
+    def _decode(self, url: str, data: Dict):
+        resp = self._module.Response()
+        resp.status_code = data["status"]
+        resp.headers.update(data["headers"])
+        resp._content = data["body"].encode("utf-8")
+        resp.encoding = "utf-8"
+        resp.url = url
+        return resp
+
+
+def _patch_wordpress(cassette: Cassette) -> None:
+    import news_store
+
+    if not isinstance(news_store.requests, _RecordedRequests):
+        news_store.requests = _RecordedRequests(cassette, news_store.requests)
+
+
+def install_cassette(mode: str = CASSETTE_MODE, path: str = CASSETTE_PATH,
+                     latency_scale: float = CASSETTE_LATENCY_SCALE, strict: bool = CASSETTE_STRICT) -> Optional[Cassette]:
+    """Active l'enregistrement ou le rejeu (no-op si mode=off, idempotent)."""
+    global _cassette
+    if mode not in ("record", "replay") or _cassette is not None:
+        return _cassette
+    _cassette = Cassette(path, mode, latency_scale=latency_scale, strict=strict)
+    _patch_llm(_cassette)
+    _patch_embeddings(_cassette)
+    _patch_tavily(_cassette)
+    _patch_wordpress(_cassette)
+    logger.info(f"📼 Cassette {mode} mode ({path})", extra={"latency_scale": latency_scale})
+    return _cassette
@@ -1,5 +1,8 @@
 import os
-from datetime import datetime
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Optional
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,40 +15,30 @@ TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 # Model configuration
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")  # ou gemini-1.5-flash pour Gemini
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
+# Compteurs de tokens dans les réponses streamées (stream_options.include_usage),
+# à désactiver si le fournisseur compatible OpenAI ne l'accepte pas
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1").lower() in ("1", "true", "yes")
 
+# Budget de l'agent par requête: appels LLM (réponse finale forcée comprise),
+# appels d'outils au total et par outil
+AGENT_MAX_MODEL_TURNS = max(2, int(os.getenv("AGENT_MAX_MODEL_TURNS", "4")))
+AGENT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", "4"))
+AGENT_MAX_CALLS_PER_TOOL = int(os.getenv("AGENT_MAX_CALLS_PER_TOOL", "2"))
+# Surcharges par nom d'outil, ex: {"tavily_search_results_json": 1}
+AGENT_TOOL_CALL_LIMITS = json.loads(os.getenv("AGENT_TOOL_CALL_LIMITS", "{}") or "{}")
 
-def get_system_prompt():
-    """
-    Génère le prompt système avec la date et l'heure actuelles (UTC).
-    
-    Returns:
-        str: Le prompt système avec contexte temporel
-    """
-    now_utc = datetime.utcnow()
-    date_str = now_utc.strftime("%A %d %B %Y")  # Ex: Friday 08 November 2025
-    time_str = now_utc.strftime("%H:%M UTC")    # Ex: 14:30 UTC
-    
-    # Traduction des jours et mois en français
-    jours = {
-        'Monday': 'Lundi', 'Tuesday': 'Mardi', 'Wednesday': 'Mercredi',
-        'Thursday': 'Jeudi', 'Friday': 'Vendredi', 'Saturday': 'Samedi', 'Sunday': 'Dimanche'
-    }
-    mois = {
-        'January': 'janvier', 'February': 'février', 'March': 'mars', 'April': 'avril',
-        'May': 'mai', 'June': 'juin', 'July': 'juillet', 'August': 'août',
-        'September': 'septembre', 'October': 'octobre', 'November': 'novembre', 'December': 'décembre'
-    }
-    
-    for eng, fr in jours.items():
-        date_str = date_str.replace(eng, fr)
-    for eng, fr in mois.items():
-        date_str = date_str.replace(eng, fr)
-    
-    return f"""Tu es le chatbot éditorial officiel de Conso News, une plateforme de journalisme et de consommation.
 
-CONTEXTE TEMPOREL
-- Nous sommes le {date_str}, il est {time_str}.
-- Utilise cette information pour situer les événements dans le temps (actualité récente, archives, enjeux de contexte).
+# Granularité du contexte temporel: "hour" ou "day". Le prompt ne change qu'à
+# cette fréquence, ce qui laisse le cache de préfixe du fournisseur LLM agir
+PROMPT_TIME_GRANULARITY = os.getenv("PROMPT_TIME_GRANULARITY", "hour").lower()
+
+# Indexés par datetime.weekday() / datetime.month
+JOURS = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche")
+MOIS = ("", "janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août",
+        "septembre", "octobre", "novembre", "décembre")
+
+# Partie fixe en tête du prompt: identique d'un appel à l'autre (préfixe cachable)
+STATIC_SYSTEM_PROMPT = """Tu es le chatbot éditorial officiel de Conso News, une plateforme de journalisme et de consommation.
 
 PERSONNALITÉ ET TON
 - Tu réponds TOUJOURS en français, dans un ton bienveillant, clair, posé et professionnel.
@@ -104,5 +97,52 @@ RAPPEL FINAL
 """
 
 
+def format_date_fr(moment: datetime) -> str:
+    """Ex: Vendredi 08 novembre 2025."""
+    return f"{JOURS[moment.weekday()]} {moment.day:02d} {MOIS[moment.month]} {moment.year}"
+
+
+@lru_cache(maxsize=4)
+def _build_system_prompt(day: date, hour: Optional[int]) -> str:
+    if hour is None:
+        moment = f"Nous sommes le {format_date_fr(day)} (UTC)."
+    else:
+        moment = f"Nous sommes le {format_date_fr(day)}, entre {hour}h et {(hour + 1) % 24}h UTC."
+    return f"""{STATIC_SYSTEM_PROMPT}
+CONTEXTE TEMPOREL
+- {moment}
+- Utilise cette information pour situer les événements dans le temps (actualité récente, archives, enjeux de contexte).
+"""
+
+
+def get_system_prompt():
+    """
+    Renvoie le prompt système avec la date (et l'heure) actuelles en UTC.
+    
+    Les instructions fixes forment le début du prompt; le contexte temporel,
+    à l'heure ou au jour près (PROMPT_TIME_GRANULARITY), est placé à la fin.
+    Le texte est mis en cache: il n'est reconstruit qu'au changement d'heure.
+    
+    Returns:
+        str: Le prompt système avec contexte temporel
+    """
+    now_utc = datetime.now(timezone.utc)
+    hour = None if PROMPT_TIME_GRANULARITY == "day" else now_utc.hour
+    return _build_system_prompt(now_utc.date(), hour)
+
+
+FINAL_ANSWER_INSTRUCTIONS = """
+BUDGET DE RECHERCHE ÉPUISÉ
+- Tu ne peux plus utiliser d'outils pour cette question.
+- Rédige maintenant ta réponse finale à partir des résultats déjà obtenus ci-dessus.
+- Si certaines informations n'ont pas pu être vérifiées, dis-le clairement.
+"""
+
+
+def get_final_answer_prompt():
+    """Prompt système de la réponse finale forcée (même préfixe que get_system_prompt)."""
+    return get_system_prompt() + FINAL_ANSWER_INSTRUCTIONS
+
+
 # Compatibilité: garder SYSTEM_PROMPT comme variable pour le code existant
 SYSTEM_PROMPT = get_system_prompt()
@@ -0,0 +1,57 @@
+"""
+Configuration gunicorn de production: N workers uvicorn, application préchargée.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+preload_app: main.py (langchain, langgraph, config, prompt système) est
+importé une seule fois dans le process maître, et l'agent y est construit
+(when_ready) avant le fork: les workers partagent ces pages en copy-on-write
+au lieu de payer chacun imports et construction. gc.freeze() évite que le
+ramasse-miettes des workers ne les recopie en les parcourant.
+
+Aucune connexion n'est ouverte dans le maître: le warm-up de chaque worker
+(startup_event) ouvre les siennes (LLM, Qdrant, Tavily). Les threads de fond
+créés à l'import (logs, nettoyage des sessions, rate limiting) sont relancés
+dans chaque worker (os.register_at_fork); traçage, profilage et planificateur
+démarrent dans startup_event, donc par worker.
+
+Avec plusieurs workers:
+- SESSION_BACKEND=redis: une session peut être servie par n'importe quel worker
+- l'indexation planifiée ne tourne que dans un worker (verrou INDEXING_LOCK_FILE)
+- admission (CHAT_MAX_CONCURRENCY), rate limiting et /metrics restent par worker
+"""
+
+import gc
+import os
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Worker relancé si sa boucle d'événements ne répond plus pendant timeout secondes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# Construction de l'agent dans le maître (sinon au warm-up de chaque worker)
+PRELOAD_AGENT = os.getenv("PRELOAD_AGENT", "1").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    """Maître: application importée, workers pas encore forkés."""
+    import main
+    from session_manager import SESSION_BACKEND
+
+    if PRELOAD_AGENT:
+        started = time.perf_counter()
+        main.get_agent()
+        server.log.info(f"Agent preloaded in {time.perf_counter() - started:.2f}s")
+    if workers > 1 and SESSION_BACKEND != "redis":
+        server.log.warning(
+            f"{workers} workers with SESSION_BACKEND={SESSION_BACKEND}: "
+            "sessions are not shared between workers, set SESSION_BACKEND=redis"
+        )
+    # Objets du maître hors du suivi du GC: pas de copie des pages dans les workers
+    gc.freeze()
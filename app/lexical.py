@@ -0,0 +1,111 @@
+"""
+French-aware lexical analysis for sparse (BM25) retrieval.
+
+Dense embeddings are weak on exact names, brands, prices and law numbers.
+This module turns article text into BM25 sparse vectors computed locally
+(no API call), so Qdrant can fuse dense and lexical results server-side.
+"""
+
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# BM25 parameters. The IDF part is applied by Qdrant (Modifier.IDF), so only
+# the term-frequency saturation and length normalization are computed here.
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Average article length in tokens (after stopword removal). A fixed value keeps
+# document vectors identical between full backfills and incremental indexing.
+BM25_AVG_DOC_LENGTH = float(os.getenv("BM25_AVG_DOC_LENGTH", "250"))
+
+FRENCH_STOPWORDS = frozenset("""
+a ai aie aient aies ait alors as au aucun aucune aupres auquel aur aura aurai auraient aurais aurait
+auras aurez auriez aurions aurons auront aussi autre autres aux auxquelles auxquels avaient avais avait
+avant avec avez aviez avions avoir avons ayant ayez ayons c ca car ce ceci cela celle celles celui cependant
+ces cet cette ceux chacun chacune chaque chez ci comme comment d dans de des deja depuis devant doit donc
+dont du elle elles en encore entre es est et etaient etais etait etant ete etes etiez etions etre eu eue
+eues eurent eus eusse eussent eusses eussiez eussions eut eutes eux fai fait faut fois furent fus fusse
+fussent fusses fussiez fussions fut futes ici il ils j je jusqu l la le les lequel lesquelles lesquels
+leur leurs lors lorsqu lorsque lui m ma mais me meme memes mes moi mon n ne ni nos notre nous on ont ou
+par parce pas peu peut plus pour pourquoi pres puis qu quand que quel quelle quelles quels qui quoi s sa
+sans se sera serai seraient serais serait seras serez seriez serions serons seront ses si sien sienne
+soi soient sois soit sommes son sont sous soyez soyons suis sur t ta te tes toi ton tous tout toute toutes
+tres tu un une unes uns vers via voici voila vont vos votre vous y
+""".split())
+
+# Elided articles/pronouns: l'arrêté, d'huile, qu'il, jusqu'à...
+_ELISION_RE = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu)['’]", re.IGNORECASE)
+
+# Numbers keep their internal separators so "49.3", "31-08" or "2,5" stay
+# searchable as a single term; everything else is split on non-alphanumerics.
+_TOKEN_RE = re.compile(r"\d+(?:[.,/-]\d+)*|[a-z0-9]+")
+
+
+def _fold_accents(text: str) -> str:
+    """Lowercase and strip diacritics (é → e, ç → c)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _light_stem(token: str) -> str:
+    """Light French stemmer: only folds plural and feminine endings.
+
+    Aggressive stemming hurts on brand and product names, so we only merge
+    the variants that matter for recall (prix/prix, produits/produit, ...).
+    """
+    if len(token) <= 4 or not token.isalpha():
+        return token
+    if token.endswith("aux"):
+        return token[:-3] + "al"
+    if token[-1] in "sx":
+        token = token[:-1]
+    if len(token) > 4 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split French text into normalized search terms."""
+    if not text:
+        return []
+    text = _ELISION_RE.sub(" ", text)
+    text = _fold_accents(text)
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in FRENCH_STOPWORDS or (len(token) == 1 and not token.isdigit()):
+            continue
+        tokens.append(_light_stem(token))
+    return tokens
+
+
+def token_id(term: str) -> int:
+    """Stable uint32 id for a term (Python's hash() is salted per process)."""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _to_sparse(weights: Dict[int, float]) -> Tuple[List[int], List[float]]:
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+def bm25_document_vector(text: str) -> Tuple[List[int], List[float]]:
+    """BM25 term weights for a document, as (indices, values)."""
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    doc_len = len(tokens)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / BM25_AVG_DOC_LENGTH)
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(tokens).items():
+        tid = token_id(term)
+        # crc32 collisions are rare; merge them instead of dropping a term
+        weights[tid] = weights.get(tid, 0.0) + tf * (BM25_K1 + 1) / (tf + norm)
+    return _to_sparse(weights)
+
+
+def bm25_query_vector(text: str) -> Tuple[List[int], List[float]]:
+    """Query-side sparse vector: one unit weight per distinct term."""
+    return _to_sparse({token_id(term): 1.0 for term in set(tokenize(text))})
@@ -0,0 +1,431 @@
+"""
+In-process BM25 search engine over the article archive.
+
+Used when embeddings are disabled (e.g. Render free tier): queries are served
+from a local inverted index without any embedding or network call.
+
+On-disk format (one directory):
+- meta.json         : doc count, total length, term dictionary {term: [offset, df]}
+- postings.bin      : uint32 array; per term, `df` doc ids followed by `df` term frequencies
+- doc_len.bin       : uint32 array, document length in tokens
+- doc_date.bin      : int64 array, publication date (epoch seconds, 0 = unknown)
+- doc_post_id.bin   : int64 array, WordPress post id
+- store_offsets.bin : uint64 array (doc count + 1), byte offsets into store.bin
+- store.bin         : one JSON payload per document (title, url, date, content)
+- delta.jsonl       : payloads added or replaced since the last compaction
+
+The binary files are memory-mapped, so loading is O(term dictionary) and the
+article text only becomes resident when a result is actually returned.
+Incremental additions live in an in-memory delta segment; `flush()` appends
+them to delta.jsonl, which other processes replay with `refresh()`. Only once
+the delta outgrows COMPACT_RATIO of the base (or COMPACT_MAX_DOCS) does
+`save()` compact everything into a new set of base files.
+"""
+
+import calendar
+import heapq
+import json
+import math
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from lexical import BM25_B, BM25_K1, tokenize
+
+FORMAT_VERSION = 1
+
+# Terms present in more than this share of the archive ("maroc", "prix"...)
+# only re-score candidates found by rarer terms, see LexicalIndex.search
+COMMON_TERM_RATIO = float(os.getenv("LEXICAL_COMMON_TERM_RATIO", "0.05"))
+
+# The base files are rewritten (O(corpus)) only when the delta segment holds
+# more than this share of the base doc count, or this many docs
+COMPACT_RATIO = float(os.getenv("LEXICAL_COMPACT_RATIO", "0.1"))
+COMPACT_MAX_DOCS = int(os.getenv("LEXICAL_COMPACT_MAX_DOCS", "5000"))
+
+DELTA_FILE = "delta.jsonl"
+
+_ARRAY_FILES = {
+    "doc_len": ("doc_len.bin", "I"),
+    "doc_date": ("doc_date.bin", "q"),
+    "doc_post_id": ("doc_post_id.bin", "q"),
+    "store_offsets": ("store_offsets.bin", "Q"),
+}
+
+
+def date_to_epoch(value: Optional[str]) -> int:
+    """Convert a WordPress ISO date to epoch seconds (naive dates are treated as UTC)."""
+    if not value:
+        return 0
+    try:
+        return calendar.timegm(datetime.fromisoformat(value[:19]).timetuple())
+    except ValueError:
+        return 0
+
+
+class LexicalIndex:
+    """Inverted index with compact array-backed postings and BM25 scoring."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self._mmaps: List[mmap.mmap] = []
+        self._reset_base()
+        self._reset_delta()
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def _reset_base(self) -> None:
+        self.base_count = 0
+        self.base_total_len = 0
+        self.terms: Dict[str, Tuple[int, int]] = {}
+        self.postings = memoryview(array("I"))
+        self.doc_len = memoryview(array("I"))
+        self.doc_date = memoryview(array("q"))
+        self.doc_post_id = memoryview(array("q"))
+        self.store_offsets = memoryview(array("Q", [0]))
+        self.store = memoryview(b"")
+
+    def _reset_delta(self) -> None:
+        self.delta_postings: Dict[str, Tuple[array, array]] = {}
+        self.delta_len = array("I")
+        self.delta_date = array("q")
+        self.delta_post_id = array("q")
+        self.delta_payloads: List[Dict] = []
+        self.deleted: set = set()
+        self.doc_by_post: Dict[int, int] = {
+            int(pid): doc for doc, pid in enumerate(self.doc_post_id)
+        }
+        self.total_len = self.base_total_len
+        self._scoring_cache = None
+        # Delta payloads not yet appended to delta.jsonl, and how far it was read
+        self._unflushed: List[Dict] = []
+        self._delta_file_pos = 0
+
+    def __len__(self) -> int:
+        return self.base_count + len(self.delta_len) - len(self.deleted)
+
+    # ------------------------------------------------------------------
+    # Loading / saving
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """Open an index directory (an empty index if it doesn't exist yet)."""
+        index = cls(path)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with index.lock:
+                index._load_files()
+                index.refresh()
+        return index
+
+    def _map(self, filename: str, typecode: str) -> memoryview:
+        full_path = os.path.join(self.path, filename)
+        if os.path.getsize(full_path) == 0:
+            return memoryview(array(typecode))
+        with open(full_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmaps.append(mm)
+        view = memoryview(mm)
+        return view if typecode == "B" else view.cast(typecode)
+
+    def _load_files(self) -> None:
+        with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexical index version: {meta.get('version')}")
+
+        self.base_count = meta["doc_count"]
+        self.base_total_len = meta["total_len"]
+        self.terms = {term: (entry[0], entry[1]) for term, entry in meta["terms"].items()}
+        self.postings = self._map("postings.bin", "I")
+        for attr, (filename, typecode) in _ARRAY_FILES.items():
+            setattr(self, attr, self._map(filename, typecode))
+        self.store = self._map("store.bin", "B")
+        self._reset_delta()
+
+    def _release(self) -> None:
+        # Views must be released before the underlying mmaps can be closed
+        for attr in ("postings", "doc_len", "doc_date", "doc_post_id", "store_offsets", "store"):
+            getattr(self, attr).release()
+        for mm in self._mmaps:
+            mm.close()
+        self._mmaps = []
+        self._reset_base()
+
+    def save(self) -> None:
+        """Compact base + delta segments (minus deleted docs) to disk and remap."""
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            docs = [doc for doc in range(self.base_count + len(self.delta_len)) if doc not in self.deleted]
+            remap = {old: new for new, old in enumerate(docs)}
+
+            postings = array("I")
+            terms: Dict[str, List[int]] = {}
+            for term in sorted(set(self.terms) | set(self.delta_postings)):
+                doc_ids, tfs = array("I"), array("I")
+                for doc, tf in self._iter_postings(term):
+                    if doc in remap:
+                        doc_ids.append(remap[doc])
+                        tfs.append(tf)
+                if doc_ids:
+                    terms[term] = [len(postings), len(doc_ids)]
+                    postings.extend(doc_ids)
+                    postings.extend(tfs)
+
+            arrays = {attr: array(typecode) for attr, (_, typecode) in _ARRAY_FILES.items()}
+            arrays["store_offsets"].append(0)
+            store = bytearray()
+            total_len = 0
+            for doc in docs:
+                arrays["doc_len"].append(self._doc_len(doc))
+                arrays["doc_date"].append(self._doc_date(doc))
+                arrays["doc_post_id"].append(self._doc_post_id(doc))
+                store.extend(json.dumps(self.get_payload(doc), ensure_ascii=False).encode("utf-8"))
+                arrays["store_offsets"].append(len(store))
+                total_len += self._doc_len(doc)
+
+            meta = {
+                "version": FORMAT_VERSION,
+                "doc_count": len(docs),
+                "total_len": total_len,
+                "terms": terms,
+            }
+
+            # Write everything to temp files first, then swap them in; readers
+            # holding the old mmaps keep a valid view of the previous files.
+            files = {"postings.bin": postings.tobytes(), "store.bin": bytes(store)}
+            for attr, (filename, _) in _ARRAY_FILES.items():
+                files[filename] = arrays[attr].tobytes()
+            files["meta.json"] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+            for filename, data in files.items():
+                with open(os.path.join(self.path, filename + ".tmp"), "wb") as f:
+                    f.write(data)
+            for filename in files:  # meta.json last: it is what marks the index as present
+                os.replace(os.path.join(self.path, filename + ".tmp"), os.path.join(self.path, filename))
+            # Replaying a stale delta over the new base is harmless (replace by post_id)
+            try:
+                os.remove(os.path.join(self.path, DELTA_FILE))
+            except FileNotFoundError:
+                pass
+
+            self._release()
+            self._load_files()
+
+    def needs_compaction(self) -> bool:
+        delta_docs = len(self.delta_len)
+        return delta_docs > 0 and (
+            self.base_count == 0
+            or delta_docs >= COMPACT_MAX_DOCS
+            or delta_docs > COMPACT_RATIO * self.base_count
+        )
+
+    def flush(self) -> bool:
+        """Persist the delta segment: append new payloads to delta.jsonl, or
+        compact with `save()` past the thresholds. Returns True if compacted."""
+        with self.lock:
+            if self.needs_compaction():
+                self.save()
+                return True
+            if not self._unflushed:
+                return False
+            os.makedirs(self.path, exist_ok=True)
+            # Pick up lines appended by other processes first so that our own
+            # lines are not replayed again by the next refresh()
+            self.refresh()
+            data = b"".join(
+                json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+                for payload in self._unflushed
+            )
+            with open(os.path.join(self.path, DELTA_FILE), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                self._delta_file_pos = f.tell()
+            self._unflushed = []
+            return False
+
+    def refresh(self) -> int:
+        """Replay payloads appended to delta.jsonl since the last read. Returns their count."""
+        with self.lock:
+            try:
+                with open(os.path.join(self.path, DELTA_FILE), "rb") as f:
+                    f.seek(self._delta_file_pos)
+                    data = f.read()
+            except FileNotFoundError:
+                return 0
+            end = data.rfind(b"\n") + 1  # a partially written last line is read next time
+            if not end:
+                return 0
+            payloads = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+            self._delta_file_pos += end
+            return self._add(payloads, persist=False)
+
+    # ------------------------------------------------------------------
+    # Document accessors (base docs first, then delta docs)
+    # ------------------------------------------------------------------
+
+    def _doc_len(self, doc: int) -> int:
+        return self.doc_len[doc] if doc < self.base_count else self.delta_len[doc - self.base_count]
+
+    def _doc_date(self, doc: int) -> int:
+        return self.doc_date[doc] if doc < self.base_count else self.delta_date[doc - self.base_count]
+
+    def _doc_post_id(self, doc: int) -> int:
+        return self.doc_post_id[doc] if doc < self.base_count else self.delta_post_id[doc - self.base_count]
+
+    def get_payload(self, doc: int) -> Dict:
+        if doc >= self.base_count:
+            return self.delta_payloads[doc - self.base_count]
+        start, end = self.store_offsets[doc], self.store_offsets[doc + 1]
+        return json.loads(bytes(self.store[start:end]).decode("utf-8"))
+
+    def _iter_postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        entry = self.terms.get(term)
+        if entry is not None:
+            offset, df = entry
+            yield from zip(self.postings[offset:offset + df], self.postings[offset + df:offset + 2 * df])
+        delta = self.delta_postings.get(term)
+        if delta is not None:
+            yield from zip(*delta)
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def add_documents(self, payloads: Iterable[Dict]) -> int:
+        """Add or replace documents (keyed by `post_id`) in the delta segment.
+
+        They are kept in memory until `flush()` (or `save()`).
+        """
+        return self._add(payloads, persist=True)
+
+    def _add(self, payloads: Iterable[Dict], persist: bool) -> int:
+        added = 0
+        with self.lock:
+            for payload in payloads:
+                post_id = int(payload["post_id"])
+                tokens = tokenize(f"{payload.get('title', '')}\n\n{payload.get('content', '')}")
+                if not tokens:
+                    continue
+
+                previous = self.doc_by_post.get(post_id)
+                if previous is not None and previous not in self.deleted:
+                    self.deleted.add(previous)
+                    self.total_len -= self._doc_len(previous)
+
+                doc = self.base_count + len(self.delta_len)
+                for term, tf in Counter(tokens).items():
+                    doc_ids, tfs = self.delta_postings.setdefault(term, (array("I"), array("I")))
+                    doc_ids.append(doc)
+                    tfs.append(tf)
+                self.delta_len.append(len(tokens))
+                self.delta_date.append(date_to_epoch(payload.get("date")))
+                self.delta_post_id.append(post_id)
+                stored = {
+                    "post_id": post_id,
+                    "title": payload.get("title", ""),
+                    "url": payload.get("url", ""),
+                    "date": payload.get("date", ""),
+                    "content": payload.get("content", ""),
+                }
+                self.delta_payloads.append(stored)
+                if persist:
+                    self._unflushed.append(stored)
+                self.doc_by_post[post_id] = doc
+                self.total_len += len(tokens)
+                added += 1
+        return added
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _scoring_arrays(self, avg_len: float) -> Tuple[array, array]:
+        """Per-doc BM25 length norms and dates over base + delta docs (cached)."""
+        if self._scoring_cache is None or self._scoring_cache[0] != (avg_len, len(self.delta_len)):
+            k1, b = BM25_K1, BM25_B
+            lengths = list(self.doc_len) + list(self.delta_len)
+            norms = array("d", [k1 * (1 - b + b * length / avg_len) for length in lengths])
+            dates = array("q", self.doc_date)
+            dates.extend(self.delta_date)
+            self._scoring_cache = ((avg_len, len(self.delta_len)), norms, dates)
+        return self._scoring_cache[1], self._scoring_cache[2]
+
+    def _posting_blocks(self, term: str) -> List[Tuple[Sequence[int], Sequence[int]]]:
+        blocks = []
+        entry = self.terms.get(term)
+        if entry is not None:
+            offset, df = entry
+            blocks.append((self.postings[offset:offset + df], self.postings[offset + df:offset + 2 * df]))
+        delta = self.delta_postings.get(term)
+        if delta is not None:
+            blocks.append(delta)
+        return blocks
+
+    def search(self, query: str, top_k: int = 5, min_date: Optional[int] = None) -> List[Dict]:
+        """BM25 search. `min_date` (epoch seconds) keeps only docs published after it.
+
+        Terms are scored from rarest to most common. Once rare terms have
+        produced at least `top_k` candidates, very common terms (df above
+        COMMON_TERM_RATIO of the corpus, near-zero IDF) only re-score those
+        candidates via binary search in their sorted postings instead of
+        scanning postings that cover most of the archive.
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            n_docs = len(self)
+            if not terms or n_docs == 0:
+                return []
+            norms, dates = self._scoring_arrays(self.total_len / n_docs)
+            deleted = self.deleted
+            scores: Dict[int, float] = {}
+            get = scores.get
+
+            term_blocks = []
+            for term in terms:
+                blocks = self._posting_blocks(term)
+                df = sum(len(doc_ids) for doc_ids, _ in blocks)
+                if df:
+                    term_blocks.append((df, blocks))
+            term_blocks.sort(key=lambda item: item[0])
+
+            for df, blocks in term_blocks:
+                weight = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * (BM25_K1 + 1)
+
+                if df > COMMON_TERM_RATIO * n_docs and top_k <= len(scores) < df // 4:
+                    for doc in list(scores):
+                        for doc_ids, tfs in blocks:
+                            i = bisect_left(doc_ids, doc)
+                            if i < len(doc_ids) and doc_ids[i] == doc:
+                                tf = tfs[i]
+                                scores[doc] += weight * tf / (tf + norms[doc])
+                                break
+                    continue
+
+                for doc_ids, tfs in blocks:
+                    if min_date is None and not deleted:
+                        # Fast path: no per-posting filtering
+                        for doc, tf in zip(doc_ids, tfs):
+                            scores[doc] = get(doc, 0.0) + weight * tf / (tf + norms[doc])
+                        continue
+                    for doc, tf in zip(doc_ids, tfs):
+                        if doc in deleted or (min_date is not None and dates[doc] < min_date):
+                            continue
+                        scores[doc] = get(doc, 0.0) + weight * tf / (tf + norms[doc])
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            results = []
+            for doc, score in best:
+                result = dict(self.get_payload(doc))
+                result["score"] = score
+                results.append(result)
+            return results
@@ -0,0 +1,157 @@
+"""
+Logs structurés non bloquants.
+
+Les handlers des modules ne font que poser l'enregistrement dans une file
+(QueueHandler); un thread QueueListener se charge du formatage JSON et de
+l'écriture sur stdout. Une requête ne bloque donc jamais sur l'I/O des logs.
+
+- LOG_LEVEL: niveau global (INFO par défaut, DEBUG pour les détails du hot path)
+- LOG_FORMAT: json (une ligne JSON par enregistrement) ou text (lisible, CLI)
+- LOG_DEBUG_SAMPLE_RATE: fraction des logs DEBUG conservés (1.0 = tous)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from tracing import current_trace_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "")
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+# Taille max de la file: au-delà, les enregistrements sont perdus plutôt que de bloquer
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributs standards d'un LogRecord (le reste vient de extra={...})
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, champs extra inclus."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Échantillonne les logs DEBUG et ajoute le trace id de la requête.
+
+    Exécuté dans le thread appelant (avant la file), là où le contexte de la
+    requête est encore disponible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and LOG_DEBUG_SAMPLE_RATE < 1.0:
+            if random.random() >= LOG_DEBUG_SAMPLE_RATE:
+                return False
+        if not hasattr(record, "trace_id"):
+            trace_id = current_trace_id()
+            if trace_id:
+                record.trace_id = trace_id
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui jette l'enregistrement si la file est pleine."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Le message est résolu ici (les args peuvent changer ensuite), la
+        # traceback est gardée à part pour le champ "exc" du JSON
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging(default_format: str = "json", queued: bool = True) -> None:
+    """Configure le logger racine (idempotent).
+
+    queued=False écrit directement depuis le thread appelant (scripts CLI).
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    fmt = (LOG_FORMAT or default_format).lower()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    # Bibliothèques bavardes en DEBUG (requêtes HTTP, gRPC)
+    for noisy in ("httpx", "httpcore", "urllib3", "grpc"):
+        logging.getLogger(noisy).setLevel(max(logging.INFO, root.level))
+
+    if not queued:
+        stream_handler.addFilter(ContextFilter())
+        root.handlers = [stream_handler]
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    root.handlers = [_queue_handler]
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _restart_after_fork() -> None:
+    """Workers gunicorn (preload): nouvelle file et nouveau thread d'écriture.
+
+    Le thread du parent n'existe pas dans l'enfant, et la file copiée peut
+    avoir été verrouillée au moment du fork.
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Vide la file et arrête le thread d'écriture."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,16 +1,46 @@
-from fastapi import FastAPI, HTTPException
+# En premier: mesure du temps d'import de tout le reste (STARTUP_PROFILE_IMPORTS)
+from startup import startup_timer
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
-from agent import ConsoNewsAgent
-from session_manager import session_manager
+from typing import Callable, List, Optional
+from session_manager import normalize_session_id, session_manager
 from langchain_core.messages import HumanMessage, AIMessage
 from apscheduler.schedulers.background import BackgroundScheduler
-from news_store import index_new_posts
+from news_store import INCREMENTAL_WINDOW_HOURS, INDEXING_INTERVAL_HOURS, index_new_posts
+from metrics import ACTIVE_SESSIONS, HTTP_REQUEST_DURATION, INDEXING_LEADER, render_latest
+from logging_config import setup_logging
+from usage import track_usage, usage_stats
+from warmup import readiness, start_warmup
+from admission import ADMISSION_PATHS, OVERLOADED_DETAIL, Overloaded, admission_gate
+from rate_limit import RATE_LIMIT_DETAIL, client_ip, rate_limiter
+from ws_chat import CLOSE_TRY_AGAIN_LATER, ChatSocket
+from retrieval_cache import ConversationCache, use_retrieval_cache
+from resilience import BREAKER_RESET_S, CircuitOpen, DeadlineExceeded, breakers, request_deadline
+from tracing import current_trace_id, set_attributes, server_span, setup_tracing, shutdown_tracing
+from cassette import install_cassette
+from profiling import (
+    PROFILED_PATHS,
+    check_admin_token,
+    profile_request,
+    profile_store,
+    setup_profiling,
+    shutdown_profiling,
+)
 import uvicorn
+import logging
 import os
+import tempfile
+import threading
+import time
+
+setup_logging()
+logger = logging.getLogger(__name__)
+# Enregistrement / rejeu des appels externes (CASSETTE_MODE, désactivé par défaut)
+install_cassette()
 
 # Initialisation de l'application FastAPI
 app = FastAPI(
@@ -29,29 +59,127 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def profile_chat_request(request: Request, call_next):
+    """Profil CPU + chronologie des requêtes de chat (sur demande admin ou si lentes)."""
+    if request.method != "POST" or request.url.path not in PROFILED_PATHS:
+        return await call_next(request)
+    forced = (
+        (request.headers.get("X-Profile") == "1" or request.query_params.get("profile") == "1")
+        and check_admin_token(request.headers.get("X-Admin-Token"))
+    )
+    with profile_request(f"{request.method} {request.url.path}", forced=forced) as profile:
+        response = await call_next(request)
+    if profile.id:
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Limite les exécutions simultanées de l'agent; 503 + Retry-After si saturé.
+    
+    Le budget de temps de la requête (CHAT_DEADLINE_S) démarre ici: l'attente
+    d'admission en fait partie.
+    """
+    if request.method != "POST" or request.url.path not in ADMISSION_PATHS:
+        return await call_next(request)
+    try:
+        with request_deadline():
+            async with admission_gate.admit(request.url.path) as degradation:
+                set_attributes(**{"admission.degradation": degradation.name})
+                response = await call_next(request)
+    except Overloaded as e:
+        logger.warning(f"🚦 Chat request rejected ({e.reason})", extra={"path": request.url.path})
+        return JSONResponse(
+            {"detail": OVERLOADED_DETAIL},
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if degradation.level:
+        response.headers["X-Degradation"] = degradation.name
+    return response
+
+
+@app.middleware("http")
+async def rate_limit_by_ip(request: Request, call_next):
+    """Quota par IP client sur les endpoints coûteux (429 + Retry-After)."""
+    if request.method == "POST":
+        ip = client_ip(request.headers, request.client.host if request.client else None)
+        retry_after = await rate_limiter.check_async(request.url.path, "ip", ip)
+        if retry_after:
+            logger.warning("🚫 Rate limit (ip)", extra={"path": request.url.path, "client_ip": ip})
+            return JSONResponse(
+                {"detail": RATE_LIMIT_DETAIL}, status_code=429, headers={"Retry-After": str(retry_after)}
+            )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Span racine par requête; le trace id est renvoyé dans X-Trace-Id."""
+    with server_span(f"{request.method} {request.url.path}", **{
+        "http.request.method": request.method,
+        "url.path": request.url.path,
+    }) as request_span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            request_span.update_name(f"{request.method} {route.path}")
+            request_span.set_attribute("http.route", route.path)
+        request_span.set_attribute("http.response.status_code", response.status_code)
+        trace_id = current_trace_id()
+        if trace_id:
+            response.headers["X-Trace-Id"] = trace_id
+        return response
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Mesure la durée de chaque requête, étiquetée par route (template) et statut."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Template (/session/{session_id}) plutôt que le chemin pour borner la cardinalité
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status),
+        ).observe(time.perf_counter() - started)
+
+
 @app.on_event("startup")
 def startup_event():
     """Démarre le planificateur pour l'indexation incrémentale des nouveaux articles."""
+    setup_tracing()
+    setup_profiling()
+
+    # Agent, clients et connexions préparés en arrière-plan: le port s'ouvre
+    # sans les attendre, /ready passe à 200 quand ils sont prêts
+    start_warmup(get_agent)
+    
     # Start scheduler first so port opens quickly
     scheduler.start()
     
-    # Check for new posts on startup (last 14 hours to catch any missed)
-    print("📰 Scheduling startup indexing (last 14 hours)...")
-    scheduler.add_job(
-        index_new_posts, 
-        "date",  # Run once immediately
-        kwargs={"hours": 14}
-    )
-    
-    # Tâche récurrente toutes les 12 heures pour indexer les nouveaux articles
-    # Fetch 14h window to have 2h overlap buffer
-    scheduler.add_job(
-        index_new_posts, 
-        "interval", 
-        hours=12, 
-        kwargs={"hours": 14}
-    )
-    print("✅ Scheduler started: indexing every 12h (14h window)")
+    # Un seul worker indexe; les autres retentent de prendre le rôle
+    # (leader arrêté ou relancé par gunicorn)
+    if not schedule_indexing() and INDEXING_ENABLED:
+        logger.info(f"📰 Indexing handled by another worker (lock {INDEXING_LOCK_FILE})")
+        scheduler.add_job(
+            schedule_indexing,
+            "interval",
+            seconds=INDEXING_LEADER_RETRY_S,
+            id=INDEXING_LEADER_JOB_ID,
+        )
+
+    # Le port s'ouvre juste après cet événement
+    ready_after = startup_timer.mark("startup")
+    logger.info(f"🚀 Startup complete {ready_after:.2f}s after process start", extra=startup_timer.report())
 
 
 @app.on_event("shutdown")
@@ -59,13 +187,110 @@ def shutdown_event():
     """Arrête proprement le planificateur."""
     if scheduler.running:
         scheduler.shutdown()
+    shutdown_profiling()
+    shutdown_tracing()
+
+# Agent construit au premier usage (ou par le warm-up au démarrage): l'import
+# de langchain_openai / langgraph et la création des clients ne retardent pas
+# l'ouverture du port
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent():
+    """Agent partagé, construit au premier appel."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                from agent import ConsoNewsAgent
+                _agent = ConsoNewsAgent()
+    return _agent
+
 
-# Initialisation de l'agent
-agent = ConsoNewsAgent()
+async def aget_agent():
+    """get_agent() sans bloquer la boucle d'événements si l'agent n'est pas encore construit."""
+    return _agent if _agent is not None else await run_in_threadpool(get_agent)
+
+
+# Jauge lue à chaque scrape plutôt que maintenue à chaque création/suppression
+ACTIVE_SESSIONS.set_function(session_manager.get_all_sessions_count)
 
 # Planificateur pour la synchronisation des articles WordPress
 scheduler = BackgroundScheduler()
 
+# Indexation planifiée: un seul leader par machine (verrou de fichier) quand
+# plusieurs workers gunicorn partagent le conteneur. INDEXING_ENABLED=0 sur les
+# instances supplémentaires d'un déploiement multi-instances.
+INDEXING_ENABLED = os.getenv("INDEXING_ENABLED", "1").lower() in ("1", "true", "yes")
+INDEXING_LOCK_FILE = os.getenv(
+    "INDEXING_LOCK_FILE", os.path.join(tempfile.gettempdir(), "conso-news-indexing.lock")
+)
+INDEXING_LEADER_RETRY_S = float(os.getenv("INDEXING_LEADER_RETRY_S", "60"))
+INDEXING_LEADER_JOB_ID = "indexing_leadership"
+# Fichier verrouillé tant que ce process est leader (libéré à sa fin)
+_indexing_lock = None
+
+
+def acquire_indexing_lock() -> bool:
+    """Prend le verrou d'indexation sans attendre; vrai si ce process le détient."""
+    global _indexing_lock
+    if _indexing_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # Pas de fcntl (Windows): un seul process, pas de concurrence
+        return True
+    lock_file = open(INDEXING_LOCK_FILE, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _indexing_lock = lock_file
+    return True
+
+
+def schedule_indexing() -> bool:
+    """Planifie l'indexation incrémentale si ce process devient leader."""
+    if not INDEXING_ENABLED or not acquire_indexing_lock():
+        return False
+    INDEXING_LEADER.set(1)
+    if scheduler.get_job(INDEXING_LEADER_JOB_ID):
+        scheduler.remove_job(INDEXING_LEADER_JOB_ID)
+    
+    # Check for new posts on startup (last window to catch any missed)
+    logger.info(f"📰 Indexing leader (pid {os.getpid()}), scheduling startup indexing "
+                f"(last {INCREMENTAL_WINDOW_HOURS} hours)...")
+    scheduler.add_job(
+        index_new_posts, 
+        "date",  # Run once immediately
+        kwargs={"hours": INCREMENTAL_WINDOW_HOURS}
+    )
+    
+    # Tâche récurrente toutes les 12 heures pour indexer les nouveaux articles
+    # Fenêtre plus longue que l'intervalle: recouvrement entre deux passages
+    scheduler.add_job(
+        index_new_posts, 
+        "interval", 
+        hours=INDEXING_INTERVAL_HOURS, 
+        kwargs={"hours": INCREMENTAL_WINDOW_HOURS}
+    )
+    logger.info(f"✅ Scheduler started: indexing every {INDEXING_INTERVAL_HOURS}h "
+                f"({INCREMENTAL_WINDOW_HOURS}h window)")
+    return True
+
+def unavailable_error(e: Exception) -> HTTPException:
+    """Budget de la requête épuisé (504) ou dépendance coupée par son disjoncteur (503)."""
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail="La réponse a pris trop de temps, veuillez réessayer.")
+    return HTTPException(
+        status_code=503,
+        detail="Service momentanément indisponible, veuillez réessayer dans quelques instants.",
+        headers={"Retry-After": str(int(BREAKER_RESET_S))},
+    )
+
 # Modèles Pydantic pour les requêtes/réponses
 class ChatMessage(BaseModel):
     role: str
@@ -122,6 +347,18 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def ready_check():
+    """
+    Disponibilité pour le load balancer: 200 quand le warm-up a réussi, 503 sinon.
+    
+    Returns:
+        État et latence de chaque dépendance (agent, Qdrant, embeddings, LLM)
+    """
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -146,13 +383,18 @@ async def chat(request: ChatRequest):
                     chat_history.append(AIMessage(content=msg.content))
         
         # Obtenir la réponse de l'agent
-        result = await agent.achat(request.message, chat_history)
+        with track_usage("/chat"):
+            agent = await aget_agent()
+            result = await agent.achat(request.message, chat_history)
         
         return ChatResponse(
             response=result["response"],
             success=True
         )
     
+    except (DeadlineExceeded, CircuitOpen) as e:
+        raise unavailable_error(e)
+    
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -172,9 +414,14 @@ async def chat_simple(request: ChatRequest):
         Réponse simple en texte
     """
     try:
-        result = await agent.achat(request.message)
+        with track_usage("/chat/simple"):
+            agent = await aget_agent()
+            result = await agent.achat(request.message)
         return {"response": result["response"]}
     
+    except (DeadlineExceeded, CircuitOpen) as e:
+        raise unavailable_error(e)
+    
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -189,10 +436,12 @@ async def create_session():
     """
     Crée une nouvelle session de chat.
     
+    Facultatif: /session/chat et /ws/chat créent la session au premier message.
+    
     Returns:
         SessionResponse avec le session_id
     """
-    session_id = session_manager.create_session()
+    session_id = await run_in_threadpool(session_manager.create_session)
     return {
         "session_id": session_id,
         "message": "Session créée avec succès"
@@ -204,46 +453,27 @@ async def chat_with_session(request: SessionChatRequest):
     """
     Chat avec gestion automatique de l'historique via session.
     
+    Seul appel nécessaire: la session est reprise, ou créée si elle est
+    absente ou expirée (sous l'ID proposé s'il s'agit d'un UUID valide).
+    
     Args:
         request: SessionChatRequest avec message et session_id optionnel
     
     Returns:
         SessionChatResponse avec la réponse et le session_id
     """
+    # Quota par session (le quota par IP est appliqué par le middleware), sur
+    # l'ID canonique: une autre graphie du même UUID n'ouvre pas un nouveau quota
+    session_id = normalize_session_id(request.session_id)
+    retry_after = await rate_limiter.check_async("/session/chat", "session", session_id)
+    if retry_after:
+        raise HTTPException(status_code=429, detail=RATE_LIMIT_DETAIL, headers={"Retry-After": str(retry_after)})
+    
     try:
-        # Créer une nouvelle session si aucune n'est fournie
-        session_id = request.session_id
-        if not session_id:
-            session_id = session_manager.create_session()
-        
-        # Récupérer l'historique de la session
-        chat_history = session_manager.get_messages(session_id)
-        if chat_history is None:
-            # Session expirée ou inexistante, créer une nouvelle
-            session_id = session_manager.create_session()
-            chat_history = []
-        
-        # Ajouter le message utilisateur
-        user_message = HumanMessage(content=request.message)
-        session_manager.add_message(session_id, user_message)
-        
-        # Obtenir la réponse de l'agent avec l'historique
-        result = await agent.achat(request.message, chat_history)
-        
-        # Ajouter la réponse de l'assistant à l'historique
-        assistant_message = AIMessage(content=result["response"])
-        session_manager.add_message(session_id, assistant_message)
-        
-        # Récupérer le nombre de messages
-        session_info = session_manager.get_session_info(session_id)
-        message_count = session_info["message_count"] if session_info else 0
-        
-        return SessionChatResponse(
-            response=result["response"],
-            session_id=session_id,
-            message_count=message_count,
-            success=True
-        )
+        return await run_session_chat(session_id, request.message, "/session/chat")
+    
+    except (DeadlineExceeded, CircuitOpen) as e:
+        raise unavailable_error(e)
     
     except Exception as e:
         raise HTTPException(
@@ -252,6 +482,57 @@ async def chat_with_session(request: SessionChatRequest):
         )
 
 
+async def run_session_chat(session_id: Optional[str], message: str, endpoint: str,
+                           on_token: Optional[Callable[[str], None]] = None) -> SessionChatResponse:
+    """
+    Un tour de conversation dans une session (HTTP /session/chat et WebSocket /ws/chat).
+    
+    Args:
+        session_id: Session à poursuivre (créée si absente ou expirée)
+        message: Message de l'utilisateur
+        endpoint: Étiquette des métriques d'usage
+        on_token: Appelé avec chaque morceau de la réponse (streaming)
+    
+    Returns:
+        SessionChatResponse avec la réponse et le session_id
+    """
+    # Reprise ou création de la session, historique et cache de recherche en
+    # une opération (hors boucle d'événements: client Redis bloquant)
+    session_id, chat_history, retrieval_data = await run_in_threadpool(session_manager.start_turn, session_id)
+    set_attributes(**{
+        "session.id": session_id,
+        "session.history_messages": len(chat_history),
+        "chat.message_chars": len(message),
+    })
+    
+    # Articles et recherches web des tours précédents (questions de suivi)
+    retrieval = ConversationCache(retrieval_data)
+    
+    # Obtenir la réponse de l'agent avec l'historique
+    with track_usage(endpoint) as usage, use_retrieval_cache(retrieval):
+        agent = await aget_agent()
+        result = await agent.achat(message, chat_history, on_token=on_token)
+    
+    # Question et réponse enregistrées ensemble, avec l'usage et le cache de
+    # recherche (s'il a changé): un tour en échec ne laisse pas de question
+    # sans réponse dans l'historique
+    await run_in_threadpool(
+        session_manager.end_turn,
+        session_id,
+        [HumanMessage(content=message), AIMessage(content=result["response"])],
+        usage.to_dict(),
+        retrieval.to_dict() if retrieval.dirty else None,
+    )
+    message_count = len(chat_history) + 2
+    
+    return SessionChatResponse(
+        response=result["response"],
+        session_id=session_id,
+        message_count=message_count,
+        success=True
+    )
+
+
 @app.get("/session/{session_id}/info")
 async def get_session_info(session_id: str):
     """
@@ -263,7 +544,7 @@ async def get_session_info(session_id: str):
     Returns:
         Informations de la session
     """
-    info = session_manager.get_session_info(session_id)
+    info = await run_in_threadpool(session_manager.get_session_info, session_id)
     if info is None:
         raise HTTPException(
             status_code=404,
@@ -283,7 +564,7 @@ async def delete_session(session_id: str):
     Returns:
         Message de confirmation
     """
-    success = session_manager.clear_session(session_id)
+    success = await run_in_threadpool(session_manager.clear_session, session_id)
     if not success:
         raise HTTPException(
             status_code=404,
@@ -292,6 +573,99 @@ async def delete_session(session_id: str):
     return {"message": "Session supprimée avec succès"}
 
 
+# ===== CANAL WEBSOCKET DU WIDGET =====
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    Connexion persistante du widget: reprise de session, messages et réponses
+    en streaming (protocole dans ws_chat.py).
+    
+    Args:
+        session_id: Session par défaut des messages (query string), reprise
+            ou créée au premier message comme dans /session/chat
+    """
+    ip = client_ip(websocket.headers, websocket.client.host if websocket.client else None)
+    retry_after = await rate_limiter.check_async("/ws/chat", "connect", ip)
+    if retry_after:
+        logger.warning("🚫 Rate limit (connect)", extra={"path": "/ws/chat", "client_ip": ip})
+        await websocket.accept()
+        await websocket.send_json({
+            "type": "error", "id": None, "status": 429, "detail": RATE_LIMIT_DETAIL, "retry_after": retry_after,
+        })
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="rate_limited")
+        return
+    
+    # Pas d'accès au stockage des sessions avant le premier message
+    socket = ChatSocket(websocket, handle_ws_frame, client_ip=ip, session_id=normalize_session_id(session_id))
+    await socket.serve()
+
+
+async def handle_ws_frame(socket: ChatSocket, frame: dict) -> None:
+    """Trame "message" ou "reset" d'une connexion /ws/chat (une à la fois)."""
+    if frame["type"] == "reset":
+        if socket.session_id:
+            await run_in_threadpool(session_manager.clear_session, socket.session_id)
+        socket.session_id = None
+        socket.send("session", session_id=None, message_count=0)
+        return
+    
+    message_id = frame.get("id")
+    message = frame.get("message")
+    if not isinstance(message, str) or not message.strip():
+        socket.send("error", id=message_id, status=400, detail="Message vide.")
+        return
+    if frame.get("session_id"):
+        socket.session_id = normalize_session_id(frame["session_id"])
+    
+    # Mêmes quotas que /session/chat, par message reçu
+    for scope, ident in (("ip", socket.client_ip), ("session", socket.session_id)):
+        retry_after = await rate_limiter.check_async("/ws/chat", scope, ident)
+        if retry_after:
+            logger.warning(f"🚫 Rate limit ({scope})", extra={"path": "/ws/chat", "client_ip": socket.client_ip})
+            socket.send("error", id=message_id, status=429, detail=RATE_LIMIT_DETAIL, retry_after=retry_after)
+            return
+    
+    started = time.perf_counter()
+    status = 200
+    with server_span("WS /ws/chat", **{"url.path": "/ws/chat", "http.route": "/ws/chat"}) as span:
+        try:
+            # Budget et admission par message, comme le middleware admission_control
+            with request_deadline():
+                async with admission_gate.admit("/ws/chat") as degradation:
+                    set_attributes(**{"admission.degradation": degradation.name})
+                    result = await run_session_chat(
+                        socket.session_id, message, "/ws/chat",
+                        on_token=lambda text: socket.push_token(message_id, text),
+                    )
+            socket.session_id = result.session_id
+            # Réponse complète: fait foi si des tokens ont été perdus ou fusionnés
+            socket.send(
+                "done",
+                id=message_id,
+                response=result.response,
+                session_id=result.session_id,
+                message_count=result.message_count,
+                degradation=degradation.name,
+            )
+        except Overloaded as e:
+            status = 503
+            logger.warning(f"🚦 Chat request rejected ({e.reason})", extra={"path": "/ws/chat"})
+            socket.send("error", id=message_id, status=status, detail=OVERLOADED_DETAIL, retry_after=e.retry_after)
+        except (DeadlineExceeded, CircuitOpen) as e:
+            error = unavailable_error(e)
+            status = error.status_code
+            retry_after = int(error.headers["Retry-After"]) if error.headers else None
+            socket.send("error", id=message_id, status=status, detail=error.detail, retry_after=retry_after)
+        except Exception as e:
+            status = 500
+            logger.exception(f"❌ WebSocket chat failed: {e}")
+            socket.send("error", id=message_id, status=status, detail="Erreur lors du traitement de la requête.")
+        finally:
+            span.set_attribute("http.response.status_code", status)
+            HTTP_REQUEST_DURATION.labels("WS", "/ws/chat", str(status)).observe(time.perf_counter() - started)
+
+
 @app.get("/sessions/stats")
 async def get_sessions_stats():
     """
@@ -301,10 +675,67 @@ async def get_sessions_stats():
         Nombre de sessions actives
     """
     return {
-        "active_sessions": session_manager.get_all_sessions_count()
+        "active_sessions": await run_in_threadpool(session_manager.get_all_sessions_count),
+        "admission": admission_gate.snapshot(),
+        "circuits": {name: breaker.snapshot() for name, breaker in breakers.items()},
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Exposition Prometheus (latences par étape, outils, caches, indexation)."""
+    # Hors boucle d'événements: la jauge des sessions actives interroge Redis
+    content, media_type = await run_in_threadpool(render_latest)
+    return Response(content=content, media_type=media_type)
+
+
+@app.get("/usage/stats")
+async def get_usage_stats():
+    """
+    Statistiques d'usage LLM (tokens, coût estimé, embeddings).
+    
+    Returns:
+        Totaux agrégés par heure, par endpoint et par modèle
+    """
+    return usage_stats.summary()
+
+
+# ===== PROFILAGE (ADMIN) =====
+
+def require_admin(request: Request) -> None:
+    """404 plutôt que 401/403: les endpoints admin ne révèlent pas leur existence."""
+    if not check_admin_token(request.headers.get("X-Admin-Token")):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@app.get("/admin/profiles", include_in_schema=False)
+async def list_profiles(request: Request):
+    """Profils de requêtes capturés (les plus récents d'abord)."""
+    require_admin(request)
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}", include_in_schema=False)
+async def get_profile(profile_id: str, request: Request):
+    """Profil complet: chronologie de la requête et échantillons CPU."""
+    require_admin(request)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    return profile
+
+
+@app.get("/admin/profiles/{profile_id}/collapsed", include_in_schema=False)
+async def get_profile_collapsed(profile_id: str, request: Request):
+    """Piles repliées (flamegraph.pl, speedscope)."""
+    require_admin(request)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    lines = [f"{stack} {count}" for stack, count in profile["cpu"]["collapsed"].items()]
+    return PlainTextResponse("\n".join(lines) + "\n")
+
+
 # Servir le fichier HTML à la racine
 @app.get("/")
 async def serve_frontend():
@@ -312,12 +743,16 @@ async def serve_frontend():
     return FileResponse("index.html")
 
 
+startup_timer.mark("imports")
+
+
 if __name__ == "__main__":
-    # Lancer le serveur
+    # Serveur de développement (un process, rechargement si UVICORN_RELOAD=1).
+    # Production: gunicorn -c gunicorn.conf.py main:app (N workers)
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True
+        reload=os.getenv("UVICORN_RELOAD", "0").lower() in ("1", "true", "yes")
     )
@@ -0,0 +1,212 @@
+"""
+Métriques Prometheus du chatbot (exposées sur /metrics).
+
+Les durées sont mesurées dans le process avec time.perf_counter() et
+enregistrées dans des histogrammes prometheus_client (quelques
+microsecondes par observation).
+"""
+
+import functools
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from tracing import span
+
+# Étapes de 1 ms (Qdrant, embeddings) à 60 s (boucle agent complète)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "conso_http_request_duration_seconds",
+    "Durée des requêtes HTTP par route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "conso_stage_duration_seconds",
+    "Durée par étape (embed_query, qdrant_query, llm, session_lock_wait, ...)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+GRAPH_NODE_DURATION = Histogram(
+    "conso_graph_node_duration_seconds",
+    "Durée des noeuds du graph LangGraph",
+    ["node"],
+    buckets=LATENCY_BUCKETS,
+)
+TOOL_DURATION = Histogram(
+    "conso_tool_duration_seconds",
+    "Durée des appels d'outils",
+    ["tool"],
+    buckets=LATENCY_BUCKETS,
+)
+TOOL_CALLS = Counter("conso_tool_calls_total", "Appels d'outils", ["tool", "status"])
+TOOL_WALL_TIME = Histogram(
+    "conso_tool_wall_time_seconds",
+    "Attente de chaque appel d'outil dans le noeud tools (ok, timeout, error)",
+    ["tool", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_MODEL_TURNS = Histogram(
+    "conso_agent_model_turns", "Appels LLM par requête", buckets=(1, 2, 3, 4, 5, 6, 8, 10)
+)
+AGENT_REQUEST_TOOL_CALLS = Histogram(
+    "conso_agent_request_tool_calls", "Appels d'outils par requête", buckets=(0, 1, 2, 3, 4, 6, 8, 10)
+)
+AGENT_FORCED_FINAL = Counter(
+    "conso_agent_forced_final_total", "Réponses finales forcées (budget de l'agent épuisé)", ["reason"]
+)
+CACHE_REQUESTS = Counter("conso_cache_requests_total", "Accès aux caches", ["cache", "result"])
+ERRORS = Counter("conso_errors_total", "Erreurs par étape", ["stage"])
+LLM_TOKENS = Counter("conso_llm_tokens_total", "Tokens LLM consommés", ["model", "type"])
+LLM_COST = Counter("conso_llm_cost_usd_total", "Coût LLM estimé (USD, selon LLM_PRICES)", ["model"])
+EMBEDDING_CALLS = Counter("conso_embedding_calls_total", "Appels d'embedding", ["model"])
+TOOL_OUTPUT_CHARS = Histogram(
+    "conso_tool_output_chars",
+    "Taille des sorties d'outils renvoyées au LLM (caractères)",
+    ["tool"],
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+)
+
+ACTIVE_SESSIONS = Gauge("conso_active_sessions", "Sessions de chat actives")
+WS_CONNECTIONS = Gauge("conso_ws_connections", "Connexions WebSocket de chat ouvertes")
+WS_DISCONNECTS = Counter("conso_ws_disconnects_total", "Fermetures de connexions WebSocket", ["reason"])
+WS_FRAMES = Counter("conso_ws_frames_total", "Trames WebSocket de chat", ["direction", "type"])
+WS_FIRST_TOKEN = Histogram(
+    "conso_ws_first_token_seconds",
+    "Délai entre un message WebSocket et le premier token de la réponse",
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_IN_FLIGHT = Gauge("conso_admission_in_flight", "Requêtes de chat en cours d'exécution")
+ADMISSION_QUEUED = Gauge("conso_admission_queued", "Requêtes de chat en attente d'admission")
+ADMISSION_WAIT = Histogram(
+    "conso_admission_wait_seconds",
+    "Attente dans la file d'admission",
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "conso_admission_rejected_total", "Requêtes refusées (503) par l'admission", ["endpoint", "reason"]
+)
+DEGRADED_REQUESTS = Counter("conso_degraded_requests_total", "Requêtes admises par palier de service", ["level"])
+RATE_LIMITED = Counter("conso_rate_limited_total", "Requêtes refusées (429) par quota", ["route", "scope"])
+RATE_LIMIT_BUCKETS = Gauge("conso_rate_limit_buckets", "Seaux de rate limiting en mémoire")
+CIRCUIT_STATE = Gauge(
+    "conso_circuit_state", "État des disjoncteurs (0 fermé, 1 semi-ouvert, 2 ouvert)", ["dependency"]
+)
+CIRCUIT_REJECTED = Counter(
+    "conso_circuit_rejected_total", "Appels refusés par un disjoncteur ouvert", ["dependency"]
+)
+READY = Gauge("conso_ready", "Instance prête à recevoir du trafic (warm-up terminé)")
+WARMUP_CHECK_DURATION = Gauge("conso_warmup_check_seconds", "Durée du dernier check de warm-up", ["check"])
+INDEXING_RUNNING = Gauge("conso_indexing_running", "Indexation en cours", ["job"])
+INDEXING_LEADER = Gauge("conso_indexing_leader", "1 si ce process exécute l'indexation planifiée")
+INDEXING_BATCHES_DONE = Gauge("conso_indexing_batches_done", "Lots indexés (indexation complète)")
+INDEXING_BATCHES_TOTAL = Gauge("conso_indexing_batches_total", "Lots à indexer (indexation complète)")
+INDEXING_LAST_POSTS = Gauge("conso_indexing_last_posts", "Articles indexés au dernier passage", ["job"])
+INDEXING_LAST_SUCCESS = Gauge(
+    "conso_indexing_last_success_timestamp_seconds", "Fin du dernier passage réussi", ["job"]
+)
+INDEXING_PUBLISH_FAILURES = Counter(
+    "conso_indexing_publish_failures_total", "Versions reconstruites non publiées (alias inchangé)", ["reason"]
+)
+
+
+@contextmanager
+def timed(stage: str, traced: bool = True, **attributes):
+    """Mesure la durée d'un bloc dans STAGE_DURATION et compte ses erreurs.
+
+    Ouvre aussi un span du même nom (renvoyé par le with) pour le tracing,
+    sauf si traced=False (étape déjà tracée ailleurs).
+    """
+    started = time.perf_counter()
+    with (span(stage, **attributes) if traced else nullcontext()) as current:
+        try:
+            yield current
+        except Exception:
+            ERRORS.labels(stage).inc()
+            raise
+        finally:
+            STAGE_DURATION.labels(stage).observe(time.perf_counter() - started)
+
+
+def cache_result(cache: str, hit: bool, count: int = 1) -> None:
+    """Compte des accès cache (hit/miss)."""
+    if count:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc(count)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Contenu et content-type pour l'endpoint /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def track_indexing(job: str):
+    """Décorateur pour les jobs d'indexation: état en cours + dernier succès."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            INDEXING_RUNNING.labels(job).set(1)
+            try:
+                result = func(*args, **kwargs)
+                INDEXING_LAST_SUCCESS.labels(job).set_to_current_time()
+                return result
+            except Exception:
+                ERRORS.labels(f"indexing:{job}").inc()
+                raise
+            finally:
+                INDEXING_RUNNING.labels(job).set(0)
+        return wrapper
+    return decorator
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain qui chronomètre les noeuds du graph et les outils.
+
+    Les noeuds LangGraph sont des chains dont le nom est égal à
+    metadata["langgraph_node"]; les outils passent par on_tool_*.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[UUID, Tuple[str, float]] = {}
+        self._tools: Dict[UUID, Tuple[str, float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        entry = self._nodes.pop(run_id, None)
+        if entry:
+            GRAPH_NODE_DURATION.labels(entry[0]).observe(time.perf_counter() - entry[1])
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        entry = self._nodes.pop(run_id, None)
+        if entry:
+            GRAPH_NODE_DURATION.labels(entry[0]).observe(time.perf_counter() - entry[1])
+            ERRORS.labels(f"node:{entry[0]}").inc()
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        self._tools[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        entry = self._tools.pop(run_id, None)
+        if entry:
+            TOOL_DURATION.labels(entry[0]).observe(time.perf_counter() - entry[1])
+            TOOL_CALLS.labels(entry[0], "ok").inc()
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        entry = self._tools.pop(run_id, None)
+        if entry:
+            TOOL_DURATION.labels(entry[0]).observe(time.perf_counter() - entry[1])
+            TOOL_CALLS.labels(entry[0], "error").inc()
+
+
+# Un seul handler partagé: les entrées sont indexées par run_id
+metrics_callback = MetricsCallbackHandler()
+
@@ -1,20 +1,72 @@
+from __future__ import annotations
+
+import hashlib
+import importlib
 import os
 import json
+import logging
+import math
 import time
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional
 
 import requests
 from dotenv import load_dotenv
-import google.generativeai as genai
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as qmodels
+
+from lexical import bm25_document_vector, bm25_query_vector
+from lexical_index import LexicalIndex, date_to_epoch
+from metrics import (
+    ERRORS,
+    INDEXING_BATCHES_DONE,
+    INDEXING_BATCHES_TOTAL,
+    INDEXING_LAST_POSTS,
+    INDEXING_PUBLISH_FAILURES,
+    cache_result,
+    timed,
+    track_indexing,
+)
+from usage import record_embedding
+from resilience import EMBEDDING_TIMEOUT_S, QDRANT_TIMEOUT_S, CircuitOpen, DeadlineExceeded, breakers, call_timeout
+
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+
+
+class _LazyModule:
+    """Module imported on first attribute access.
+
+    google.generativeai and qdrant_client take ~1s each to import; the server
+    should open its port first and load them on first use (or in the startup
+    warm-up).
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        with self._lock:
+            module = importlib.import_module(self._name)
+            # Later lookups hit the instance dict directly
+            self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+
+qmodels = _LazyModule("qdrant_client.http.models")
 
 # Load environment variables from .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Base URL of the WordPress site (Conso News production by default)
 WORDPRESS_BASE_URL = os.getenv("WORDPRESS_BASE_URL", "https://consonews.ma")
+# (connect, read) timeouts for WordPress REST calls (background indexing only)
+WORDPRESS_TIMEOUT = (
+    float(os.getenv("WORDPRESS_CONNECT_TIMEOUT_S", "5")),
+    float(os.getenv("WORDPRESS_TIMEOUT_S", "30")),
+)
 
 # Qdrant configuration
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
@@ -32,8 +84,6 @@ EMBEDDING_DIMENSION = 768
 
 # Gemini API key (for runtime query embeddings)
 GOOGLE_API_KEY = os.getenv("LLM_API_KEY") or os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
 
 # Vertex AI config (for batch indexing, local use)
 GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID", "gen-lang-client-0981273199")
@@ -43,10 +93,73 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv(
     os.path.join(os.path.dirname(os.path.dirname(__file__)), "gen-lang-client-0981273199-da547dc931c3.json")
 )
 
-# When set, completely disable embeddings and Qdrant search/indexing
+# When set, completely disable embeddings (search falls back to lexical BM25 only)
 DISABLE_EMBEDDING = os.getenv("DISABLE_EMBEDDING", "").lower() in {"1", "true", "yes"}
 
-# Initialize Vertex AI
+# Hybrid retrieval: BM25 sparse vectors stored next to the dense vector and
+# fused server-side by Qdrant (reciprocal rank fusion)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1").lower() in {"1", "true", "yes"}
+SPARSE_VECTOR_NAME = "bm25"
+DENSE_VECTOR_NAME = ""  # default (unnamed) vector of the collection
+HYBRID_PREFETCH_MULTIPLIER = int(os.getenv("HYBRID_PREFETCH_MULTIPLIER", "4"))
+
+# Vector storage and HNSW tuning for new collections (see migrate_collection_config
+# for existing ones). Scalar int8 quantization keeps 1 byte/dim in RAM instead
+# of 4 (binary: 1 bit/dim), originals stay on disk for rescoring.
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "scalar").lower()  # scalar | binary | none
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "1").lower() in {"1", "true", "yes"}
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "128"))
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "128"))
+QDRANT_QUANT_RESCORE = os.getenv("QDRANT_QUANT_RESCORE", "1").lower() in {"1", "true", "yes"}
+QDRANT_QUANT_OVERSAMPLING = float(
+    os.getenv("QDRANT_QUANT_OVERSAMPLING", "3.0" if QDRANT_QUANTIZATION == "binary" else "2.0")
+)
+
+# Blue/green rebuilds: QDRANT_COLLECTION (and QDRANT_CHUNK_COLLECTION) are
+# aliases pointing to versioned physical collections "<alias>_v<timestamp>".
+# A fresh rebuild fills a new version, validates it, then swaps the alias.
+QDRANT_KEEP_VERSIONS = int(os.getenv("QDRANT_KEEP_VERSIONS", "2"))  # live + rollback versions kept
+REBUILD_MIN_COUNT_RATIO = float(os.getenv("REBUILD_MIN_COUNT_RATIO", "0.98"))
+REBUILD_MIN_RECALL = float(os.getenv("REBUILD_MIN_RECALL", "0.9"))
+REBUILD_SMOKE_QUERIES = int(os.getenv("REBUILD_SMOKE_QUERIES", "20"))
+
+# Scheduled incremental indexing (main.py): every INDEXING_INTERVAL_HOURS over
+# the last INCREMENTAL_WINDOW_HOURS, the overlap covering late or slow runs
+INDEXING_INTERVAL_HOURS = 12
+INDEXING_OVERLAP_HOURS = 2
+INCREMENTAL_WINDOW_HOURS = INDEXING_INTERVAL_HOURS + INDEXING_OVERLAP_HOURS
+
+# Optional passage-level index: overlapping chunks in a second collection,
+# each carrying its parent post_id. Search groups hits by article and returns
+# the best passage as the snippet.
+CHUNKED_INDEX = os.getenv("CHUNKED_INDEX", "").lower() in {"1", "true", "yes"}
+QDRANT_CHUNK_COLLECTION = os.getenv("QDRANT_CHUNK_COLLECTION", f"{QDRANT_COLLECTION}_chunks")
+CHUNK_SIZE_WORDS = int(os.getenv("CHUNK_SIZE_WORDS", "120"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("CHUNK_OVERLAP_WORDS", "30"))
+CHUNK_ID_STRIDE = 1000  # chunk point id = post_id * CHUNK_ID_STRIDE + chunk_index
+
+# Local in-process BM25 index (used when embeddings are disabled)
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+
+_GENAI = None
+_GENAI_LOCK = threading.Lock()
+
+
+def get_genai():
+    """google.generativeai, imported and configured on first use."""
+    global _GENAI
+    if _GENAI is None:
+        with _GENAI_LOCK:
+            if _GENAI is None:
+                import google.generativeai as genai
+                if GOOGLE_API_KEY:
+                    genai.configure(api_key=GOOGLE_API_KEY)
+                _GENAI = genai
+    return _GENAI
+
+
+# Initialize Vertex AI (indexer only: never imported by the server)
 _VERTEX_INITIALIZED = False
 def _init_vertex_ai():
     global _VERTEX_INITIALIZED
@@ -58,12 +171,21 @@ def _init_vertex_ai():
     import vertexai
     vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
     _VERTEX_INITIALIZED = True
-    print(f"   🔧 Vertex AI initialized (project={GCP_PROJECT_ID}, location={GCP_LOCATION})")
+    logger.info(f"🔧 Vertex AI initialized (project={GCP_PROJECT_ID}, location={GCP_LOCATION})")
 _QDRANT_CLIENT: QdrantClient | None = None
+_QDRANT_CLIENT_LOCK = threading.Lock()
+_SPARSE_SUPPORT: Dict[str, tuple] = {}  # collection/alias -> (has_sparse, checked_at)
+_SPARSE_SUPPORT_TTL = 300  # re-check periodically: the alias may point to a new version
+_LEXICAL_INDEX: LexicalIndex | None = None
+_LEXICAL_INDEX_LOCK = threading.Lock()
+# mtime of meta.json when the index was loaded/saved: an update saved by the
+# indexing leader (another worker) triggers a reload
+_LEXICAL_INDEX_MTIME = 0.0
 
 # Cache and progress files
 POSTS_CACHE_FILE = "posts_cache.json"
 EMBEDDINGS_CACHE_FILE = "embeddings_cache.json"
+CHUNK_EMBEDDINGS_CACHE_FILE = "chunk_embeddings_cache.json"
 PROGRESS_FILE = "indexing_progress.json"
 BATCH_FILES_DIR = "posts_batches"
 
@@ -75,12 +197,16 @@ def embed_text(text: str) -> List[float]:
     if not GOOGLE_API_KEY:
         raise RuntimeError("No API key found (set LLM_API_KEY or GOOGLE_API_KEY)")
     
-    result = genai.embed_content(
-        model=EMBEDDING_MODEL_GEMINI,
-        content=text,
-        task_type="RETRIEVAL_QUERY",
-        output_dimensionality=EMBEDDING_DIMENSION
-    )
+    # Bounded by the request deadline; fails fast while the embedding circuit is open
+    with breakers["embedding"].guard(), timed("embed_query", model=EMBEDDING_MODEL_GEMINI, chars=len(text)):
+        result = get_genai().embed_content(
+            model=EMBEDDING_MODEL_GEMINI,
+            content=text,
+            task_type="RETRIEVAL_QUERY",
+            output_dimensionality=EMBEDDING_DIMENSION,
+            request_options={"timeout": call_timeout(EMBEDDING_TIMEOUT_S)},
+        )
+    record_embedding(EMBEDDING_MODEL_GEMINI, len(text))
     return result['embedding']
 
 
@@ -110,12 +236,13 @@ def embed_texts_batch(texts: List[str], batch_size: int = 10) -> List[List[float
         batch_num = i // batch_size + 1
         total_batches = (total + batch_size - 1) // batch_size
 
-        print(f"      📊 Batch {batch_num}/{total_batches} ({len(batch)} texts)")
+        logger.debug(f"📊 Batch {batch_num}/{total_batches} ({len(batch)} texts)")
 
         # Retry once on quota errors, then fall back to zeros for this batch
         for attempt in range(2):
             try:
                 embeddings = model.get_embeddings(batch, output_dimensionality=EMBEDDING_DIMENSION)
+                record_embedding(EMBEDDING_MODEL_VERTEX, sum(len(t) for t in batch))
                 all_embeddings.extend([e.values for e in embeddings])
                 break
             except Exception as e:
@@ -123,12 +250,12 @@ def embed_texts_batch(texts: List[str], batch_size: int = 10) -> List[List[float
                 if "429" in error_str or "quota" in error_str.lower() or "RESOURCE_EXHAUSTED" in error_str:
                     # Quota hit: wait one full interval then retry once
                     if attempt == 0:
-                        print(f"      ⏳ Quota hit, waiting {sleep_between_batches}s then retrying...")
+                        logger.info(f"⏳ Quota hit, waiting {sleep_between_batches}s then retrying...")
                         time.sleep(sleep_between_batches)
                     else:
-                        print("      ⚠️ Quota still exceeded, using zeros for this batch")
+                        logger.warning("⚠️ Quota still exceeded, using zeros for this batch")
                 else:
-                    print(f"⚠️ Batch embedding failed: {e}")
+                    logger.warning(f"⚠️ Batch embedding failed: {e}")
                     all_embeddings.extend([[0.0] * EMBEDDING_DIMENSION] * len(batch))
                     break
         else:
@@ -145,27 +272,27 @@ def embed_texts_batch(texts: List[str], batch_size: int = 10) -> List[List[float
 # EMBEDDING CACHE - Never re-embed already processed posts
 # ============================================================
 
-def load_embeddings_cache() -> Dict[int, List[float]]:
-    """Load cached embeddings from disk. Key = post_id, Value = embedding vector."""
-    if os.path.exists(EMBEDDINGS_CACHE_FILE):
+def load_embeddings_cache(path: str = EMBEDDINGS_CACHE_FILE) -> Dict[int, List[float]]:
+    """Load cached embeddings from disk. Key = point id (post_id), Value = embedding vector."""
+    if os.path.exists(path):
         try:
-            with open(EMBEDDINGS_CACHE_FILE, "r", encoding="utf-8") as f:
+            with open(path, "r", encoding="utf-8") as f:
                 cache = json.load(f)
             # Convert string keys back to int
             return {int(k): v for k, v in cache.items()}
         except Exception as e:
-            print(f"⚠️ Failed to load embeddings cache: {e}")
+            logger.warning(f"⚠️ Failed to load embeddings cache: {e}")
     return {}
 
 
-def save_embeddings_cache(cache: Dict[int, List[float]]) -> None:
+def save_embeddings_cache(cache: Dict[int, List[float]], path: str = EMBEDDINGS_CACHE_FILE) -> None:
     """Save embeddings cache to disk."""
     try:
-        with open(EMBEDDINGS_CACHE_FILE, "w", encoding="utf-8") as f:
+        with open(path, "w", encoding="utf-8") as f:
             json.dump(cache, f)
-        print(f"💾 Saved {len(cache)} embeddings to cache")
+        logger.info(f"💾 Saved {len(cache)} embeddings to cache")
     except Exception as e:
-        print(f"⚠️ Failed to save embeddings cache: {e}")
+        logger.warning(f"⚠️ Failed to save embeddings cache: {e}")
 
 
 def load_progress() -> Dict:
@@ -175,7 +302,7 @@ def load_progress() -> Dict:
             with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception as e:
-            print(f"⚠️ Failed to load progress: {e}")
+            logger.warning(f"⚠️ Failed to load progress: {e}")
     return {"completed_batches": [], "total_indexed": 0}
 
 
@@ -185,27 +312,145 @@ def save_progress(progress: Dict) -> None:
         with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
             json.dump(progress, f, indent=2)
     except Exception as e:
-        print(f"⚠️ Failed to save progress: {e}")
+        logger.warning(f"⚠️ Failed to save progress: {e}")
 
 
 def get_qdrant_client() -> QdrantClient:
-    """Return a shared Qdrant client."""
+    """Return a shared Qdrant client (created on first use)."""
     global _QDRANT_CLIENT
     if _QDRANT_CLIENT is None:
-        # Support both local (no API key) and Qdrant Cloud (with API key)
-        if QDRANT_API_KEY:
-            _QDRANT_CLIENT = QdrantClient(
-                url=f"https://{QDRANT_HOST}:{QDRANT_PORT}",
-                api_key=QDRANT_API_KEY,
-            )
-        else:
-            _QDRANT_CLIENT = QdrantClient(
-                host=QDRANT_HOST,
-                port=QDRANT_PORT,
-            )
+        with _QDRANT_CLIENT_LOCK:
+            if _QDRANT_CLIENT is None:
+                from qdrant_client import QdrantClient
+
+                # Support both local (no API key) and Qdrant Cloud (with API key)
+                if QDRANT_API_KEY:
+                    _QDRANT_CLIENT = QdrantClient(
+                        url=f"https://{QDRANT_HOST}:{QDRANT_PORT}",
+                        api_key=QDRANT_API_KEY,
+                    )
+                else:
+                    _QDRANT_CLIENT = QdrantClient(
+                        host=QDRANT_HOST,
+                        port=QDRANT_PORT,
+                    )
     return _QDRANT_CLIENT
 
 
+def collection_has_sparse(qclient: QdrantClient, collection_name: str = QDRANT_COLLECTION) -> bool:
+    """Return True if the collection stores BM25 sparse vectors.
+
+    Collections created before hybrid search only have the dense vector; they
+    keep working (dense-only) until rebuilt with `--fresh`.
+    """
+    if not HYBRID_SEARCH:
+        return False
+    cached = _SPARSE_SUPPORT.get(collection_name)
+    fresh = cached is not None and time.time() - cached[1] <= _SPARSE_SUPPORT_TTL
+    cache_result("sparse_support", fresh)
+    if not fresh:
+        try:
+            info = qclient.get_collection(collection_name=collection_name)
+        except Exception:
+            return False
+        sparse_config = info.config.params.sparse_vectors or {}
+        cached = (SPARSE_VECTOR_NAME in sparse_config, time.time())
+        _SPARSE_SUPPORT[collection_name] = cached
+    return cached[0]
+
+
+def quantization_config():
+    """Quantization config for the dense vector (None when disabled)."""
+    if QDRANT_QUANTIZATION == "scalar":
+        return qmodels.ScalarQuantization(
+            scalar=qmodels.ScalarQuantizationConfig(
+                type=qmodels.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
+    if QDRANT_QUANTIZATION == "binary":
+        return qmodels.BinaryQuantization(
+            binary=qmodels.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
+
+
+def hnsw_config() -> qmodels.HnswConfigDiff:
+    return qmodels.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT)
+
+
+def search_params() -> qmodels.SearchParams:
+    """Dense search params: HNSW ef and oversampled rescoring of quantized candidates."""
+    quantization = None
+    if QDRANT_QUANTIZATION in {"scalar", "binary"}:
+        quantization = qmodels.QuantizationSearchParams(
+            rescore=QDRANT_QUANT_RESCORE,
+            oversampling=QDRANT_QUANT_OVERSAMPLING,
+        )
+    return qmodels.SearchParams(hnsw_ef=QDRANT_HNSW_EF, quantization=quantization)
+
+
+def create_collection(qclient: QdrantClient, collection_name: str = QDRANT_COLLECTION,
+                      chunks: bool = False) -> None:
+    """Create an articles (or passages) collection, dense + BM25 sparse, with its payload indexes."""
+    sparse_config = None
+    if HYBRID_SEARCH:
+        sparse_config = {
+            # IDF is computed by Qdrant from collection statistics, so document
+            # vectors only carry the BM25 term-frequency part
+            SPARSE_VECTOR_NAME: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF),
+        }
+    qclient.create_collection(
+        collection_name=collection_name,
+        vectors_config=qmodels.VectorParams(
+            size=EMBEDDING_DIMENSION,
+            distance=qmodels.Distance.COSINE,
+            on_disk=QDRANT_ON_DISK,
+        ),
+        sparse_vectors_config=sparse_config,
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config(),
+    )
+    _SPARSE_SUPPORT.pop(collection_name, None)
+    logger.info(f"✅ Created collection '{collection_name}' (dim={EMBEDDING_DIMENSION}, hybrid={HYBRID_SEARCH}, "
+          f"quantization={QDRANT_QUANTIZATION}, on_disk={QDRANT_ON_DISK}, m={QDRANT_HNSW_M})")
+
+    # Create datetime index on 'date' field for date filtering
+    qclient.create_payload_index(
+        collection_name=collection_name,
+        field_name="date",
+        field_schema=qmodels.PayloadSchemaType.DATETIME,
+    )
+    logger.info("✅ Created datetime index on 'date' field")
+
+    if chunks:
+        # Passages are grouped by parent article at query time
+        qclient.create_payload_index(
+            collection_name=collection_name,
+            field_name="post_id",
+            field_schema=qmodels.PayloadSchemaType.INTEGER,
+        )
+        logger.info("✅ Created integer index on 'post_id' field")
+
+
+def build_point(qclient: QdrantClient, point_id: int, vec: List[float], payload: Dict,
+                collection_name: str = QDRANT_COLLECTION) -> qmodels.PointStruct:
+    """Build a Qdrant point, adding the BM25 sparse vector when the collection supports it."""
+    if not collection_has_sparse(qclient, collection_name):
+        return qmodels.PointStruct(id=point_id, vector=vec, payload=payload)
+
+    indices, values = bm25_document_vector(f"{payload.get('title', '')}\n\n{payload.get('content', '')}")
+    return qmodels.PointStruct(
+        id=point_id,
+        vector={
+            DENSE_VECTOR_NAME: vec,
+            SPARSE_VECTOR_NAME: qmodels.SparseVector(indices=indices, values=values),
+        },
+        payload=payload,
+    )
+
+
 def fetch_posts(limit: int = 50) -> List[Dict]:
     """Fetch the latest posts from the WordPress REST API."""
     url = f"{WORDPRESS_BASE_URL.rstrip('/')}/wp-json/wp/v2/posts"
@@ -215,7 +460,7 @@ def fetch_posts(limit: int = 50) -> List[Dict]:
     page = 1
     last_error: Exception | None = None
 
-    print(f"   📡 Fetching from {url} (page size: {per_page})...")
+    logger.info(f"📡 Fetching from {url} (page size: {per_page})...")
 
     while True:
         if limit is not None and len(all_posts) >= limit:
@@ -231,27 +476,26 @@ def fetch_posts(limit: int = 50) -> List[Dict]:
         success = False
         for attempt in range(3):
             try:
-                print(f"   📄 Fetching page {page}...", end=" ", flush=True)
-                resp = requests.get(url, params=params, timeout=60)  # 60s timeout
+                resp = requests.get(url, params=params, timeout=WORDPRESS_TIMEOUT)
                 # If we requested a page beyond the available range, WordPress typically returns 400
                 if resp.status_code == 400:
-                    print("(no more pages)")
+                    logger.debug("📄 Page %d: no more pages", page)
                     return all_posts
                 resp.raise_for_status()
                 batch = resp.json()
                 if not batch:
-                    print("(empty, done)")
+                    logger.debug("📄 Page %d: empty, done", page)
                     return all_posts
                 all_posts.extend(batch)
-                print(f"got {len(batch)} posts (total: {len(all_posts)})")
+                logger.info("📄 Page %d: got %d posts (total: %d)", page, len(batch), len(all_posts))
                 success = True
                 break
             except Exception as e:
                 last_error = e
-                print(f"FAILED (attempt {attempt + 1}/3): {e}")
+                logger.warning("📄 Page %d FAILED (attempt %d/3): %s", page, attempt + 1, e)
 
         if not success:
-            print(f"   ⚠️ Giving up on page {page} after 3 attempts")
+            logger.warning(f"⚠️ Giving up on page {page} after 3 attempts")
             break
 
         page += 1
@@ -276,7 +520,7 @@ def fetch_recent_posts(hours: int = 24) -> List[Dict]:
     all_posts: List[Dict] = []
     page = 1
     
-    print(f"   📡 Fetching posts from last {hours} hours (after {after_iso})...")
+    logger.info(f"📡 Fetching posts from last {hours} hours (after {after_iso})...")
     
     while True:
         params = {
@@ -288,21 +532,20 @@ def fetch_recent_posts(hours: int = 24) -> List[Dict]:
         }
         
         try:
-            print(f"   📄 Fetching page {page}...", end=" ", flush=True)
-            resp = requests.get(url, params=params, timeout=30)
+            resp = requests.get(url, params=params, timeout=WORDPRESS_TIMEOUT)
             if resp.status_code == 400:
-                print("(no more pages)")
+                logger.debug("📄 Page %d: no more pages", page)
                 break
             resp.raise_for_status()
             batch = resp.json()
             if not batch:
-                print("(empty, done)")
+                logger.debug("📄 Page %d: empty, done", page)
                 break
             all_posts.extend(batch)
-            print(f"got {len(batch)} posts (total: {len(all_posts)})")
+            logger.info("📄 Page %d: got %d posts (total: %d)", page, len(batch), len(all_posts))
             page += 1
         except Exception as e:
-            print(f"FAILED: {e}")
+            logger.error("📄 Page %d FAILED: %s", page, e)
             break
     
     return all_posts
@@ -338,6 +581,89 @@ def html_to_text(html: str) -> str:
     return text.strip()
 
 
+def chunk_text(text: str, size: int = CHUNK_SIZE_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> List[str]:
+    """Split text into overlapping word windows (passages)."""
+    words = text.split()
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    step = max(1, size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return chunks[:CHUNK_ID_STRIDE]
+
+
+def passage_cache_key(text: str) -> int:
+    """Chunk embeddings cache key: hash of the embedded text (63 bits, JSON-safe int).
+
+    Keyed by content rather than by chunk point id, so an edited article gets
+    its changed passages re-embedded while unchanged ones are reused.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+
+def index_post_chunks(qclient: QdrantClient, payloads: List[Dict], chunk_cache: Dict[int, List[float]],
+                      replace: bool = False, collection_name: str = QDRANT_CHUNK_COLLECTION) -> int:
+    """
+    Embed and upsert the passages of the given posts into the chunk collection.
+
+    Each passage is embedded with its article title for context, and its
+    payload keeps the parent `post_id` so search can group by article.
+
+    Args:
+        qclient: Qdrant client
+        payloads: Post payloads (see post_payload)
+        chunk_cache: Embeddings cache keyed by passage_cache_key (updated in place)
+        replace: Delete the posts' existing chunks first (an edited post may have fewer chunks)
+        collection_name: Target passages collection (alias or version being built)
+    """
+    if not qclient.collection_exists(collection_name=collection_name):
+        create_collection(qclient, collection_name, chunks=True)
+
+    chunks = []
+    for payload in payloads:
+        for i, passage in enumerate(chunk_text(payload["content"])):
+            chunk_payload = dict(payload, content=passage, chunk_index=i)
+            text = f"{payload['title']}\n\n{passage}"
+            chunks.append((payload["post_id"] * CHUNK_ID_STRIDE + i, chunk_payload, text))
+
+    keys = [passage_cache_key(text) for _, _, text in chunks]
+    texts = {key: text for key, (_, _, text) in zip(keys, chunks) if key not in chunk_cache}
+    if texts:
+        logger.info(f"🔄 Embedding {len(texts)} new passages...")
+        embeddings = embed_texts_batch(list(texts.values()))
+        for key, vec in zip(texts, embeddings):
+            chunk_cache[key] = vec
+
+    if replace and payloads:
+        qclient.delete(
+            collection_name=collection_name,
+            points_selector=qmodels.FilterSelector(
+                filter=qmodels.Filter(
+                    must=[
+                        qmodels.FieldCondition(
+                            key="post_id",
+                            match=qmodels.MatchAny(any=[p["post_id"] for p in payloads]),
+                        )
+                    ]
+                )
+            ),
+        )
+
+    points = [
+        build_point(qclient, cid, chunk_cache[key], p, collection_name)
+        for key, (cid, p, _) in zip(keys, chunks)
+        if chunk_cache.get(key)
+    ]
+    for i in range(0, len(points), 256):
+        qclient.upsert(collection_name=collection_name, points=points[i:i + 256])
+    logger.info(f"✅ Indexed {len(points)} passages from {len(payloads)} posts")
+    return len(points)
+
+
+@track_indexing("full")
 def refresh_all_posts(fresh: bool = False) -> None:
     """
     Index all posts to Qdrant using Gemini embeddings with full resume support.
@@ -346,9 +672,14 @@ def refresh_all_posts(fresh: bool = False) -> None:
     - Tracks completed batches in indexing_progress.json
     - Caches embeddings to avoid re-embedding on resume
     - No chunking: 1 post = 1 Qdrant document
+    - Each point carries the dense vector and a locally computed BM25 sparse vector
+    - With CHUNKED_INDEX, also indexes overlapping passages in QDRANT_CHUNK_COLLECTION
+    - Blue/green: a fresh rebuild (or the first build) goes into a new versioned
+      collection while the alias keeps serving; the alias is swapped atomically
+      once the new version passes the count and recall checks
     
     Args:
-        fresh: If True, delete collection and reset progress
+        fresh: If True, rebuild into a new collection version and reset progress
     """
     from pathlib import Path
     
@@ -357,16 +688,16 @@ def refresh_all_posts(fresh: bool = False) -> None:
     # Check batch files exist
     batch_dir = Path(BATCH_FILES_DIR)
     if not batch_dir.exists():
-        print(f"❌ Batch files not found: {BATCH_FILES_DIR}/")
-        print("   Run validate_posts.py first to create batch files.")
+        logger.error(f"❌ Batch files not found: {BATCH_FILES_DIR}/ (run validate_posts.py first to create batch files)")
         return
     
     batch_files = sorted(batch_dir.glob("batch_*.json"))
     if not batch_files:
-        print(f"❌ No batch files found in {BATCH_FILES_DIR}/")
+        logger.error(f"❌ No batch files found in {BATCH_FILES_DIR}/")
         return
     
-    print(f"📂 Found {len(batch_files)} batch files")
+    logger.info(f"📂 Found {len(batch_files)} batch files")
+    INDEXING_BATCHES_TOTAL.set(len(batch_files))
     
     # Load progress and embeddings cache
     if fresh:
@@ -377,43 +708,49 @@ def refresh_all_posts(fresh: bool = False) -> None:
             os.remove(PROGRESS_FILE)
         if os.path.exists(EMBEDDINGS_CACHE_FILE):
             os.remove(EMBEDDINGS_CACHE_FILE)
-        print("🗑️ Cleared progress and embeddings cache")
+        if os.path.exists(CHUNK_EMBEDDINGS_CACHE_FILE):
+            os.remove(CHUNK_EMBEDDINGS_CACHE_FILE)
+        chunk_cache = {}
+        logger.info("🗑️ Cleared progress and embeddings cache")
     else:
         progress = load_progress()
         embeddings_cache = load_embeddings_cache()
-        print(f"📂 Loaded progress: {len(progress['completed_batches'])} batches done")
-        print(f"📂 Loaded {len(embeddings_cache)} cached embeddings")
+        chunk_cache = load_embeddings_cache(CHUNK_EMBEDDINGS_CACHE_FILE) if CHUNKED_INDEX else {}
+        logger.info(f"📂 Loaded progress: {len(progress['completed_batches'])} batches done")
+        logger.info(f"📂 Loaded {len(embeddings_cache)} cached embeddings")
     
-    # Handle Qdrant collection
-    if fresh:
-        try:
-            qclient.delete_collection(collection_name=QDRANT_COLLECTION)
-            print(f"🗑️ Deleted existing collection '{QDRANT_COLLECTION}'")
-        except Exception:
-            pass
-    
-    if not qclient.collection_exists(collection_name=QDRANT_COLLECTION):
-        qclient.create_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=qmodels.VectorParams(
-                size=EMBEDDING_DIMENSION,
-                distance=qmodels.Distance.COSINE,
-            ),
+    # Handle Qdrant collection: pick the collection this run writes to
+    target = progress.get("target_collection")
+    chunk_target = progress.get("target_chunk_collection")
+    if target and not qclient.collection_exists(collection_name=target):
+        target = None  # stale progress (version was deleted)
+
+    if fresh or (target is None and not qclient.collection_exists(collection_name=QDRANT_COLLECTION)):
+        version = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        target = f"{QDRANT_COLLECTION}_v{version}"
+        chunk_target = f"{QDRANT_CHUNK_COLLECTION}_v{version}" if CHUNKED_INDEX else None
+        create_collection(qclient, target)
+        progress.update(
+            target_collection=target,
+            target_chunk_collection=chunk_target,
+            rebuild_started_at=time.time(),
+            # Batch files were fetched before this: newest file = snapshot time
+            batches_snapshot_at=max(f.stat().st_mtime for f in batch_files),
+            # Distinct posts upserted: a post can appear in several batch files
+            indexed_ids=[],
         )
-        print(f"✅ Created collection '{QDRANT_COLLECTION}' (dim={EMBEDDING_DIMENSION})")
-        
-        # Create datetime index on 'date' field for date filtering
-        qclient.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="date",
-            field_schema=qmodels.PayloadSchemaType.DATETIME,
-        )
-        print("✅ Created datetime index on 'date' field")
+        save_progress(progress)
+        logger.info(f"🆕 Building new version '{target}' (alias '{QDRANT_COLLECTION}' keeps serving)")
+    elif target:
+        logger.info(f"ℹ️ Resuming build of '{target}'")
     else:
-        print(f"ℹ️ Collection '{QDRANT_COLLECTION}' exists, will upsert")
+        target, chunk_target = QDRANT_COLLECTION, QDRANT_CHUNK_COLLECTION
+        logger.info(f"ℹ️ Collection '{QDRANT_COLLECTION}' exists, will upsert")
     
     # Process each batch file
     total_indexed = progress.get("total_indexed", 0)
+    # None: build resumed from a progress file that predates the id tracking
+    indexed_ids = set(progress["indexed_ids"]) if progress.get("indexed_ids") is not None else None
     total_skipped = 0
     new_embeddings = 0
     completed = set(progress.get("completed_batches", []))
@@ -424,17 +761,17 @@ def refresh_all_posts(fresh: bool = False) -> None:
         
         # Skip completed batches
         if batch_name in completed:
-            print(f"⏭️ Skipping {batch_name} (already done)")
+            logger.info(f"⏭️ Skipping {batch_name} (already done)")
             continue
         
-        print(f"\n📦 Processing {batch_name} ({batch_num}/{len(batch_files)})")
+        logger.info(f"📦 Processing {batch_name} ({batch_num}/{len(batch_files)})")
         
         # Load batch
         try:
             with open(batch_file, "r", encoding="utf-8") as f:
                 posts = json.load(f)
         except Exception as e:
-            print(f"   ❌ Failed to load {batch_name}: {e}")
+            logger.error(f"❌ Failed to load {batch_name}: {e}")
             continue
         
         # Prepare posts
@@ -461,10 +798,13 @@ def refresh_all_posts(fresh: bool = False) -> None:
             else:
                 posts_to_embed.append((post_id, title, content_text, url, date, full_text))
         
+        cache_result("post_embeddings", True, len(posts_with_cache))
+        cache_result("post_embeddings", False, len(posts_to_embed))
+
         # Embed new posts
         if posts_to_embed:
             texts_to_embed = [p[5] for p in posts_to_embed]
-            print(f"   🔄 Embedding {len(texts_to_embed)} new posts...")
+            logger.info(f"🔄 Embedding {len(texts_to_embed)} new posts...")
             
             try:
                 embeddings = embed_texts_batch(texts_to_embed)
@@ -475,27 +815,29 @@ def refresh_all_posts(fresh: bool = False) -> None:
                 
                 new_embeddings += len(embeddings)
             except Exception as e:
-                print(f"   ❌ Embedding failed: {e}")
+                logger.error(f"❌ Embedding failed: {e}")
                 save_embeddings_cache(embeddings_cache)
                 save_progress(progress)
                 raise
         else:
-            print(f"   ✅ All {len(posts_with_cache)} posts already cached")
+            logger.info(f"✅ All {len(posts_with_cache)} posts already cached")
         
         # Build Qdrant points
         points = []
         for post_id, title, content_text, url, date, vec in posts_with_cache:
             points.append(
-                qmodels.PointStruct(
-                    id=post_id,
-                    vector=vec,
-                    payload={
+                build_point(
+                    qclient,
+                    post_id,
+                    vec,
+                    {
                         "post_id": post_id,
                         "title": title,
                         "content": content_text,
                         "url": url,
                         "date": date,
                     },
+                    collection_name=target,
                 )
             )
         
@@ -504,125 +846,234 @@ def refresh_all_posts(fresh: bool = False) -> None:
             for attempt in range(3):
                 try:
                     qclient.upsert(
-                        collection_name=QDRANT_COLLECTION,
+                        collection_name=target,
                         points=points,
                     )
                     total_indexed += len(points)
-                    print(f"   ✅ Indexed {len(points)} posts")
+                    if indexed_ids is not None:
+                        indexed_ids.update(post_id for post_id, *_ in posts_with_cache)
+                    logger.info(f"✅ Indexed {len(points)} posts")
                     break
                 except Exception as e:
                     if attempt < 2:
-                        print(f"   ⚠️ Upsert failed (attempt {attempt+1}/3): {e}")
+                        logger.warning(f"⚠️ Upsert failed (attempt {attempt+1}/3): {e}")
                         time.sleep(2 ** attempt)
                     else:
-                        print(f"   ❌ Upsert failed: {e}")
+                        logger.error(f"❌ Upsert failed: {e}")
                         save_embeddings_cache(embeddings_cache)
                         save_progress(progress)
                         raise
         
+        # Passage-level index (same batch, so progress stays per batch)
+        if CHUNKED_INDEX and posts_with_cache:
+            try:
+                index_post_chunks(
+                    qclient,
+                    [
+                        {"post_id": post_id, "title": title, "content": content_text, "url": url, "date": date}
+                        for post_id, title, content_text, url, date, _ in posts_with_cache
+                    ],
+                    chunk_cache,
+                    collection_name=chunk_target or QDRANT_CHUNK_COLLECTION,
+                )
+            except Exception as e:
+                logger.error(f"❌ Passage indexing failed: {e}")
+                save_embeddings_cache(embeddings_cache)
+                save_embeddings_cache(chunk_cache, CHUNK_EMBEDDINGS_CACHE_FILE)
+                save_progress(progress)
+                raise
+            save_embeddings_cache(chunk_cache, CHUNK_EMBEDDINGS_CACHE_FILE)
+
         # Mark batch as complete
         progress["completed_batches"].append(batch_name)
         progress["total_indexed"] = total_indexed
+        if indexed_ids is not None:
+            progress["indexed_ids"] = list(indexed_ids)
         
         # Save progress after each batch
         save_progress(progress)
+        INDEXING_BATCHES_DONE.set(len(progress["completed_batches"]))
         save_embeddings_cache(embeddings_cache)
-        print(f"   💾 Progress saved ({len(progress['completed_batches'])}/{len(batch_files)} batches)")
+        logger.info(f"💾 Progress saved ({len(progress['completed_batches'])}/{len(batch_files)} batches)")
     
-    print(f"\n{'='*60}")
-    print(f"✅ COMPLETE!")
-    print(f"   Batches processed: {len(progress['completed_batches'])}/{len(batch_files)}")
-    print(f"   Total indexed: {total_indexed} posts")
-    print(f"   Skipped (empty): {total_skipped} posts")
-    print(f"   New embeddings: {new_embeddings}")
-    print(f"   Cached embeddings: {len(embeddings_cache)}")
-    print(f"{'='*60}")
+    logger.info(
+        f"✅ COMPLETE! Batches processed: {len(progress['completed_batches'])}/{len(batch_files)}, "
+        f"indexed: {total_indexed} posts, skipped (empty): {total_skipped}, "
+        f"new embeddings: {new_embeddings}, cached embeddings: {len(embeddings_cache)}",
+        extra={"batches_done": len(progress["completed_batches"]), "batches_total": len(batch_files),
+               "indexed": total_indexed, "skipped": total_skipped, "new_embeddings": new_embeddings},
+    )
 
+    if target != QDRANT_COLLECTION:
+        publish_collection_version(progress)
 
+
+# ============================================================
+# BLUE/GREEN VERSIONS - Stable alias over versioned collections
+# ============================================================
+
+def resolve_alias(qclient: QdrantClient, alias: str) -> Optional[str]:
+    """Return the collection an alias points to (None if it isn't an alias)."""
+    for item in qclient.get_aliases().aliases:
+        if item.alias_name == alias:
+            return item.collection_name
+    return None
+
+
+def swap_alias(qclient: QdrantClient, alias: str, collection_name: str) -> None:
+    """Atomically point `alias` to `collection_name`."""
+    current = resolve_alias(qclient, alias)
+    operations = []
+    if current is not None:
+        operations.append(qmodels.DeleteAliasOperation(delete_alias=qmodels.DeleteAlias(alias_name=alias)))
+    elif qclient.collection_exists(collection_name=alias):
+        # Legacy deployment: a physical collection holds the alias name and has
+        # to be dropped before the alias can exist (one-time, sub-second gap).
+        logger.warning(f"⚠️ Replacing legacy collection '{alias}' by an alias")
+        qclient.delete_collection(collection_name=alias)
+    operations.append(
+        qmodels.CreateAliasOperation(
+            create_alias=qmodels.CreateAlias(collection_name=collection_name, alias_name=alias)
+        )
+    )
+    qclient.update_collection_aliases(change_aliases_operations=operations)
+    _SPARSE_SUPPORT.pop(alias, None)
+    logger.info(f"🔀 Alias '{alias}': {current or '-'} → {collection_name}")
+
+
+def garbage_collect_versions(qclient: QdrantClient, alias: str, keep: int = QDRANT_KEEP_VERSIONS) -> None:
+    """Delete old versions of `alias`, keeping the live one and the newest others for rollback."""
+    live = resolve_alias(qclient, alias)
+    versions = sorted(
+        c.name for c in qclient.get_collections().collections if c.name.startswith(f"{alias}_v")
+    )
+    old = [name for name in versions if name != live]
+    for name in old[:max(0, len(old) - (keep - 1))]:
+        qclient.delete_collection(collection_name=name)
+        logger.info(f"🗑️ Deleted old version '{name}'")
+
+
+def validate_collection(qclient: QdrantClient, collection_name: str, expected_count: int) -> bool:
+    """Check a freshly built version before it takes traffic: point count and smoke recall."""
+    count = qclient.count(collection_name=collection_name, exact=True).count
+    if count < expected_count * REBUILD_MIN_COUNT_RATIO:
+        logger.error(f"❌ '{collection_name}' has {count} points, expected ~{expected_count}")
+        INDEXING_PUBLISH_FAILURES.labels("count").inc()
+        return False
+    recall = measure_recall(collection_name, samples=REBUILD_SMOKE_QUERIES)
+    if recall < REBUILD_MIN_RECALL:
+        logger.error(f"❌ '{collection_name}' smoke recall {recall:.3f} < {REBUILD_MIN_RECALL}")
+        INDEXING_PUBLISH_FAILURES.labels("recall").inc()
+        return False
+    logger.info(f"✅ '{collection_name}' validated ({count} points, recall {recall:.3f})")
+    return True
+
+
+def publish_collection_version(progress: Dict) -> bool:
+    """Validate the version built by refresh_all_posts, swap the aliases and clean up."""
+    qclient = get_qdrant_client()
+    target = progress["target_collection"]
+    chunk_target = progress.get("target_chunk_collection")
+
+    # Distinct posts upserted (total_indexed counts a post once per batch file holding it)
+    indexed_ids = progress.get("indexed_ids")
+    expected = len(set(indexed_ids)) if indexed_ids is not None else progress.get("total_indexed", 0)
+    if not validate_collection(qclient, target, expected):
+        logger.warning(f"⚠️ Alias '{QDRANT_COLLECTION}' NOT switched; '{target}' kept for inspection")
+        return False
+    if chunk_target and qclient.count(collection_name=chunk_target).count == 0:
+        logger.warning(f"⚠️ Passages collection '{chunk_target}' is empty, alias NOT switched")
+        INDEXING_PUBLISH_FAILURES.labels("passages").inc()
+        return False
+
+    swap_alias(qclient, QDRANT_COLLECTION, target)
+    garbage_collect_versions(qclient, QDRANT_COLLECTION)
+    if chunk_target:
+        swap_alias(qclient, QDRANT_CHUNK_COLLECTION, chunk_target)
+        garbage_collect_versions(qclient, QDRANT_CHUNK_COLLECTION)
+
+    snapshot_at = progress.get("batches_snapshot_at") or progress.get("rebuild_started_at") or time.time()
+    progress.update(target_collection=None, target_chunk_collection=None,
+                    rebuild_started_at=None, batches_snapshot_at=None, indexed_ids=None)
+    save_progress(progress)
+
+    # Batch files are a snapshot: catch up on posts published since they were fetched
+    hours = math.ceil((time.time() - snapshot_at) / 3600) + INDEXING_OVERLAP_HOURS
+    index_new_posts(hours=hours)
+    return True
+
+
+@track_indexing("incremental")
 def index_new_posts(hours: int = 24) -> None:
     """
     Incremental indexing: fetch posts from the last N hours and add/update them in Qdrant.
     Does NOT recreate the collection - assumes it already exists from initial backfill.
     Uses post_id directly as Qdrant point ID (no chunking).
+
+    The local lexical index (if any) is updated with the same posts. With
+    DISABLE_EMBEDDING it is the only index updated, and it is first built
+    from the Qdrant payloads if it doesn't exist on disk yet.
     """
+    logger.info(f"⌘ Incremental index: checking for posts from last {hours} hours...")
+
     if DISABLE_EMBEDDING:
-        print(f"⚠️ Embeddings disabled (DISABLE_EMBEDDING=1), skipping incremental indexing.")
+        lexical_index = ensure_lexical_index()
+        if lexical_index is None:
+            logger.warning("⚠️ Embeddings disabled (DISABLE_EMBEDDING=1) and no lexical index available, skipping.")
+            return
+        posts = fetch_recent_posts(hours=hours)
+        payloads = [p for p in (post_payload(post) for post in posts) if p]
+        update_lexical_index(payloads)
         return
 
-    print(f"⌘ Incremental index: checking for posts from last {hours} hours...")
     qclient = get_qdrant_client()
     
     # Check if collection exists
     try:
         qclient.get_collection(collection_name=QDRANT_COLLECTION)
     except Exception:
-        print(f"⚠️ Collection '{QDRANT_COLLECTION}' doesn't exist. Run full backfill first!")
+        logger.warning(f"⚠️ Collection '{QDRANT_COLLECTION}' doesn't exist. Run full backfill first!")
         return
     
     posts = fetch_recent_posts(hours=hours)
     
     if not posts:
-        print("✅ No new posts found. Index is up to date.")
+        logger.info("✅ No new posts found. Index is up to date.")
         return
     
-    print(f"✅ Found {len(posts)} new posts to index")
+    logger.info(f"✅ Found {len(posts)} new posts to index")
     
     # Load embeddings cache
     embeddings_cache = load_embeddings_cache()
     
     try:
         # Prepare posts
-        posts_data = []
-        for post in posts:
-            post_id = post.get("id")
-            title = post.get("title", {}).get("rendered", "")
-            content_html = post.get("content", {}).get("rendered", "")
-            url = post.get("link", "")
-            date = post.get("date", "")
-            
-            content_text = html_to_text(content_html)
-            if not content_text:
-                continue
-            
-            full_text = f"{title}\n\n{content_text}"
-            posts_data.append((post_id, title, content_text, url, date, full_text))
+        payloads = [p for p in (post_payload(post) for post in posts) if p]
         
-        if not posts_data:
-            print("⚠️ No content to index from new posts.")
+        if not payloads:
+            logger.warning("⚠️ No content to index from new posts.")
             return
         
         # Embed posts (skip cached ones)
-        posts_to_embed = [(p, t) for p, _, _, _, _, t in posts_data if p not in embeddings_cache]
+        posts_to_embed = [p for p in payloads if p["post_id"] not in embeddings_cache]
+        cache_result("post_embeddings", True, len(payloads) - len(posts_to_embed))
+        cache_result("post_embeddings", False, len(posts_to_embed))
         
         if posts_to_embed:
-            texts = [t for _, t in posts_to_embed]
-            print(f"   🔄 Embedding {len(texts)} new posts...")
+            texts = [f"{p['title']}\n\n{p['content']}" for p in posts_to_embed]
+            logger.info(f"🔄 Embedding {len(texts)} new posts...")
             embeddings = embed_texts_batch(texts)
             
-            for (post_id, _), vec in zip(posts_to_embed, embeddings):
-                embeddings_cache[post_id] = vec
+            for payload, vec in zip(posts_to_embed, embeddings):
+                embeddings_cache[payload["post_id"]] = vec
         
         # Build points
         points: List[qmodels.PointStruct] = []
-        for post_id, title, content_text, url, date, _ in posts_data:
-            vec = embeddings_cache.get(post_id)
+        for payload in payloads:
+            vec = embeddings_cache.get(payload["post_id"])
             if not vec:
                 continue
-            
-            payload = {
-                "post_id": post_id,
-                "title": title,
-                "content": content_text,
-                "url": url,
-                "date": date,
-            }
-            points.append(
-                qmodels.PointStruct(
-                    id=post_id,
-                    vector=vec,
-                    payload=payload,
-                )
-            )
+            points.append(build_point(qclient, payload["post_id"], vec, payload))
         
         # Upsert
         if points:
@@ -630,16 +1081,156 @@ def index_new_posts(hours: int = 24) -> None:
                 collection_name=QDRANT_COLLECTION,
                 points=points,
             )
-            print(f"✅ Indexed {len(points)} posts")
+            logger.info(f"✅ Indexed {len(points)} posts")
+            INDEXING_LAST_POSTS.labels("incremental").set(len(points))
             
             # Save cache
             save_embeddings_cache(embeddings_cache)
+
+        if CHUNKED_INDEX:
+            chunk_cache = load_embeddings_cache(CHUNK_EMBEDDINGS_CACHE_FILE)
+            try:
+                index_post_chunks(qclient, payloads, chunk_cache, replace=True)
+            finally:
+                save_embeddings_cache(chunk_cache, CHUNK_EMBEDDINGS_CACHE_FILE)
+
+        # Keep the local lexical index (if used) in sync with Qdrant
+        if get_lexical_index() is not None:
+            update_lexical_index(payloads)
         
     except Exception as e:
-        print(f"[index_new_posts] Error: {e}")
+        logger.exception(f"[index_new_posts] Error: {e}")
+        ERRORS.labels("indexing:incremental").inc()
         save_embeddings_cache(embeddings_cache)
 
 
+# ============================================================
+# LOCAL LEXICAL INDEX - BM25 search without embeddings/network
+# ============================================================
+
+def post_payload(post: Dict) -> Optional[Dict]:
+    """Convert a WordPress post to the payload stored in the indexes (None if empty)."""
+    content_text = html_to_text(post.get("content", {}).get("rendered", ""))
+    if not content_text:
+        return None
+    return {
+        "post_id": post.get("id"),
+        "title": post.get("title", {}).get("rendered", ""),
+        "content": content_text,
+        "url": post.get("link", ""),
+        "date": post.get("date", ""),
+    }
+
+
+def _lexical_index_mtime() -> float:
+    try:
+        return os.path.getmtime(os.path.join(LEXICAL_INDEX_DIR, "meta.json"))
+    except OSError:
+        return 0.0
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """Return the shared local lexical index, or None if none was built yet.
+
+    Reloaded when the base files were compacted since it was loaded; posts
+    appended to its delta file by the indexing process are replayed in place.
+    """
+    global _LEXICAL_INDEX, _LEXICAL_INDEX_MTIME
+    mtime = _lexical_index_mtime()
+    with _LEXICAL_INDEX_LOCK:
+        if mtime and mtime != _LEXICAL_INDEX_MTIME:
+            try:
+                _LEXICAL_INDEX = LexicalIndex.load(LEXICAL_INDEX_DIR)
+                _LEXICAL_INDEX_MTIME = mtime
+                logger.info(f"📂 Loaded lexical index ({len(_LEXICAL_INDEX)} docs) from {LEXICAL_INDEX_DIR}/")
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to load lexical index: {e}")
+        elif _LEXICAL_INDEX is not None:
+            try:
+                _LEXICAL_INDEX.refresh()
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to replay lexical index delta: {e}")
+        return _LEXICAL_INDEX
+
+
+def iter_qdrant_payloads(page_size: int = 256):
+    """Yield every article payload stored in the Qdrant collection (no vectors)."""
+    qclient = get_qdrant_client()
+    offset = None
+    while True:
+        points, offset = qclient.scroll(
+            collection_name=QDRANT_COLLECTION,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for point in points:
+            if point.payload:
+                yield point.payload
+        if offset is None:
+            break
+
+
+def iter_batch_file_payloads():
+    """Yield article payloads from the local batch files (posts_batches/batch_*.json)."""
+    from pathlib import Path
+
+    for batch_file in sorted(Path(BATCH_FILES_DIR).glob("batch_*.json")):
+        with open(batch_file, "r", encoding="utf-8") as f:
+            posts = json.load(f)
+        for post in posts:
+            payload = post_payload(post)
+            if payload:
+                yield payload
+
+
+def build_lexical_index(source: str = "qdrant") -> LexicalIndex:
+    """Rebuild the local lexical index from Qdrant payloads or batch files."""
+    global _LEXICAL_INDEX, _LEXICAL_INDEX_MTIME
+    started = time.time()
+    payloads = iter_qdrant_payloads() if source == "qdrant" else iter_batch_file_payloads()
+
+    index = LexicalIndex(LEXICAL_INDEX_DIR)
+    added = index.add_documents(payloads)
+    index.save()
+    with _LEXICAL_INDEX_LOCK:
+        _LEXICAL_INDEX = index
+        _LEXICAL_INDEX_MTIME = _lexical_index_mtime()
+    logger.info(f"✅ Built lexical index from {source}: {added} docs in {time.time() - started:.1f}s")
+    return index
+
+
+def ensure_lexical_index() -> Optional[LexicalIndex]:
+    """Load the lexical index, building it from Qdrant payloads if it doesn't exist."""
+    index = get_lexical_index()
+    if index is not None:
+        return index
+    try:
+        return build_lexical_index(source="qdrant")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not build lexical index from Qdrant: {e}")
+        return None
+
+
+def update_lexical_index(payloads: List[Dict]) -> None:
+    """Add/replace posts in the local lexical index and persist them.
+
+    The posts are appended to the index's delta file (O(new posts)); the base
+    files are only rewritten once the delta passes the compaction threshold.
+    """
+    global _LEXICAL_INDEX_MTIME
+    index = get_lexical_index()
+    if index is None or not payloads:
+        return
+    added = index.add_documents(payloads)
+    compacted = index.flush()
+    with _LEXICAL_INDEX_LOCK:
+        _LEXICAL_INDEX_MTIME = _lexical_index_mtime()
+    action = "compacted" if compacted else "appended to delta"
+    logger.info(f"✅ Lexical index updated: {added} posts {action} ({len(index)} total)")
+
+
 def repair_zero_embeddings(batch_size: int = 5) -> None:
     """Re-embed posts whose embeddings are all zeros.
 
@@ -648,18 +1239,18 @@ def repair_zero_embeddings(batch_size: int = 5) -> None:
     text using Vertex AI, and upserts the fixed vectors back into Qdrant.
     """
     if DISABLE_EMBEDDING:
-        print("⚠️ Embeddings disabled (DISABLE_EMBEDDING=1), cannot repair zeros.")
+        logger.warning("⚠️ Embeddings disabled (DISABLE_EMBEDDING=1), cannot repair zeros.")
         return
 
-    print("⌘ Repair zeros: scanning embeddings cache...")
+    logger.info("⌘ Repair zeros: scanning embeddings cache...")
 
     embeddings_cache = load_embeddings_cache()
     if not embeddings_cache:
-        print("⚠️ No embeddings cache found.")
+        logger.warning("⚠️ No embeddings cache found.")
         return
 
     zero_ids = [pid for pid, vec in embeddings_cache.items() if vec and all(v == 0.0 for v in vec)]
-    print(f"✅ Found {len(zero_ids)} posts with all-zero embeddings")
+    logger.info(f"✅ Found {len(zero_ids)} posts with all-zero embeddings")
 
     if not zero_ids:
         return
@@ -669,16 +1260,16 @@ def repair_zero_embeddings(batch_size: int = 5) -> None:
     fixed = 0
     for i in range(0, len(zero_ids), batch_size):
         chunk_ids = zero_ids[i:i + batch_size]
-        print(f"\n🔎 Fetching payloads for {len(chunk_ids)} posts (chunk {i//batch_size+1}/{(len(zero_ids)+batch_size-1)//batch_size})")
+        logger.info(f"🔎 Fetching payloads for {len(chunk_ids)} posts (chunk {i//batch_size+1}/{(len(zero_ids)+batch_size-1)//batch_size})")
 
         try:
             points = qclient.retrieve(collection_name=QDRANT_COLLECTION, ids=chunk_ids)
         except Exception as e:
-            print(f"⚠️ Failed to retrieve points from Qdrant: {e}")
+            logger.warning(f"⚠️ Failed to retrieve points from Qdrant: {e}")
             continue
 
         if not points:
-            print("⚠️ No points returned for these IDs, skipping chunk")
+            logger.warning("⚠️ No points returned for these IDs, skipping chunk")
             continue
 
         texts: list[str] = []
@@ -708,10 +1299,10 @@ def repair_zero_embeddings(batch_size: int = 5) -> None:
             ids_for_chunk.append(pid)
 
         if not texts:
-            print("⚠️ No usable text in this chunk, skipping")
+            logger.warning("⚠️ No usable text in this chunk, skipping")
             continue
 
-        print(f"   🔄 Re-embedding {len(texts)} posts with zero vectors...")
+        logger.info(f"🔄 Re-embedding {len(texts)} posts with zero vectors...")
         # Use smaller batches for safety; embed_texts_batch will still throttle
         embeddings = embed_texts_batch(texts, batch_size=batch_size)
 
@@ -721,59 +1312,246 @@ def repair_zero_embeddings(batch_size: int = 5) -> None:
                 continue
             embeddings_cache[int(pid)] = vec
             points_to_upsert.append(
-                qmodels.PointStruct(id=pid, vector=vec, payload=payload)
+                build_point(qclient, pid, vec, payload)
             )
 
         if points_to_upsert:
             try:
                 qclient.upsert(collection_name=QDRANT_COLLECTION, points=points_to_upsert)
                 fixed += len(points_to_upsert)
-                print(f"   ✅ Upserted {len(points_to_upsert)} repaired posts")
+                logger.info(f"✅ Upserted {len(points_to_upsert)} repaired posts")
             except Exception as e:
-                print(f"⚠️ Failed to upsert repaired points: {e}")
+                logger.warning(f"⚠️ Failed to upsert repaired points: {e}")
 
         # Persist cache after each chunk
         save_embeddings_cache(embeddings_cache)
 
-    print(f"\n✅ Repair complete. Fixed embeddings for {fixed} posts.")
+    logger.info(f"✅ Repair complete. Fixed embeddings for {fixed} posts.")
+
+
+# ============================================================
+# QUANTIZATION / HNSW MIGRATION - Apply storage settings to an existing collection
+# ============================================================
+
+def _dense_vector(vector) -> Optional[List[float]]:
+    """Extract the dense vector from a point (named-vector dict on hybrid collections)."""
+    if isinstance(vector, dict):
+        return vector.get(DENSE_VECTOR_NAME)
+    return vector
+
+
+def measure_recall(collection_name: str = QDRANT_COLLECTION, samples: int = 50, top_k: int = 10) -> float:
+    """
+    Measure recall@k of the configured (HNSW + quantized) search against exact search.
+
+    Query vectors are stored points drawn at random (no embedding API call);
+    each query excludes its own point, which both searches would otherwise
+    trivially return first. The exact baseline scores the original float
+    vectors (quantization ignored), so it is the true nearest neighbours.
+    """
+    qclient = get_qdrant_client()
+    points = qclient.query_points(
+        collection_name=collection_name,
+        query=qmodels.SampleQuery(sample=qmodels.Sample.RANDOM),
+        limit=samples,
+        with_payload=False,
+        with_vectors=[DENSE_VECTOR_NAME],
+    ).points
+    queries = [(p.id, v) for p, v in ((p, _dense_vector(p.vector)) for p in points) if v]
+    if not queries:
+        logger.warning("⚠️ No vectors to sample, cannot measure recall")
+        return 0.0
+
+    exact_params = qmodels.SearchParams(
+        exact=True,
+        quantization=qmodels.QuantizationSearchParams(ignore=True),
+    )
+    total, approx_time, exact_time = 0.0, 0.0, 0.0
+    for point_id, vec in queries:
+        not_itself = qmodels.Filter(must_not=[qmodels.HasIdCondition(has_id=[point_id])])
+        started = time.perf_counter()
+        exact = qclient.query_points(
+            collection_name=collection_name,
+            query=vec,
+            using=DENSE_VECTOR_NAME,
+            query_filter=not_itself,
+            limit=top_k,
+            search_params=exact_params,
+        ).points
+        exact_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        approx = qclient.query_points(
+            collection_name=collection_name,
+            query=vec,
+            using=DENSE_VECTOR_NAME,
+            query_filter=not_itself,
+            limit=top_k,
+            search_params=search_params(),
+        ).points
+        approx_time += time.perf_counter() - started
+
+        exact_ids = {p.id for p in exact}
+        total += len(exact_ids & {p.id for p in approx}) / max(1, len(exact_ids))
+
+    recall = total / len(queries)
+    logger.info(f"📏 Recall@{top_k} on '{collection_name}' ({len(queries)} queries): {recall:.3f} "
+          f"(approx {approx_time / len(queries) * 1000:.1f} ms/query, "
+          f"exact {exact_time / len(queries) * 1000:.1f} ms/query)")
+    return recall
+
+
+def estimate_vector_memory(collection_name: str = QDRANT_COLLECTION) -> Dict:
+    """Estimate RAM used by dense vectors, with and without the configured quantization."""
+    qclient = get_qdrant_client()
+    count = qclient.count(collection_name=collection_name, exact=True).count
+    float_bytes = count * EMBEDDING_DIMENSION * 4
+    if QDRANT_QUANTIZATION == "scalar":
+        quantized_bytes = count * EMBEDDING_DIMENSION
+    elif QDRANT_QUANTIZATION == "binary":
+        quantized_bytes = count * EMBEDDING_DIMENSION // 8
+    else:
+        quantized_bytes = float_bytes
+    # With on-disk originals only the quantized copy stays resident
+    resident = quantized_bytes
+    if not QDRANT_ON_DISK and QDRANT_QUANTIZATION in {"scalar", "binary"}:
+        resident += float_bytes
+    estimate = {
+        "points": count,
+        "float32_mb": round(float_bytes / 1e6, 1),
+        "resident_mb": round(resident / 1e6, 1),
+    }
+    logger.info(f"🧮 Vector RAM for {count} points: float32 {estimate['float32_mb']} MB "
+          f"→ resident ~{estimate['resident_mb']} MB ({QDRANT_QUANTIZATION}, on_disk={QDRANT_ON_DISK})")
+    return estimate
+
+
+def _wait_for_optimizer(qclient: QdrantClient, collection_name: str, timeout: float = 1800.0) -> None:
+    """Wait until Qdrant has rebuilt segments/indexes after a config change."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = qclient.get_collection(collection_name=collection_name).status
+        if status == qmodels.CollectionStatus.GREEN:
+            return
+        logger.info(f"⏳ Collection status {status}, waiting for optimizer...")
+        time.sleep(10)
+    logger.warning("⚠️ Optimizer still running, recall below may not reflect the final index")
 
 
-def search_news(query: str, top_k: int = 5, days_back: int = None) -> List[Dict]:
+def migrate_collection_config(collection_name: str = QDRANT_COLLECTION) -> None:
+    """
+    Apply the configured quantization, on-disk storage and HNSW parameters to an
+    existing collection in place (no re-embedding), measuring recall before and after.
+    """
+    qclient = get_qdrant_client()
+    logger.info(f"⌘ Migrating '{collection_name}' → quantization={QDRANT_QUANTIZATION}, "
+          f"on_disk={QDRANT_ON_DISK}, m={QDRANT_HNSW_M}, ef_construct={QDRANT_HNSW_EF_CONSTRUCT}")
+    recall_before = measure_recall(collection_name)
+
+    qclient.update_collection(
+        collection_name=collection_name,
+        vectors_config={
+            DENSE_VECTOR_NAME: qmodels.VectorParamsDiff(on_disk=QDRANT_ON_DISK, hnsw_config=hnsw_config()),
+        },
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config() or qmodels.Disabled.DISABLED,
+    )
+    logger.info("✅ Collection config updated, Qdrant is rebuilding segments")
+    _wait_for_optimizer(qclient, collection_name)
+
+    recall_after = measure_recall(collection_name)
+    estimate_vector_memory(collection_name)
+    if recall_after < recall_before - 0.02:
+        logger.warning(f"⚠️ Recall dropped ({recall_before:.3f} → {recall_after:.3f}): "
+              f"raise QDRANT_QUANT_OVERSAMPLING or QDRANT_HNSW_EF")
+
+
+def embed_query(query: str) -> Optional[List[float]]:
+    """Query embedding, or None when embeddings are disabled or unavailable (lexical search only)."""
+    if DISABLE_EMBEDDING:
+        logger.debug("[search_news] Embeddings disabled (DISABLE_EMBEDDING=1), using lexical search only.")
+        return None
+    try:
+        query_vec = embed_text(query)
+        logger.debug("[search_news] Query embedded, vector dim=%d", len(query_vec))
+        return query_vec
+    except (CircuitOpen, DeadlineExceeded) as e:
+        logger.warning("[search_news] Embedding skipped (%s), lexical search only", e, extra={"query": query})
+    except Exception:
+        logger.exception("[search_news] Error embedding query", extra={"query": query})
+    return None
+
+
+def search_news(query: str, top_k: int = 5, days_back: int = None, query_vec: Optional[List[float]] = None,
+                embed: bool = True, with_vectors: bool = False) -> List[Dict]:
     """
     Search indexed news posts for a query using Qdrant.
+
+    When the collection has BM25 sparse vectors, dense and lexical candidates
+    are fused server-side (RRF). If embeddings are disabled or the query
+    embedding fails, lexical search alone is used: the local in-process index
+    when available (no network call at all), else Qdrant's sparse vectors.
+    While the Qdrant circuit breaker is open, only the local index can answer.
+
+    With CHUNKED_INDEX, passages are searched and grouped by article: each
+    result carries its best matching passage in `snippet`.
     
     Args:
         query: Search query
         top_k: Number of results to return
         days_back: If specified, only return articles from the last N days
+        query_vec: Query embedding already computed by the caller (embed_query)
+        embed: Embed the query when query_vec is not given (False when the
+            caller already tried: lexical search only)
+        with_vectors: Also return each hit's dense vector in `vector` (None
+            for lexical hits), e.g. for the conversation retrieval cache
     """
     from datetime import datetime, timedelta
 
-    print(f"[search_news] Called with query='{query}', top_k={top_k}, days_back={days_back}")
+    logger.debug("[search_news] Called with query=%r, top_k=%d, days_back=%s", query, top_k, days_back)
+
+    cutoff_date = None
+    if days_back is not None:
+        cutoff_date = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%dT%H:%M:%S")
 
     # On environments where embeddings are disabled (e.g. Render free tier),
-    # we cannot embed queries, so we just return no internal results.
-    if DISABLE_EMBEDDING:
-        print("[search_news] Embeddings disabled (DISABLE_EMBEDDING=1), returning no results.")
+    # we cannot embed queries: only lexical search can serve results.
+    if query_vec is None and embed:
+        query_vec = embed_query(query)
+
+    qdrant_down = breakers["qdrant"].is_open
+    if query_vec is None or qdrant_down:
+        lexical_index = get_lexical_index()
+        if lexical_index is not None:
+            started = time.perf_counter()
+            with timed("lexical_search", top_k=top_k) as stage_span:
+                results = lexical_index.search(
+                    query,
+                    top_k=top_k,
+                    min_date=date_to_epoch(cutoff_date) if cutoff_date else None,
+                )
+                stage_span.set_attribute("results", len(results))
+            logger.info(
+                "[search_news] Local lexical index returned %d results in %.1f ms",
+                len(results), (time.perf_counter() - started) * 1000,
+                extra={"query": query, "results": len(results), "engine": "lexical"},
+            )
+            return results
+
+    if qdrant_down:
+        logger.warning("[search_news] Qdrant circuit open and no local lexical index", extra={"query": query})
         return []
 
-    print("[search_news] Getting Qdrant client...")
     qclient = get_qdrant_client()
+    collection_name = QDRANT_CHUNK_COLLECTION if CHUNKED_INDEX else QDRANT_COLLECTION
+    use_sparse = collection_has_sparse(qclient, collection_name)
 
-    try:
-        print("[search_news] Embedding query...")
-        query_vec = embed_text(query)
-        print(f"[search_news] Query embedded, vector dim={len(query_vec)}")
-    except Exception as e:
-        print(f"[search_news] Error embedding query: {e}")
-        import traceback
-        traceback.print_exc()
+    if query_vec is None and not use_sparse:
         return []
 
     # Build date filter if specified
     query_filter = None
-    if days_back is not None:
-        cutoff_date = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%dT%H:%M:%S")
+    if cutoff_date is not None:
         query_filter = qmodels.Filter(
             must=[
                 qmodels.FieldCondition(
@@ -783,41 +1561,103 @@ def search_news(query: str, top_k: int = 5, days_back: int = None) -> List[Dict]
             ]
         )
 
+    sparse_query = None
+    if use_sparse:
+        indices, values = bm25_query_vector(query)
+        if indices:
+            sparse_query = qmodels.SparseVector(indices=indices, values=values)
+        elif query_vec is None:
+            return []
+
+    # Query arguments shared by article-level and passage-level (grouped) search
+    if query_vec is not None and sparse_query is not None:
+        # Hybrid: both branches are filtered, then fused server-side. Passages
+        # need a deeper candidate pool since several may belong to one article.
+        prefetch_limit = top_k * HYBRID_PREFETCH_MULTIPLIER * (3 if CHUNKED_INDEX else 1)
+        query_kwargs = {
+            "prefetch": [
+                qmodels.Prefetch(query=query_vec, using=DENSE_VECTOR_NAME, params=search_params(),
+                                 filter=query_filter, limit=prefetch_limit),
+                qmodels.Prefetch(query=sparse_query, using=SPARSE_VECTOR_NAME,
+                                 filter=query_filter, limit=prefetch_limit),
+            ],
+            "query": qmodels.FusionQuery(fusion=qmodels.Fusion.RRF),
+        }
+    elif sparse_query is not None:
+        query_kwargs = {"query": sparse_query, "using": SPARSE_VECTOR_NAME, "query_filter": query_filter}
+    else:
+        query_kwargs = {"query": query_vec, "query_filter": query_filter, "search_params": search_params()}
+
+    if with_vectors:
+        query_kwargs["with_vectors"] = True
+
     try:
-        print(f"[search_news] Querying Qdrant collection '{QDRANT_COLLECTION}'...")
-        response = qclient.query_points(
-            collection_name=QDRANT_COLLECTION,
-            query=query_vec,
-            query_filter=query_filter,
-            limit=top_k,
+        started = time.perf_counter()
+        # Server-side timeout (whole seconds), bounded by the request deadline
+        query_kwargs["timeout"] = max(1, int(call_timeout(QDRANT_TIMEOUT_S)))
+        with breakers["qdrant"].guard(), timed("qdrant_query", collection=collection_name, top_k=top_k,
+                                               dense=query_vec is not None,
+                                               sparse=sparse_query is not None) as stage_span:
+            if CHUNKED_INDEX:
+                # Best passage per article
+                response = qclient.query_points_groups(
+                    collection_name=collection_name,
+                    group_by="post_id",
+                    group_size=1,
+                    limit=top_k,
+                    **query_kwargs,
+                )
+                results = [group.hits[0] for group in response.groups if group.hits]
+            else:
+                response = qclient.query_points(
+                    collection_name=collection_name,
+                    limit=top_k,
+                    **query_kwargs,
+                )
+                results = response.points
+            stage_span.set_attribute("results", len(results))
+        logger.info(
+            "[search_news] Qdrant returned %d results in %.1f ms",
+            len(results), (time.perf_counter() - started) * 1000,
+            extra={"query": query, "results": len(results), "collection": collection_name,
+                   "dense": query_vec is not None, "sparse": sparse_query is not None},
         )
-        results = response.points
-        print(f"[search_news] Qdrant returned {len(results)} results")
-    except Exception as e:
-        print(f"[search_news] Error querying Qdrant: {e}")
-        import traceback
-        traceback.print_exc()
+    except (CircuitOpen, DeadlineExceeded) as e:
+        logger.warning("[search_news] Qdrant query skipped (%s)", e, extra={"query": query})
+        return []
+    except Exception:
+        logger.exception("[search_news] Error querying Qdrant", extra={"query": query})
         return []
 
     scored: List[Dict] = []
     for r in results:
         payload = r.payload or {}
-        scored.append(
-            {
-                "post_id": payload.get("post_id"),
-                "title": payload.get("title", ""),
-                "url": payload.get("url", ""),
-                "date": payload.get("date", ""),
-                "content": payload.get("content", ""),
-                "score": r.score,
-            }
-        )
+        result = {
+            "post_id": payload.get("post_id"),
+            "title": payload.get("title", ""),
+            "url": payload.get("url", ""),
+            "date": payload.get("date", ""),
+            "content": payload.get("content", ""),
+            "score": r.score,
+        }
+        if "chunk_index" in payload:
+            # Passage hit: the matching passage is the snippet to show
+            result["snippet"] = payload.get("content", "")
+        if with_vectors:
+            result["vector"] = _dense_vector(r.vector)
+        scored.append(result)
 
     return scored
 
 
 if __name__ == "__main__":
     import sys
+    from logging_config import setup_logging
+
+    # CLI: texte lisible, écrit directement pour rester dans l'ordre des print()
+    setup_logging(default_format="text", queued=False)
+    from cassette import install_cassette
+    install_cassette()
     
     print("="*60)
     print("📰 Conso News Indexer (Vertex AI gemini-embedding-001, 768 dims)")
@@ -826,6 +1666,9 @@ if __name__ == "__main__":
     # Flags
     fresh_mode = "--fresh" in sys.argv
     repair_zeros_mode = "--repair-zeros" in sys.argv
+    build_lexical_mode = "--build-lexical" in sys.argv
+    migrate_mode = "--migrate-quantization" in sys.argv
+    recall_mode = "--measure-recall" in sys.argv
 
     # Check for --search to just test search
     if "--search" in sys.argv:
@@ -841,6 +1684,21 @@ if __name__ == "__main__":
             print(f"Date:  {r['date']}")
             print(f"Content: {r['content'][:200]}...")
             print()
+    elif migrate_mode:
+        # Apply quantization/HNSW settings to the existing collection(s)
+        print("Mode: MIGRATE-QUANTIZATION (update collection storage config in place)\n")
+        migrate_collection_config(QDRANT_COLLECTION)
+        if CHUNKED_INDEX:
+            migrate_collection_config(QDRANT_CHUNK_COLLECTION)
+    elif recall_mode:
+        print("Mode: MEASURE-RECALL (configured search vs exact search)\n")
+        measure_recall(QDRANT_COLLECTION)
+        estimate_vector_memory(QDRANT_COLLECTION)
+    elif build_lexical_mode:
+        # Rebuild the local BM25 index (no embeddings needed)
+        source = "batches" if "--from-batches" in sys.argv else "qdrant"
+        print(f"Mode: BUILD-LEXICAL (local BM25 index from {source})\n")
+        build_lexical_index(source=source)
     elif repair_zeros_mode:
         # Only repair zero embeddings
         print("Mode: REPAIR-ZEROS (re-embed posts with all-zero vectors)\n")
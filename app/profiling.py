@@ -0,0 +1,366 @@
+"""
+Profilage à la demande des requêtes de chat (diagnostic des pics CPU en production).
+
+Un profil est capturé:
+- sur demande: en-tête X-Profile: 1 (ou ?profile=1) avec X-Admin-Token valide
+  (PROFILING_ADMIN_TOKEN);
+- automatiquement si la requête dépasse PROFILE_SLOW_REQUEST_MS.
+
+Il contient un profil CPU par échantillonnage (piles de tous les threads du
+process toutes les PROFILE_SAMPLE_INTERVAL_MS, pondérées par le temps CPU
+consommé par chaque thread depuis le relevé précédent) et la
+chronologie de la requête (noeuds LangGraph, appels LLM, outils, étapes
+mesurées par metrics.timed) reconstruite à partir de ses spans. Les profils
+sont consultables via /admin/profiles (et écrits dans PROFILE_DIR si défini).
+
+Pour le déclenchement automatique, l'échantillonneur tourne en continu dans
+un tampon circulaire (PROFILE_BUFFER_SECONDS): on ne peut pas savoir à
+l'avance qu'une requête sera lente. Le profil couvre tout le process: des
+requêtes concurrentes apparaissent aussi dans les piles.
+"""
+
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))  # 0 = désactivé
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+PROFILE_BUFFER_SECONDS = float(os.getenv("PROFILE_BUFFER_SECONDS", "60"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+PROFILED_PATHS = ("/session/chat", "/chat", "/chat/simple")
+
+# Sans horloge CPU par thread (hors Linux): fonctions feuilles d'un thread qui attend
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("ssl.py", "recv_into"),
+}
+
+
+def profiling_enabled() -> bool:
+    return bool(PROFILING_ADMIN_TOKEN) or PROFILE_SLOW_REQUEST_MS > 0
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    """Comparaison à temps constant; toujours False si aucun jeton n'est configuré."""
+    return bool(PROFILING_ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILING_ADMIN_TOKEN)
+
+
+# ============================================================
+# Échantillonneur de piles
+# ============================================================
+
+class StackSampler:
+    """Thread qui relève les piles Python de tous les threads à intervalle fixe.
+
+    continuous=True: tourne en permanence (profils rétroactifs des requêtes lentes).
+    Sinon il ne tourne que tant qu'une requête profilée est en cours (acquire/release).
+    """
+
+    def __init__(self, interval_ms: float, buffer_seconds: float, continuous: bool = False):
+        self.interval = interval_ms / 1000
+        self.continuous = continuous
+        self.samples: deque = deque(maxlen=max(1, int(buffer_seconds / self.interval)))
+        self.lock = threading.Lock()
+        self._users = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        with self.lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        with self.lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=1)
+
+    def acquire(self) -> None:
+        with self.lock:
+            self._users += 1
+        self.start()
+
+    def release(self) -> None:
+        with self.lock:
+            self._users -= 1
+            idle = self._users == 0 and not self.continuous
+        if idle:
+            self.stop()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last_cpu: Dict[int, float] = {}
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            stacks = []
+            cpu_now: Dict[int, float] = {}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                cpu = _thread_cpu_time(ident)
+                if cpu is not None:
+                    cpu_now[ident] = cpu
+                    if ident not in last_cpu:
+                        continue
+                    cpu_ms = (cpu - last_cpu[ident]) * 1000
+                    if cpu_ms <= 0:
+                        continue
+                else:
+                    leaf = frame.f_code
+                    if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+                        continue
+                    cpu_ms = self.interval * 1000
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stacks.append((ident, tuple(reversed(stack)), cpu_ms))
+            last_cpu = cpu_now
+            with self.lock:
+                self.samples.append((now, stacks))
+
+    def window(self, start: float, end: float) -> List[Tuple[float, list]]:
+        with self.lock:
+            return [sample for sample in self.samples if start <= sample[0] <= end]
+
+
+def _thread_cpu_time(ident: int) -> Optional[float]:
+    """Temps CPU (s) d'un thread via son horloge POSIX; None si indisponible."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def summarize_samples(samples: List[Tuple[float, list]], interval_ms: float, top: int = 30) -> Dict:
+    """Temps CPU propre / cumulé par fonction et piles repliées (format flamegraph, en µs)."""
+    self_ms: Counter = Counter()
+    total_ms: Counter = Counter()
+    collapsed: Counter = Counter()
+    threads = set()
+    cpu_total = 0.0
+    for _, thread_stacks in samples:
+        for ident, stack, cpu_ms in thread_stacks:
+            threads.add(ident)
+            cpu_total += cpu_ms
+            labels = [_frame_label(code) for code in stack]
+            self_ms[labels[-1]] += cpu_ms
+            for label in set(labels):
+                total_ms[label] += cpu_ms
+            collapsed[";".join(labels)] += cpu_ms
+
+    def table(counts: Counter) -> List[Dict]:
+        return [
+            {"function": label, "cpu_ms": round(ms, 1), "pct": round(100 * ms / cpu_total, 1)}
+            for label, ms in counts.most_common(top)
+        ]
+
+    return {
+        "interval_ms": interval_ms,
+        "ticks": len(samples),
+        "cpu_ms": round(cpu_total, 1),
+        "threads": len(threads),
+        "top_self": table(self_ms),
+        "top_cumulative": table(total_ms),
+        "collapsed": {stack: max(1, int(ms * 1000)) for stack, ms in collapsed.most_common()},
+    }
+
+
+# ============================================================
+# Chronologie (spans de la requête)
+# ============================================================
+
+class SpanCollector(SpanProcessor):
+    """SpanProcessor OpenTelemetry qui garde les spans des traces en cours de profilage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.traces: Dict[int, List] = {}
+
+    def watch(self, trace_id: int) -> None:
+        with self.lock:
+            self.traces.setdefault(trace_id, [])
+
+    def collect(self, trace_id: int) -> List:
+        with self.lock:
+            return self.traces.pop(trace_id, [])
+
+    def on_end(self, span) -> None:
+        with self.lock:
+            spans = self.traces.get(span.context.trace_id)
+            if spans is not None:
+                spans.append(span)
+
+
+def build_timeline(spans: List, started_ns: int) -> List[Dict]:
+    """Spans triés par début, avec profondeur et temps relatifs au début de la requête."""
+    parents = {s.context.span_id: (s.parent.span_id if s.parent else None) for s in spans}
+
+    def depth(span_id) -> int:
+        level = 0
+        while parents.get(span_id) in parents:
+            span_id = parents[span_id]
+            level += 1
+        return level
+
+    return [
+        {
+            "name": s.name,
+            "depth": depth(s.context.span_id),
+            "start_ms": round((s.start_time - started_ns) / 1e6, 1),
+            "duration_ms": round((s.end_time - s.start_time) / 1e6, 1),
+            "error": not s.status.is_ok,
+        }
+        for s in sorted(spans, key=lambda s: s.start_time)
+    ]
+
+
+# ============================================================
+# Stockage et cycle de vie
+# ============================================================
+
+class ProfileStore:
+    """Derniers profils en mémoire (PROFILE_MAX_STORED), copiés dans PROFILE_DIR si défini."""
+
+    def __init__(self, max_stored: int = PROFILE_MAX_STORED, directory: str = PROFILE_DIR):
+        self.lock = threading.Lock()
+        self.profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self.max_stored = max_stored
+        self.directory = directory
+
+    def add(self, profile: Dict) -> None:
+        with self.lock:
+            self.profiles[profile["id"]] = profile
+            while len(self.profiles) > self.max_stored:
+                self.profiles.popitem(last=False)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile['id']}.json"), "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        keys = ("id", "label", "trigger", "started_at", "duration_ms", "trace_id")
+        with self.lock:
+            return [{key: p[key] for key in keys} for p in reversed(self.profiles.values())]
+
+
+profile_store = ProfileStore()
+sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS, PROFILE_BUFFER_SECONDS, continuous=PROFILE_SLOW_REQUEST_MS > 0)
+span_collector = SpanCollector()
+_active = False
+
+
+def setup_profiling() -> bool:
+    """À appeler après setup_tracing(). Retourne True si le profilage est actif.
+
+    Sans exporteur de traces configuré, un TracerProvider sans export est
+    installé pour que les spans (chronologie) soient enregistrés.
+    """
+    global _active
+    if not profiling_enabled() or _active:
+        return _active
+
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        provider = TracerProvider()
+        trace.set_tracer_provider(provider)
+    provider.add_span_processor(span_collector)
+    if sampler.continuous:
+        sampler.start()
+    _active = True
+    logger.info(
+        "🩺 Request profiling enabled",
+        extra={"slow_request_ms": PROFILE_SLOW_REQUEST_MS, "on_demand": bool(PROFILING_ADMIN_TOKEN)},
+    )
+    return True
+
+
+def shutdown_profiling() -> None:
+    sampler.stop()
+
+
+class RequestProfile:
+    """Handle renvoyé par profile_request: id du profil s'il a été conservé."""
+
+    def __init__(self, label: str, forced: bool):
+        self.label = label
+        self.forced = forced
+        self.id: Optional[str] = None
+
+
+@contextmanager
+def profile_request(label: str, forced: bool = False):
+    """Profile le bloc (la requête) si forced ou s'il dépasse PROFILE_SLOW_REQUEST_MS."""
+    handle = RequestProfile(label, forced)
+    if not _active or not (forced or PROFILE_SLOW_REQUEST_MS > 0):
+        yield handle
+        return
+
+    span_context = trace.get_current_span().get_span_context()
+    trace_id = span_context.trace_id if span_context.is_valid else None
+    if trace_id is not None:
+        span_collector.watch(trace_id)
+    if forced:
+        sampler.acquire()
+    started_at = datetime.now(timezone.utc)
+    started_ns = time.time_ns()
+    started = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        ended = time.perf_counter()
+        spans = span_collector.collect(trace_id) if trace_id is not None else []
+        duration_ms = (ended - started) * 1000
+        if forced or duration_ms >= PROFILE_SLOW_REQUEST_MS:
+            handle.id = uuid.uuid4().hex[:12]
+            profile_store.add({
+                "id": handle.id,
+                "label": label,
+                "trigger": "on_demand" if forced else "slow_request",
+                "started_at": started_at.isoformat(timespec="milliseconds"),
+                "duration_ms": round(duration_ms, 1),
+                "trace_id": format(trace_id, "032x") if trace_id is not None else None,
+                "timeline": build_timeline(spans, started_ns),
+                "cpu": summarize_samples(sampler.window(started, ended), PROFILE_SAMPLE_INTERVAL_MS),
+            })
+            logger.warning(
+                f"🩺 Profile captured for {label} ({duration_ms:.0f} ms)",
+                extra={"profile_id": handle.id, "duration_ms": round(duration_ms, 1), "forced": forced},
+            )
+        if forced:
+            sampler.release()
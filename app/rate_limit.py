@@ -0,0 +1,240 @@
+"""
+Limitation de débit par client (IP) et par session: seaux à jetons.
+
+Chaque quota s'écrit "capacité/période" (ex: "10/60": rafale de 10 requêtes,
+puis 10 par 60 secondes). Un seau n'est stocké que par un float, l'instant où
+il sera de nouveau plein (équivalent GCRA): un dict {(route, portée, id): float}
+reste compact même avec beaucoup de clients, et un seau plein est identique à
+un seau absent, ce qui permet de purger périodiquement tout ce qui a eu le
+temps de se remplir.
+
+Le quota par IP est appliqué par un middleware de main.py, le quota par
+session dans /session/chat (l'id de session est dans le corps). Au-delà: 429
+avec Retry-After. Sur /ws/chat, "connect" limite les ouvertures de connexion
+par IP, "ip" et "session" les messages reçus sur la connexion (trame error,
+status 429).
+
+Avec SESSION_BACKEND=redis, les seaux sont dans Redis (même float, mis à jour
+par un script Lua sur l'horloge de Redis): le quota est commun à tous les
+workers et instances. Redis injoignable: la requête passe (erreur comptée).
+Sinon l'état est local au process: avec N workers, un client peut obtenir
+jusqu'à N fois son quota (ajuster RATE_LIMITS en conséquence).
+
+Derrière un proxy, RATE_LIMIT_PROXY_HOPS doit être renseigné: sans lui,
+l'adresse de connexion est celle du proxy et tous les clients partageraient
+un seul seau. Si la variable est absente et qu'une requête porte
+X-Forwarded-For, les quotas par IP ne sont donc pas appliqués (avertissement
+au premier cas); RATE_LIMIT_PROXY_HOPS=0 explicite les applique à l'adresse
+de connexion.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import ERRORS, RATE_LIMIT_BUCKETS, RATE_LIMITED
+from session_manager import REDIS_KEY_PREFIX, REDIS_TIMEOUT_S, REDIS_URL, SESSION_BACKEND
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+# Proxys de confiance devant l'app (Render: 1): l'IP client est alors lue dans
+# X-Forwarded-For, sinon c'est celle de la connexion (absente: voir client_ip)
+_PROXY_HOPS_SETTING = os.getenv("RATE_LIMIT_PROXY_HOPS")
+RATE_LIMIT_PROXY_HOPS = int(_PROXY_HOPS_SETTING or "0")
+RATE_LIMIT_SWEEP_S = float(os.getenv("RATE_LIMIT_SWEEP_S", "60"))
+
+# {route: {portée: "capacité/période en secondes"}}; portées: ip, session, connect
+DEFAULT_RATE_LIMITS = {
+    "/chat": {"ip": "10/60"},
+    "/chat/simple": {"ip": "10/60"},
+    "/session/chat": {"ip": "20/60", "session": "10/60"},
+    "/session/new": {"ip": "10/60"},
+    "/ws/chat": {"connect": "10/60", "ip": "20/60", "session": "10/60"},
+}
+# Fusionné portée par portée avec les valeurs par défaut, ex: {"/chat": {"ip": "30/60"}};
+# null retire une portée: {"/session/chat": {"session": null}}
+_RATE_LIMIT_OVERRIDES: Dict[str, Dict[str, Optional[str]]] = json.loads(os.getenv("RATE_LIMITS", "{}") or "{}")
+RATE_LIMITS: Dict[str, Dict[str, str]] = {
+    route: {
+        scope: spec
+        for scope, spec in {**DEFAULT_RATE_LIMITS.get(route, {}), **_RATE_LIMIT_OVERRIDES.get(route, {})}.items()
+        if spec is not None
+    }
+    for route in {**DEFAULT_RATE_LIMITS, **_RATE_LIMIT_OVERRIDES}
+}
+
+RATE_LIMIT_DETAIL = "Trop de requêtes, veuillez patienter avant de réessayer."
+
+
+def parse_quota(spec: str) -> Tuple[float, float]:
+    """ "10/60" -> (capacité 10, 10/60 jeton par seconde)."""
+    capacity, period = spec.split("/")
+    return float(capacity), float(capacity) / float(period)
+
+
+class TokenBuckets:
+    """Seaux à jetons {clé: instant où le seau sera plein} (thread-safe)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.full_at: Dict[tuple, float] = {}
+
+    def take(self, key: tuple, capacity: float, rate: float, now: Optional[float] = None) -> float:
+        """Consomme un jeton; renvoie 0 si accepté, sinon l'attente en secondes."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            full_at = max(self.full_at.get(key, now), now)
+            tokens = capacity - (full_at - now) * rate
+            if tokens < 1:
+                return (1 - tokens) / rate
+            self.full_at[key] = full_at + 1 / rate
+            return 0.0
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Supprime les seaux de nouveau pleins; renvoie leur nombre."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            full = [key for key, full_at in self.full_at.items() if full_at <= now]
+            for key in full:
+                del self.full_at[key]
+        return len(full)
+
+    def __len__(self) -> int:
+        return len(self.full_at)
+
+
+# GCRA de TokenBuckets.take en une étape atomique; instants en millisecondes
+# sur l'horloge de Redis (commune aux workers). Renvoie l'attente en ms (0: accepté).
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local tokens = capacity - (full_at - now) / interval
+if tokens < 1 then
+    return math.ceil((1 - tokens) * interval)
+end
+full_at = math.ceil(full_at + interval)
+redis.call('SET', KEYS[1], full_at, 'PX', full_at - now)
+return 0
+"""
+
+
+class RedisTokenBuckets:
+    """Seaux à jetons partagés dans Redis (même take que TokenBuckets).
+
+    Une clé par seau, qui expire quand il est de nouveau plein: pas de purge.
+    """
+
+    def __init__(self, url: str = REDIS_URL, key_prefix: str = REDIS_KEY_PREFIX):
+        import redis
+
+        self.redis = redis.Redis.from_url(
+            url,
+            decode_responses=True,
+            socket_timeout=REDIS_TIMEOUT_S,
+            socket_connect_timeout=REDIS_TIMEOUT_S,
+            health_check_interval=30,
+        )
+        self.prefix = f"{key_prefix}ratelimit:"
+        self.gcra = self.redis.register_script(GCRA_SCRIPT)
+
+    def take(self, key: tuple, capacity: float, rate: float) -> float:
+        """Consomme un jeton; renvoie 0 si accepté, sinon l'attente en secondes."""
+        wait_ms = self.gcra(keys=[self.prefix + ":".join(key)], args=[capacity, 1000 / rate])
+        return int(wait_ms) / 1000
+
+
+class RateLimiter:
+    """Quotas par route et par portée sur un ensemble de seaux."""
+
+    def __init__(self, limits: Dict[str, Dict[str, str]] = None, enabled: bool = RATE_LIMIT_ENABLED,
+                 backend: str = SESSION_BACKEND):
+        self.enabled = enabled
+        self.quotas = {
+            (route, scope): parse_quota(spec)
+            for route, scopes in (RATE_LIMITS if limits is None else limits).items()
+            for scope, spec in scopes.items()
+        }
+        self.shared = backend == "redis"
+        if self.shared:
+            # Les clés Redis expirent d'elles-mêmes: ni purge ni jauge locale
+            self.buckets = RedisTokenBuckets()
+            return
+        self.buckets = TokenBuckets()
+        RATE_LIMIT_BUCKETS.set_function(lambda: len(self.buckets))
+        if self.enabled:
+            self._start_sweep_thread()
+            # Workers gunicorn (preload): le thread du process parent n'est pas copié
+            os.register_at_fork(after_in_child=self._start_sweep_thread)
+
+    def check(self, route: str, scope: str, ident: Optional[str]) -> Optional[int]:
+        """None si la requête passe, sinon le Retry-After (secondes entières)."""
+        quota = self.quotas.get((route, scope))
+        if not self.enabled or quota is None or not ident:
+            return None
+        try:
+            wait = self.buckets.take((route, scope, ident), *quota)
+        except Exception as e:
+            # Redis injoignable: mieux vaut laisser passer que tout refuser
+            ERRORS.labels("rate_limit").inc()
+            logger.warning(f"⚠️ Rate limit indisponible, requête acceptée: {e}")
+            return None
+        if not wait:
+            return None
+        RATE_LIMITED.labels(route, scope).inc()
+        return max(1, math.ceil(wait))
+
+    async def check_async(self, route: str, scope: str, ident: Optional[str]) -> Optional[int]:
+        """check() depuis un handler async: les seaux Redis passent par le threadpool."""
+        if self.shared and self.enabled:
+            return await run_in_threadpool(self.check, route, scope, ident)
+        return self.check(route, scope, ident)
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(RATE_LIMIT_SWEEP_S)
+            removed = self.buckets.sweep()
+            if removed:
+                logger.debug(f"🧹 Rate limit: {removed} seaux purgés, {len(self.buckets)} restants")
+
+    def _start_sweep_thread(self):
+        threading.Thread(target=self._sweep_forever, name="rate-limit-sweep", daemon=True).start()
+
+
+_proxy_warning_logged = False
+
+
+def client_ip(headers, client_host: Optional[str]) -> Optional[str]:
+    """IP du client, derrière RATE_LIMIT_PROXY_HOPS proxys de confiance.
+
+    None (quotas par IP non appliqués) si RATE_LIMIT_PROXY_HOPS est absent
+    alors que la requête vient d'un proxy (X-Forwarded-For présent).
+    """
+    global _proxy_warning_logged
+    if RATE_LIMIT_PROXY_HOPS > 0:
+        # Chaque proxy ajoute l'adresse qu'il voit à droite: les entrées plus à
+        # gauche peuvent être forgées par le client
+        forwarded = [part.strip() for part in headers.get("X-Forwarded-For", "").split(",") if part.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    elif _PROXY_HOPS_SETTING is None and headers.get("X-Forwarded-For"):
+        if not _proxy_warning_logged:
+            _proxy_warning_logged = True
+            logger.warning(
+                "⚠️ X-Forwarded-For reçu sans RATE_LIMIT_PROXY_HOPS: quotas par IP désactivés "
+                "(Render: RATE_LIMIT_PROXY_HOPS=1; 0 pour les appliquer à l'adresse de connexion)"
+            )
+        return None
+    return client_host
+
+
+rate_limiter = RateLimiter()
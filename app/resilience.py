@@ -0,0 +1,171 @@
+"""
+Budget de temps par requête et disjoncteurs des dépendances externes.
+
+Budget: chaque requête de chat reçoit une échéance (CHAT_DEADLINE_S, attente
+d'admission comprise) portée par un contextvar, donc visible de l'agent, des
+outils et de news_store. Chaque appel externe prend pour timeout le plus petit
+de son timeout propre et du temps restant (call_timeout); l'agent borne en plus
+l'exécution complète du graph: l'utilisateur n'attend jamais plus que le budget.
+
+Disjoncteurs: un par dépendance (qdrant, embedding, tavily, llm). Après
+BREAKER_FAILURE_THRESHOLD échecs consécutifs (erreurs ou timeouts), le
+disjoncteur s'ouvre: les appels échouent immédiatement (CircuitOpen) pendant
+BREAKER_RESET_S secondes, puis un appel d'essai est laissé passer (half_open)
+et referme le disjoncteur s'il réussit. L'appelant répond alors en mode
+dégradé (recherche lexicale, pas de recherche web, 503 si le LLM est coupé).
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import CIRCUIT_REJECTED, CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CHAT_DEADLINE_S = float(os.getenv("CHAT_DEADLINE_S", "45"))
+QDRANT_TIMEOUT_S = float(os.getenv("QDRANT_TIMEOUT_S", "5"))
+EMBEDDING_TIMEOUT_S = float(os.getenv("EMBEDDING_TIMEOUT_S", "5"))
+TAVILY_TIMEOUT_S = float(os.getenv("TAVILY_TIMEOUT_S", "10"))
+# Outil search_conso_news complet (embedding + deux requêtes Qdrant)
+NEWS_SEARCH_TIMEOUT_S = float(os.getenv("NEWS_SEARCH_TIMEOUT_S", "10"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "30"))
+
+# Valeurs de la jauge conso_circuit_state
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Le budget de temps de la requête est épuisé."""
+
+
+class CircuitOpen(RuntimeError):
+    """Dépendance coupée par son disjoncteur: appel refusé sans attendre."""
+
+
+# ============================================================
+# Échéance de la requête
+# ============================================================
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float = CHAT_DEADLINE_S):
+    """Fixe l'échéance de la requête (une échéance englobante plus proche est conservée)."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Secondes restantes avant l'échéance (None hors requête: indexation, CLI)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout(default: float) -> float:
+    """Timeout d'un appel externe: le sien, borné par le temps restant."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(default, left)
+
+
+# ============================================================
+# Disjoncteurs
+# ============================================================
+
+class CircuitBreaker:
+    """Disjoncteur closed -> open -> half_open -> closed (thread-safe)."""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            log = logger.warning if state == "open" else logger.info
+            log(f"🔌 Circuit {self.name}: {self.state} -> {state}", extra={"dependency": self.name})
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    @property
+    def is_open(self) -> bool:
+        """Vrai si les appels sont refusés en ce moment (sans consommer d'essai)."""
+        with self.lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == "half_open" and self._trial_running
+
+    def before_call(self) -> None:
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state("half_open")
+            if self.state == "open" or (self.state == "half_open" and self._trial_running):
+                CIRCUIT_REJECTED.labels(self.name).inc()
+                raise CircuitOpen(f"{self.name} circuit open")
+            if self.state == "half_open":
+                self._trial_running = True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self._trial_running = False
+            self._set_state("closed")
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state("open")
+
+    @contextmanager
+    def guard(self):
+        """Bloc d'appel à la dépendance: refusé si ouvert, résultat comptabilisé."""
+        self.before_call()
+        try:
+            yield
+        except BaseException as e:
+            left = remaining()
+            if isinstance(e, Exception) and not (left is not None and left <= 0):
+                self.record_failure()
+            else:
+                # Annulation ou budget de la requête épuisé: rien à reprocher à
+                # la dépendance, on libère simplement l'appel d'essai
+                with self.lock:
+                    self._trial_running = False
+            raise
+        self.record_success()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name) for name in ("qdrant", "embedding", "tavily", "llm")
+}
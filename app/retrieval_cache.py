@@ -0,0 +1,270 @@
+"""
+Cache de recherche à l'échelle de la conversation.
+
+Les questions de suivi ("et en 2023 ?", "donne plus de détails") portent en
+général sur les articles que l'agent vient de retrouver. Chaque session garde
+donc ses derniers articles (id, titre, URL, date, extrait, vecteur) et ses
+derniers résultats de recherche web:
+
+- search_conso_news classe d'abord les articles en cache selon la requête.
+  Un article est pertinent si la nouvelle requête en est proche (cosinus des
+  embeddings) dans l'absolu, au moins RETRIEVAL_CACHE_MIN_COSINE, et presque
+  autant que la requête qui l'a trouvé, au moins RETRIEVAL_CACHE_MIN_SIMILARITY
+  fois ce cosinus d'origine. Le plancher absolu compte: les modèles
+  d'embedding placent la plupart des cosinus dans une bande étroite, où un
+  sujet sans rapport passerait le seul seuil relatif. Il dépend du modèle et
+  n'a pas de valeur par défaut: à mesurer avec `python -m
+  benchmarks.cache_calibration`. Tant qu'il n'est pas défini, les articles en
+  cache ne remplacent jamais la recherche Qdrant (embeddings actifs). Sans vecteur
+  (embeddings désactivés, index lexical), c'est la part des termes de la
+  requête présents dans le titre et l'extrait qui compte. Au moins
+  RETRIEVAL_CACHE_MIN_HITS articles pertinents: réponse depuis le cache, sans
+  Qdrant. Sinon, recherche normale, et ses résultats rejoignent le cache.
+- les articles ajoutés pendant le tour en cours ne servent qu'aux tours
+  suivants: la recherche récente (180 jours) qui suit la recherche large du
+  même appel interroge Qdrant, au lieu de ne voir que les articles récents
+  parmi les résultats de la recherche large.
+- la recherche web réutilise le résultat d'une requête aux mêmes termes
+  (à l'ordre près) de moins de RETRIEVAL_CACHE_WEB_TTL_S secondes.
+
+Désactivé par défaut (RETRIEVAL_CACHE_ENABLED=1 pour l'activer, après
+calibration du plancher). Le cache est chargé avec la session au début du tour, porté par un contextvar
+(visible des outils, y compris dans leurs threads) et enregistré dans la
+session à la fin du tour s'il a changé. Hors session (/chat), pas de cache.
+"""
+
+import base64
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from lexical import tokenize
+from metrics import cache_result
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+RETRIEVAL_CACHE_MAX_DOCS = int(os.getenv("RETRIEVAL_CACHE_MAX_DOCS", "20"))
+RETRIEVAL_CACHE_MIN_HITS = int(os.getenv("RETRIEVAL_CACHE_MIN_HITS", "3"))
+# Seuils de pertinence: cosinus minimal (mesuré pour le modèle d'embedding;
+# non défini: pas de réponse depuis le cache avec vecteurs) et part du cosinus
+# d'origine (avec vecteurs), part des termes (sans)
+RETRIEVAL_CACHE_MIN_COSINE: Optional[float] = (
+    float(os.environ["RETRIEVAL_CACHE_MIN_COSINE"]) if os.getenv("RETRIEVAL_CACHE_MIN_COSINE") else None
+)
+RETRIEVAL_CACHE_MIN_SIMILARITY = float(os.getenv("RETRIEVAL_CACHE_MIN_SIMILARITY", "0.9"))
+RETRIEVAL_CACHE_MIN_TERM_OVERLAP = float(os.getenv("RETRIEVAL_CACHE_MIN_TERM_OVERLAP", "0.6"))
+RETRIEVAL_CACHE_WEB_TTL_S = float(os.getenv("RETRIEVAL_CACHE_WEB_TTL_S", "900"))
+RETRIEVAL_CACHE_MAX_WEB = int(os.getenv("RETRIEVAL_CACHE_MAX_WEB", "4"))
+# Extrait gardé par article: le même que celui montré au LLM par search_conso_news
+SNIPPET_CHARS = 300
+
+
+def _encode_vector(vector) -> Optional[str]:
+    """float32 en base64: ~4 Ko par vecteur de 768 dimensions au lieu de ~15 Ko en JSON."""
+    if not vector:
+        return None
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: Optional[str]) -> Optional[array]:
+    if not data:
+        return None
+    vector = array("f")
+    vector.frombytes(base64.b64decode(data))
+    return vector
+
+
+def _norm(vector) -> float:
+    return math.sqrt(sum(x * x for x in vector))
+
+
+def _cosine(query: List[float], query_norm: float, vector, vector_norm: float) -> float:
+    if not query_norm or not vector_norm or len(query) != len(vector):
+        return 0.0
+    return sum(a * b for a, b in zip(query, vector)) / (query_norm * vector_norm)
+
+
+class ConversationCache:
+    """Articles et recherches web récents d'une session (thread-safe: outils en parallèle)."""
+
+    def __init__(self, data: Optional[Dict] = None):
+        self.lock = threading.Lock()
+        self.dirty = False
+        # url -> article (ordre: du moins au plus récemment utilisé)
+        self.documents: "OrderedDict[str, Dict]" = OrderedDict()
+        for doc in (data or {}).get("documents", []):
+            self.documents[doc["url"]] = {**doc, "vector": _decode_vector(doc.get("vector"))}
+        self.web: List[Dict] = list((data or {}).get("web", []))
+        # Articles apparus pendant ce tour (non sérialisé): pas encore servis depuis le cache
+        self.added_this_turn: set = set()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def to_dict(self) -> Dict:
+        """Forme sérialisable (JSON) stockée dans la session."""
+        with self.lock:
+            return {
+                "documents": [
+                    {**doc, "vector": _encode_vector(doc["vector"])}
+                    for doc in self.documents.values()
+                ],
+                "web": list(self.web),
+            }
+
+    # ------------------------------------------------------------
+    # Articles Conso News
+    # ------------------------------------------------------------
+
+    def search(self, query: str, query_vec: Optional[List[float]], top_k: int,
+               min_date: Optional[str] = None) -> Optional[List[Dict]]:
+        """Articles en cache pertinents pour la requête, ou None si la couverture est insuffisante.
+
+        Args:
+            query: Requête de l'outil
+            query_vec: Embedding de la requête (None: termes seulement)
+            top_k: Nombre d'articles voulus
+            min_date: Date ISO minimale (recherche des articles récents)
+        """
+        terms = set(tokenize(query))
+        query_norm = _norm(query_vec) if query_vec else 0.0
+        hits = []
+        with self.lock:
+            for url, doc in self.documents.items():
+                if url in self.added_this_turn or (min_date and (doc.get("date") or "") < min_date):
+                    continue
+                if query_vec and doc["vector"] is not None and doc.get("anchor"):
+                    if RETRIEVAL_CACHE_MIN_COSINE is None:
+                        continue  # plancher non calibré
+                    score = _cosine(query_vec, query_norm, doc["vector"], doc["norm"])
+                    relevant = score >= max(RETRIEVAL_CACHE_MIN_COSINE,
+                                            RETRIEVAL_CACHE_MIN_SIMILARITY * doc["anchor"])
+                elif terms:
+                    doc_terms = set(tokenize(f"{doc.get('title', '')} {doc.get('snippet', '')}"))
+                    score = len(terms & doc_terms) / len(terms)
+                    relevant = score >= RETRIEVAL_CACHE_MIN_TERM_OVERLAP
+                else:
+                    continue
+                if relevant:
+                    hits.append((score, url))
+            if len(hits) < min(RETRIEVAL_CACHE_MIN_HITS, top_k):
+                return None
+            hits.sort(reverse=True)
+            results = []
+            for score, url in hits[:top_k]:
+                self.documents.move_to_end(url)
+                doc = self.documents[url]
+                results.append({
+                    "post_id": doc.get("post_id"),
+                    "title": doc.get("title", ""),
+                    "url": url,
+                    "date": doc.get("date", ""),
+                    "snippet": doc.get("snippet", ""),
+                    "score": score,
+                    "cached": True,
+                })
+            return results
+
+    def similarities(self, query_vec: List[float]) -> List[Tuple[float, float]]:
+        """(cosinus avec la requête, cosinus d'origine) des articles avec vecteur (calibration)."""
+        query_norm = _norm(query_vec)
+        with self.lock:
+            return [
+                (_cosine(query_vec, query_norm, doc["vector"], doc["norm"]), doc["anchor"])
+                for doc in self.documents.values()
+                if doc["vector"] is not None and doc.get("anchor")
+            ]
+
+    def add_documents(self, results: List[Dict], query_vec: Optional[List[float]] = None) -> None:
+        """Ajoute les articles d'une recherche (les plus anciens sortent au-delà de RETRIEVAL_CACHE_MAX_DOCS).
+
+        Args:
+            results: Résultats de news_store.search_news (avec `vector` si disponible)
+            query_vec: Embedding de la requête qui les a trouvés (cosinus d'origine)
+        """
+        query_norm = _norm(query_vec) if query_vec else 0.0
+        with self.lock:
+            for r in results:
+                url = r.get("url")
+                if not url:
+                    continue
+                vector = r.get("vector")
+                vector = array("f", vector) if vector else None
+                norm = _norm(vector) if vector else 0.0
+                previous = self.documents.get(url)
+                if previous is None:
+                    self.added_this_turn.add(url)
+                anchor = _cosine(query_vec, query_norm, vector, norm) if query_vec and vector else 0.0
+                if previous and previous.get("anchor", 0.0) > anchor:
+                    # Garder la requête la plus proche trouvée jusqu'ici
+                    anchor = previous["anchor"]
+                self.documents[url] = {
+                    "url": url,
+                    "post_id": r.get("post_id"),
+                    "title": r.get("title", ""),
+                    "date": r.get("date", ""),
+                    "snippet": r.get("snippet") or r.get("content", "")[:SNIPPET_CHARS],
+                    "vector": vector,
+                    "norm": norm,
+                    "anchor": anchor,
+                }
+                self.documents.move_to_end(url)
+                self.dirty = True
+            while len(self.documents) > RETRIEVAL_CACHE_MAX_DOCS:
+                self.documents.popitem(last=False)
+
+    # ------------------------------------------------------------
+    # Recherche web
+    # ------------------------------------------------------------
+
+    def web_lookup(self, query: str) -> Optional[Any]:
+        """Résultat d'une recherche web récente aux mêmes termes, sinon None."""
+        terms = sorted(set(tokenize(query)))
+        now = time.time()
+        with self.lock:
+            for entry in reversed(self.web):
+                if entry["terms"] == terms and now - entry["at"] < RETRIEVAL_CACHE_WEB_TTL_S:
+                    return entry["result"]
+        return None
+
+    def add_web(self, query: str, result: Any) -> None:
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return
+        now = time.time()
+        with self.lock:
+            self.web = [
+                entry for entry in self.web
+                if entry["terms"] != terms and now - entry["at"] < RETRIEVAL_CACHE_WEB_TTL_S
+            ]
+            self.web.append({"terms": terms, "result": result, "at": now})
+            del self.web[:-RETRIEVAL_CACHE_MAX_WEB]
+            self.dirty = True
+
+
+_current_cache: ContextVar[Optional[ConversationCache]] = ContextVar("retrieval_cache", default=None)
+
+
+def current_retrieval_cache() -> Optional[ConversationCache]:
+    """Cache de la conversation en cours (None hors session ou cache désactivé)."""
+    return _current_cache.get()
+
+
+@contextmanager
+def use_retrieval_cache(cache: Optional[ConversationCache]):
+    """Rend le cache visible des outils pendant le tour."""
+    token = _current_cache.set(cache if RETRIEVAL_CACHE_ENABLED else None)
+    try:
+        yield cache
+    finally:
+        _current_cache.reset(token)
+
+
+def record_lookup(source: str, hit: bool) -> None:
+    """Compte un accès au cache de conversation (conso_cache_requests_total)."""
+    cache_result(f"conversation_{source}", hit)
@@ -1,14 +1,45 @@
 """
 Gestionnaire de sessions pour l'historique des conversations.
-Système simple en mémoire avec expiration automatique (TTL).
+
+Deux backends avec expiration automatique (TTL), choisis par SESSION_BACKEND:
+- memory (défaut): dict en mémoire du process, suffisant avec un seul worker
+- redis: sessions partagées entre workers et instances (REDIS_URL), requis
+  dès que plusieurs workers servent /session/chat (voir gunicorn.conf.py)
+
+Les sessions sont créées paresseusement, au premier message (open_session):
+le widget choisit lui-même l'ID (UUID) et l'envoie avec chaque message, sans
+appel préalable. Une visite sans message ne coûte rien au serveur.
 """
 
+import json
+import os
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from typing import Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, message_to_dict, messages_from_dict
+import logging
 import threading
 import time
+from contextlib import contextmanager
+from metrics import STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", "30"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "conso:")
+REDIS_TIMEOUT_S = float(os.getenv("REDIS_TIMEOUT_S", "2"))
+
+
+def normalize_session_id(session_id: Optional[str]) -> Optional[str]:
+    """ID de session proposé par le client: UUID canonique, ou None s'il n'est pas valide."""
+    if not session_id:
+        return None
+    try:
+        return str(uuid.UUID(session_id))
+    except (ValueError, TypeError, AttributeError):
+        return None
 
 
 class SessionManager:
@@ -25,8 +56,18 @@ class SessionManager:
         self.session_timeout = timedelta(minutes=session_timeout_minutes)
         self.lock = threading.Lock()
         
-        # Démarrer le nettoyage automatique des sessions expirées
+        # Démarrer le nettoyage automatique des sessions expirées (et le
+        # relancer dans chaque worker: un fork ne copie pas les threads)
         self._start_cleanup_thread()
+        os.register_at_fork(after_in_child=self._start_cleanup_thread)
+    
+    @contextmanager
+    def _locked(self):
+        """Prend le verrou en mesurant le temps d'attente (contention)."""
+        started = time.perf_counter()
+        with self.lock:
+            STAGE_DURATION.labels("session_lock_wait").observe(time.perf_counter() - started)
+            yield
     
     def create_session(self) -> str:
         """
@@ -37,15 +78,77 @@ class SessionManager:
         """
         session_id = str(uuid.uuid4())
         
-        with self.lock:
-            self.sessions[session_id] = {
-                "messages": [],
-                "created_at": datetime.now(),
-                "last_activity": datetime.now()
-            }
+        with self._locked():
+            self.sessions[session_id] = self._new_session()
         
         return session_id
     
+    def _new_session(self) -> Dict:
+        now = datetime.now()
+        return {
+            "messages": [],
+            "usage": {},
+            "created_at": now,
+            "last_activity": now
+        }
+    
+    def open_session(self, session_id: Optional[str] = None) -> Tuple[str, List[BaseMessage]]:
+        """
+        Reprend une session ou la crée, en une seule opération.
+        
+        Args:
+            session_id: ID proposé par le client; absent ou invalide: nouvel
+                ID; inconnu ou expiré: session vide créée sous cet ID
+            
+        Returns:
+            (session_id, copie de l'historique)
+        """
+        session_id = normalize_session_id(session_id)
+        with self._locked():
+            session = self.sessions.get(session_id) if session_id else None
+            if session is not None and datetime.now() - session["last_activity"] <= self.session_timeout:
+                session["last_activity"] = datetime.now()
+                return session_id, list(session["messages"])
+            
+            session_id = session_id or str(uuid.uuid4())
+            self.sessions[session_id] = self._new_session()
+            return session_id, []
+    
+    def start_turn(self, session_id: Optional[str] = None) -> Tuple[str, List[BaseMessage], Optional[Dict]]:
+        """
+        Début d'un tour de conversation: open_session et cache de recherche ensemble.
+        
+        Returns:
+            (session_id, copie de l'historique, cache de recherche ou None)
+        """
+        session_id, history = self.open_session(session_id)
+        return session_id, history, self.get_retrieval_cache(session_id) if history else None
+    
+    def end_turn(self, session_id: str, messages: List[BaseMessage], usage: Dict,
+                 retrieval: Optional[Dict] = None) -> bool:
+        """
+        Fin d'un tour de conversation, en une opération.
+        
+        Args:
+            session_id: ID de la session
+            messages: Messages du tour (question et réponse)
+            usage: Compteurs de la requête (RequestUsage.to_dict())
+            retrieval: Nouveau cache de recherche (None: inchangé)
+            
+        Returns:
+            True si succès, False si session inexistante (effacée pendant le tour)
+        """
+        with self._locked():
+            session = self.sessions.get(session_id)
+            if session is None:
+                return False
+            session["messages"].extend(messages)
+            self._accumulate_usage(session, usage)
+            if retrieval is not None:
+                session["retrieval"] = retrieval
+            session["last_activity"] = datetime.now()
+            return True
+    
     def get_session(self, session_id: str) -> Optional[Dict]:
         """
         Récupère une session par son ID.
@@ -56,7 +159,7 @@ class SessionManager:
         Returns:
             Session dict ou None si expirée/inexistante
         """
-        with self.lock:
+        with self._locked():
             if session_id not in self.sessions:
                 return None
             
@@ -84,7 +187,9 @@ class SessionManager:
         session = self.get_session(session_id)
         if session is None:
             return None
-        return session["messages"]
+        # Copie: l'historique passé à l'agent ne doit pas voir les messages
+        # ajoutés ensuite (même comportement que le backend Redis)
+        return list(session["messages"])
     
     def add_message(self, session_id: str, message: BaseMessage) -> bool:
         """
@@ -101,7 +206,7 @@ class SessionManager:
         if session is None:
             return False
         
-        with self.lock:
+        with self._locked():
             session["messages"].append(message)
             session["last_activity"] = datetime.now()
         
@@ -122,12 +227,57 @@ class SessionManager:
         if session is None:
             return False
         
-        with self.lock:
+        with self._locked():
             session["messages"].extend(messages)
             session["last_activity"] = datetime.now()
         
         return True
     
+    def add_usage(self, session_id: str, usage: Dict) -> bool:
+        """
+        Cumule l'usage (tokens, coût, embeddings) d'une requête dans la session.
+        
+        Args:
+            session_id: ID de la session
+            usage: Compteurs de la requête (RequestUsage.to_dict())
+            
+        Returns:
+            True si succès, False si session inexistante
+        """
+        with self._locked():
+            session = self.sessions.get(session_id)
+            if session is None:
+                return False
+            self._accumulate_usage(session, usage)
+            return True
+    
+    @staticmethod
+    def _accumulate_usage(session: Dict, usage: Dict) -> None:
+        total = session.setdefault("usage", {})
+        for key, value in usage.items():
+            if isinstance(value, (int, float)):
+                total[key] = total.get(key, 0) + value
+            elif key == "tool_output_chars":
+                per_tool = total.setdefault(key, {})
+                for tool_name, chars in value.items():
+                    per_tool[tool_name] = per_tool.get(tool_name, 0) + chars
+        total["requests"] = total.get("requests", 0) + 1
+    
+    def get_retrieval_cache(self, session_id: str) -> Optional[Dict]:
+        """Cache de recherche de la conversation (retrieval_cache), None si vide."""
+        with self._locked():
+            session = self.sessions.get(session_id)
+            return session.get("retrieval") if session else None
+    
+    def save_retrieval_cache(self, session_id: str, data: Dict) -> bool:
+        """Remplace le cache de recherche de la conversation."""
+        with self._locked():
+            session = self.sessions.get(session_id)
+            if session is None:
+                return False
+            session["retrieval"] = data
+            return True
+    
     def clear_session(self, session_id: str) -> bool:
         """
         Efface une session.
@@ -138,7 +288,7 @@ class SessionManager:
         Returns:
             True si succès, False si session inexistante
         """
-        with self.lock:
+        with self._locked():
             if session_id in self.sessions:
                 del self.sessions[session_id]
                 return True
@@ -163,6 +313,7 @@ class SessionManager:
             "message_count": len(session["messages"]),
             "created_at": session["created_at"].isoformat(),
             "last_activity": session["last_activity"].isoformat(),
+            "usage": dict(session.get("usage", {})),
             "expires_in_minutes": int(
                 (self.session_timeout - (datetime.now() - session["last_activity"])).total_seconds() / 60
             )
@@ -170,7 +321,7 @@ class SessionManager:
     
     def get_all_sessions_count(self) -> int:
         """Retourne le nombre de sessions actives."""
-        with self.lock:
+        with self._locked():
             return len(self.sessions)
     
     def _cleanup_expired_sessions(self):
@@ -178,7 +329,7 @@ class SessionManager:
         while True:
             time.sleep(300)  # Vérifier toutes les 5 minutes
             
-            with self.lock:
+            with self._locked():
                 now = datetime.now()
                 expired_sessions = [
                     session_id for session_id, session in self.sessions.items()
@@ -189,7 +340,7 @@ class SessionManager:
                     del self.sessions[session_id]
                 
                 if expired_sessions:
-                    print(f"🧹 Nettoyage: {len(expired_sessions)} sessions expirées supprimées")
+                    logger.info(f"🧹 Nettoyage: {len(expired_sessions)} sessions expirées supprimées")
     
     def _start_cleanup_thread(self):
         """Démarre le thread de nettoyage automatique."""
@@ -200,5 +351,227 @@ class SessionManager:
         cleanup_thread.start()
 
 
+class RedisSessionManager:
+    """Gestionnaire de sessions partagé dans Redis (même interface que SessionManager).
+
+    Par session: un hash (dates), une liste de messages JSON, un hash des
+    compteurs d'usage (HINCRBY: cumul atomique entre workers) et le cache de
+    recherche (JSON), qui expirent ensemble après session_timeout d'inactivité.
+    Un sorted set id -> dernière activité sert au comptage des sessions actives.
+
+    Client bloquant: les handlers async l'appellent via run_in_threadpool, pour
+    qu'un Redis lent (jusqu'à REDIS_TIMEOUT_S) ne gèle pas la boucle d'événements.
+    Un tour de conversation fait deux allers-retours: start_turn et end_turn.
+    """
+    
+    def __init__(self, url: str = REDIS_URL, session_timeout_minutes: int = 30,
+                 key_prefix: str = REDIS_KEY_PREFIX):
+        import redis
+        
+        # Le pool de connexions de redis-py se recrée de lui-même après un fork
+        self.redis = redis.Redis.from_url(
+            url,
+            decode_responses=True,
+            socket_timeout=REDIS_TIMEOUT_S,
+            socket_connect_timeout=REDIS_TIMEOUT_S,
+            health_check_interval=30,
+        )
+        self.session_timeout = timedelta(minutes=session_timeout_minutes)
+        self.ttl = int(self.session_timeout.total_seconds())
+        self.prefix = f"{key_prefix}session:"
+        self.index_key = f"{key_prefix}sessions"
+    
+    def _keys(self, session_id: str):
+        base = f"{self.prefix}{session_id}"
+        return base, f"{base}:messages", f"{base}:usage"
+    
+    def _retrieval_key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}:retrieval"
+    
+    def _execute(self, pipe) -> list:
+        """Exécute un pipeline (transaction) en mesurant l'aller-retour Redis."""
+        started = time.perf_counter()
+        try:
+            return pipe.execute()
+        finally:
+            STAGE_DURATION.labels("session_redis").observe(time.perf_counter() - started)
+    
+    def _touch(self, pipe, session_id: str) -> None:
+        """Met à jour l'activité et repousse l'expiration de toutes les clés."""
+        now = datetime.now()
+        meta_key, messages_key, usage_key = self._keys(session_id)
+        pipe.hset(meta_key, "last_activity", now.isoformat())
+        for key in (meta_key, messages_key, usage_key, self._retrieval_key(session_id)):
+            pipe.expire(key, self.ttl)
+        pipe.zadd(self.index_key, {session_id: now.timestamp()})
+    
+    def create_session(self) -> str:
+        """Crée une nouvelle session et retourne son ID."""
+        session_id = str(uuid.uuid4())
+        pipe = self.redis.pipeline()
+        pipe.hset(self._keys(session_id)[0], "created_at", datetime.now().isoformat())
+        self._touch(pipe, session_id)
+        self._execute(pipe)
+        return session_id
+    
+    def open_session(self, session_id: Optional[str] = None) -> Tuple[str, List[BaseMessage]]:
+        """Reprend une session ou la crée (même contrat que SessionManager), en un aller-retour."""
+        session_id, history, _ = self._open(session_id, with_retrieval=False)
+        return session_id, history
+    
+    def start_turn(self, session_id: Optional[str] = None) -> Tuple[str, List[BaseMessage], Optional[Dict]]:
+        """open_session et cache de recherche, en un aller-retour."""
+        session_id, history, raw = self._open(session_id, with_retrieval=True)
+        return session_id, history, json.loads(raw) if raw and history else None
+    
+    def _open(self, session_id: Optional[str], with_retrieval: bool):
+        session_id = normalize_session_id(session_id) or str(uuid.uuid4())
+        meta_key, messages_key, _ = self._keys(session_id)
+        pipe = self.redis.pipeline()
+        # created_at n'est écrit que si la session n'existe pas (ou a expiré)
+        pipe.hsetnx(meta_key, "created_at", datetime.now().isoformat())
+        pipe.lrange(messages_key, 0, -1)
+        if with_retrieval:
+            pipe.get(self._retrieval_key(session_id))
+        self._touch(pipe, session_id)
+        results = self._execute(pipe)
+        history = messages_from_dict([json.loads(item) for item in results[1]])
+        return session_id, history, results[2] if with_retrieval else None
+    
+    def _exists(self, session_id: str) -> bool:
+        return bool(session_id) and bool(self.redis.exists(self._keys(session_id)[0]))
+    
+    def get_messages(self, session_id: str) -> Optional[List[BaseMessage]]:
+        """Historique des messages, ou None si la session a expiré / n'existe pas."""
+        if not self._exists(session_id):
+            return None
+        pipe = self.redis.pipeline()
+        pipe.lrange(self._keys(session_id)[1], 0, -1)
+        self._touch(pipe, session_id)
+        raw = self._execute(pipe)[0]
+        return messages_from_dict([json.loads(item) for item in raw])
+    
+    def add_message(self, session_id: str, message: BaseMessage) -> bool:
+        """Ajoute un message à l'historique de la session."""
+        return self.add_messages(session_id, [message])
+    
+    def add_messages(self, session_id: str, messages: List[BaseMessage]) -> bool:
+        """Ajoute plusieurs messages à l'historique de la session."""
+        return self._write(session_id, messages=messages)
+    
+    def add_usage(self, session_id: str, usage: Dict) -> bool:
+        """Cumule l'usage (tokens, coût, embeddings) d'une requête dans la session."""
+        return self._write(session_id, usage=usage)
+    
+    def end_turn(self, session_id: str, messages: List[BaseMessage], usage: Dict,
+                 retrieval: Optional[Dict] = None) -> bool:
+        """Fin d'un tour (même contrat que SessionManager), en un aller-retour."""
+        return self._write(session_id, messages=messages, usage=usage, retrieval=retrieval)
+    
+    def _write(self, session_id: str, messages: Optional[List[BaseMessage]] = None,
+               usage: Optional[Dict] = None, retrieval: Optional[Dict] = None) -> bool:
+        """Écritures d'une session dans une seule transaction.
+
+        L'existence de la session est lue dans la même transaction: si elle a
+        été effacée entre-temps, les clés que la transaction vient de recréer
+        sont supprimées (second aller-retour, dans ce seul cas).
+        """
+        if not session_id:
+            return False
+        meta_key, messages_key, usage_key = self._keys(session_id)
+        pipe = self.redis.pipeline()
+        pipe.exists(meta_key)
+        if messages:
+            pipe.rpush(
+                messages_key,
+                *[json.dumps(message_to_dict(m), ensure_ascii=False) for m in messages],
+            )
+        if usage is not None:
+            for key, value in usage.items():
+                if isinstance(value, int):
+                    pipe.hincrby(usage_key, key, value)
+                elif isinstance(value, float):
+                    pipe.hincrbyfloat(usage_key, key, value)
+                elif key == "tool_output_chars":
+                    for tool_name, chars in value.items():
+                        pipe.hincrby(usage_key, f"{key}.{tool_name}", chars)
+            pipe.hincrby(usage_key, "requests", 1)
+        if retrieval is not None:
+            pipe.set(self._retrieval_key(session_id), json.dumps(retrieval, ensure_ascii=False))
+        self._touch(pipe, session_id)
+        if not self._execute(pipe)[0]:
+            self.clear_session(session_id)
+            return False
+        return True
+    
+    def get_retrieval_cache(self, session_id: str) -> Optional[Dict]:
+        """Cache de recherche de la conversation (retrieval_cache), None si vide."""
+        started = time.perf_counter()
+        try:
+            raw = self.redis.get(self._retrieval_key(session_id))
+        finally:
+            STAGE_DURATION.labels("session_redis").observe(time.perf_counter() - started)
+        return json.loads(raw) if raw else None
+    
+    def save_retrieval_cache(self, session_id: str, data: Dict) -> bool:
+        """Remplace le cache de recherche de la conversation."""
+        return self._write(session_id, retrieval=data)
+    
+    def clear_session(self, session_id: str) -> bool:
+        """Efface une session; False si elle n'existait pas."""
+        pipe = self.redis.pipeline()
+        pipe.delete(*self._keys(session_id), self._retrieval_key(session_id))
+        pipe.zrem(self.index_key, session_id)
+        return self._execute(pipe)[0] > 0
+    
+    def get_session_info(self, session_id: str) -> Optional[Dict]:
+        """Informations de la session, ou None si expirée / inexistante."""
+        meta_key, messages_key, usage_key = self._keys(session_id)
+        pipe = self.redis.pipeline()
+        pipe.hgetall(meta_key)
+        pipe.llen(messages_key)
+        pipe.hgetall(usage_key)
+        meta, message_count, raw_usage = self._execute(pipe)
+        if not meta:
+            return None
+        
+        usage: Dict = {}
+        for key, value in raw_usage.items():
+            number = float(value) if any(c in value for c in ".eE") else int(value)
+            if key.startswith("tool_output_chars."):
+                usage.setdefault("tool_output_chars", {})[key.split(".", 1)[1]] = number
+            else:
+                usage[key] = number
+        last_activity = datetime.fromisoformat(meta["last_activity"])
+        return {
+            "session_id": session_id,
+            "message_count": message_count,
+            "created_at": meta.get("created_at"),
+            "last_activity": last_activity.isoformat(),
+            "usage": usage,
+            "expires_in_minutes": int(
+                (self.session_timeout - (datetime.now() - last_activity)).total_seconds() / 60
+            )
+        }
+    
+    def get_all_sessions_count(self) -> int:
+        """Nombre de sessions actives (toutes instances confondues)."""
+        cutoff = (datetime.now() - self.session_timeout).timestamp()
+        pipe = self.redis.pipeline()
+        pipe.zremrangebyscore(self.index_key, "-inf", cutoff)
+        pipe.zcard(self.index_key)
+        return self._execute(pipe)[1]
+
+
+def create_session_manager(backend: str = SESSION_BACKEND):
+    """Gestionnaire de sessions du backend configuré (memory ou redis)."""
+    if backend == "redis":
+        logger.info(f"🗄️ Sessions stored in Redis ({REDIS_URL.split('@')[-1]})")
+        return RedisSessionManager(REDIS_URL, session_timeout_minutes=SESSION_TIMEOUT_MINUTES)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected memory or redis)")
+    return SessionManager(session_timeout_minutes=SESSION_TIMEOUT_MINUTES)
+
+
 # Instance globale du gestionnaire de sessions
-session_manager = SessionManager(session_timeout_minutes=30)
+session_manager = create_session_manager()
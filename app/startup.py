@@ -0,0 +1,135 @@
+"""
+Mesure du démarrage à froid: durée des imports et délai jusqu'à l'ouverture du port.
+
+Importé en premier par main.py (uniquement la bibliothèque standard). Avec
+STARTUP_PROFILE_IMPORTS=1, chaque import de module est chronométré (temps
+propre et cumulé, comme python -X importtime) et les plus lents sont loggés
+au démarrage; sinon seules les grandes étapes sont mesurées.
+"""
+
+import importlib.abc
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE_IMPORTS = os.getenv("STARTUP_PROFILE_IMPORTS", "0").lower() in ("1", "true", "yes")
+STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "25"))
+
+_MODULE_LOADED_AT = time.perf_counter()
+
+
+def process_age() -> Optional[float]:
+    """Secondes depuis le lancement du process (Linux), None ailleurs."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Le nom du programme (2e champ) peut contenir des espaces: on coupe après ")"
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _TimedLoader:
+    """Loader qui chronomètre exec_module puis se retire du module."""
+
+    def __init__(self, loader, timer: "ImportTimer"):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Le module garde son vrai loader (importlib.resources, inspect...)
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timer.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.exit(module.__name__)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Finder placé en tête de sys.meta_path qui enveloppe les loaders trouvés."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}  # module -> [propre, cumulé] (s)
+        self._local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def enter(self) -> None:
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append([time.perf_counter(), 0.0])
+
+    def exit(self, name: str) -> None:
+        stack = self._local.stack
+        started, children = stack.pop()
+        total = time.perf_counter() - started
+        self.timings[name] = [total - children, total]
+        if stack:
+            stack[-1][1] += total
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def slowest(self, top: int) -> List[Dict]:
+        ranked = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {"module": name, "self_ms": round(own * 1000, 1), "cumulative_ms": round(total * 1000, 1)}
+            for name, (own, total) in ranked[:top]
+        ]
+
+
+class StartupTimer:
+    """Étapes du démarrage (secondes depuis le lancement du process)."""
+
+    def __init__(self):
+        age = process_age()
+        # Temps écoulé avant l'import de ce module (interpréteur, site-packages)
+        self._origin = _MODULE_LOADED_AT - (age if age is not None else 0.0)
+        self.marks: Dict[str, float] = {}
+        self.imports = ImportTimer() if STARTUP_PROFILE_IMPORTS else None
+        if self.imports is not None:
+            self.imports.install()
+
+    def mark(self, phase: str) -> float:
+        """Enregistre la fin d'une étape; renvoie les secondes depuis le lancement."""
+        self.marks[phase] = round(time.perf_counter() - self._origin, 3)
+        return self.marks[phase]
+
+    def report(self) -> Dict:
+        report: Dict = {"marks_s": dict(self.marks)}
+        if self.imports is not None:
+            self.imports.uninstall()
+            report["slowest_imports"] = self.imports.slowest(STARTUP_PROFILE_TOP)
+        return report
+
+
+startup_timer = StartupTimer()
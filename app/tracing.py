@@ -0,0 +1,244 @@
+"""
+Traces OpenTelemetry par requête (FastAPI -> noeuds LangGraph -> outils -> Qdrant/embeddings).
+
+Désactivé par défaut (TRACING_EXPORTER=none): l'API OpenTelemetry renvoie alors
+des spans no-op qui ne coûtent presque rien. Exporteurs disponibles:
+- file: une ligne JSON par span dans TRACING_FILE
+- otlp: collecteur OTLP/HTTP (OTEL_EXPORTER_OTLP_ENDPOINT, défaut http://localhost:4318)
+- console: spans affichés sur stdout (debug)
+"""
+
+import json
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "conso-news-chatbot")
+
+tracer = trace.get_tracer("conso_news")
+logger = logging.getLogger(__name__)
+
+
+def setup_tracing() -> bool:
+    """Installe le TracerProvider et l'exporteur choisi. Retourne True si actif."""
+    if TRACING_EXPORTER in ("", "none"):
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif TRACING_EXPORTER == "file":
+        exporter = ConsoleSpanExporter(
+            out=open(TRACING_FILE, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    elif TRACING_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        logger.warning(f"⚠️ Unknown TRACING_EXPORTER={TRACING_EXPORTER!r}, tracing disabled")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+    # Export en arrière-plan: la requête ne paie jamais l'écriture ou le réseau
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    target = TRACING_FILE if TRACING_EXPORTER == "file" else TRACING_EXPORTER
+    logger.info(f"🔭 Tracing enabled ({target})")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Vide les spans en attente avant l'arrêt du process."""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Span enfant du span courant; les exceptions sont enregistrées sur le span."""
+    with tracer.start_as_current_span(name, attributes=_clean(attributes)) as current:
+        yield current
+
+
+@contextmanager
+def server_span(name: str, **attributes: Any):
+    """Span de la requête HTTP.
+
+    Réutilise le span serveur s'il existe déjà (instrumentation intégrée des
+    versions récentes de FastAPI, opentelemetry-instrumentation-fastapi),
+    sinon en crée un pour que chaque requête reste une seule trace.
+    """
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.set_attributes(_clean(attributes))
+        yield current
+        return
+    with tracer.start_as_current_span(name, kind=trace.SpanKind.SERVER, attributes=_clean(attributes)) as started:
+        yield started
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Ajoute des attributs au span courant (ex: session.id dans un endpoint)."""
+    trace.get_current_span().set_attributes(_clean(attributes))
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id hexadécimal du span courant (None si tracing inactif)."""
+    ctx = trace.get_current_span().get_span_context()
+    return format(ctx.trace_id, "032x") if ctx.is_valid else None
+
+
+def _clean(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenTelemetry n'accepte que des types primitifs et refuse None."""
+    cleaned = {}
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if not isinstance(value, (str, bool, int, float)):
+            value = json.dumps(value, ensure_ascii=False, default=str)
+        cleaned[key] = value
+    return cleaned
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain qui crée un span par noeud LangGraph, appel LLM et outil.
+
+    Les spans sont rattachés explicitement via parent_run_id. Le span d'un
+    outil est aussi rendu courant (run_inline: start et end s'exécutent dans le
+    même contexte que l'outil) pour que les spans créés dans l'outil
+    (embed_query, qdrant_query, ...) soient ses enfants. Ce n'est pas possible
+    pour les noeuds, dont start/end ne partagent pas le même contexte.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._spans: Dict[UUID, Any] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._tokens: Dict[UUID, object] = {}
+
+    def _parent_context(self, parent_run_id: Optional[UUID]):
+        # Remonte les runs non tracés (RunnableSequence, LangGraph, ...) jusqu'au premier span
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return trace.set_span_in_context(self._spans[parent_run_id])
+            parent_run_id = self._parents.get(parent_run_id)
+        return None
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, attributes: Dict[str, Any]):
+        started = tracer.start_span(
+            name, context=self._parent_context(parent_run_id), attributes=_clean(attributes)
+        )
+        self._spans[run_id] = started
+        return started
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any) -> None:
+        self._parents.pop(run_id, None)
+        token = self._tokens.pop(run_id, None)
+        if token is not None:
+            try:
+                otel_context.detach(token)
+            except ValueError:
+                pass
+        ended = self._spans.pop(run_id, None)
+        if ended is None:
+            return
+        ended.set_attributes(_clean(attributes))
+        if error is not None:
+            ended.record_exception(error)
+            ended.set_status(Status(StatusCode.ERROR, str(error)))
+        ended.end()
+
+    # --- Noeuds du graph ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       metadata: Optional[dict] = None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, parent_run_id, f"node.{node}", {
+                "langgraph.node": node,
+                "langgraph.step": (metadata or {}).get("langgraph_step"),
+            })
+        else:
+            self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+    # --- Appels LLM ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            invocation_params: Optional[dict] = None, **kwargs):
+        params = invocation_params or kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model")
+        self._start(run_id, parent_run_id, f"chat {model or 'model'}", {
+            "gen_ai.request.model": model,
+            "gen_ai.request.messages": sum(len(batch) for batch in messages),
+            "gen_ai.request.tools": len(params.get("tools") or []),
+        })
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tool_calls = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                tool_calls += len(getattr(message, "tool_calls", None) or [])
+                if not usage and getattr(message, "usage_metadata", None):
+                    meta = message.usage_metadata
+                    usage = {"prompt_tokens": meta.get("input_tokens"), "completion_tokens": meta.get("output_tokens")}
+        self._end(
+            run_id,
+            **{
+                "gen_ai.usage.input_tokens": usage.get("prompt_tokens"),
+                "gen_ai.usage.output_tokens": usage.get("completion_tokens"),
+                "gen_ai.response.tool_calls": tool_calls,
+            },
+        )
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+    # --- Outils ---
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        started = self._start(run_id, parent_run_id, f"tool.{name}", {
+            "tool.name": name,
+            "tool.input": (input_str or "")[:500],
+        })
+        self._tokens[run_id] = otel_context.attach(trace.set_span_in_context(started))
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        content = getattr(output, "content", output)
+        self._end(
+            run_id,
+            **{
+                "tool.output.chars": len(str(content)),
+                "tool.output.items": len(content) if isinstance(content, list) else None,
+            },
+        )
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+
+# Un seul handler partagé: les entrées sont indexées par run_id
+tracing_callback = TracingCallbackHandler()
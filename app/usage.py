@@ -0,0 +1,248 @@
+"""
+Comptabilité des tokens et du coût par requête, session, endpoint et modèle.
+
+Chaque requête de chat ouvre un RequestUsage (track_usage) porté par un
+contextvar; le callback LangChain y ajoute les tokens de chaque réponse
+ChatOpenAI et la taille des sorties d'outils, news_store y ajoute les appels
+d'embedding. En fin de requête, l'usage est rattaché à la session et agrégé
+par heure / endpoint / modèle pour /usage/stats et Prometheus.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import EMBEDDING_CALLS, LLM_COST, LLM_TOKENS, TOOL_OUTPUT_CHARS
+
+# Prix en USD par million de tokens: {"model": [entrée, sortie, entrée en cache (optionnel)]}
+LLM_PRICES: Dict[str, list] = json.loads(os.getenv("LLM_PRICES", "{}") or "{}")
+USAGE_STATS_RETENTION_HOURS = int(os.getenv("USAGE_STATS_RETENTION_HOURS", "48"))
+
+# Les sorties d'outils ne sont pas tokenisées localement: ~4 caractères par token
+CHARS_PER_TOKEN = 4
+
+
+def llm_cost(model: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+    """Coût estimé d'un appel (0 si le modèle n'a pas de prix configuré).
+
+    cached_input_tokens fait partie de input_tokens (préfixe servi depuis le
+    cache du fournisseur), facturé au 3e prix s'il est configuré.
+    """
+    prices = LLM_PRICES.get(model)
+    if not prices:
+        return 0.0
+    cached_price = prices[2] if len(prices) > 2 else prices[0]
+    return (
+        (input_tokens - cached_input_tokens) * prices[0]
+        + cached_input_tokens * cached_price
+        + output_tokens * prices[1]
+    ) / 1_000_000
+
+
+class RequestUsage:
+    """Usage accumulé pendant une requête (thread-safe: outils en parallèle)."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.lock = threading.Lock()
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.embedding_calls = 0
+        self.embedding_chars = 0
+        self.models: Dict[str, Dict[str, int]] = {}
+        self.tool_output_chars: Dict[str, int] = {}
+
+    def add_llm(self, model: str, input_tokens: int, output_tokens: int, cost: float,
+                cached_input_tokens: int = 0) -> None:
+        with self.lock:
+            self.llm_calls += 1
+            self.input_tokens += input_tokens
+            self.cached_input_tokens += cached_input_tokens
+            self.output_tokens += output_tokens
+            self.cost_usd += cost
+            per_model = self.models.setdefault(
+                model, {"calls": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
+            )
+            per_model["calls"] += 1
+            per_model["input_tokens"] += input_tokens
+            per_model["cached_input_tokens"] += cached_input_tokens
+            per_model["output_tokens"] += output_tokens
+
+    def add_embedding(self, chars: int) -> None:
+        with self.lock:
+            self.embedding_calls += 1
+            self.embedding_chars += chars
+
+    def add_tool_output(self, tool: str, chars: int) -> None:
+        with self.lock:
+            self.tool_output_chars[tool] = self.tool_output_chars.get(tool, 0) + chars
+
+    def to_dict(self) -> Dict:
+        with self.lock:
+            return {
+                "llm_calls": self.llm_calls,
+                "input_tokens": self.input_tokens,
+                "cached_input_tokens": self.cached_input_tokens,
+                "output_tokens": self.output_tokens,
+                "cost_usd": round(self.cost_usd, 6),
+                "embedding_calls": self.embedding_calls,
+                "embedding_chars": self.embedding_chars,
+                "models": {name: dict(counts) for name, counts in self.models.items()},
+                "tool_output_chars": dict(self.tool_output_chars),
+                "tool_output_tokens_estimate": {
+                    name: chars // CHARS_PER_TOKEN for name, chars in self.tool_output_chars.items()
+                },
+            }
+
+
+_current_usage: ContextVar[Optional[RequestUsage]] = ContextVar("request_usage", default=None)
+
+
+def current_usage() -> Optional[RequestUsage]:
+    """Usage de la requête en cours (None hors requête: indexation, CLI)."""
+    return _current_usage.get()
+
+
+class UsageStats:
+    """Agrégats horaires par (heure, endpoint, modèle), conservés USAGE_STATS_RETENTION_HOURS."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: Dict[tuple, Dict[str, float]] = {}
+
+    def record(self, usage: RequestUsage) -> None:
+        hour = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+        data = usage.to_dict()
+        models = data["models"] or {
+            "none": {"calls": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
+        }
+        with self.lock:
+            for index, (model, counts) in enumerate(models.items()):
+                bucket = self.buckets.setdefault((hour, usage.endpoint, model), {
+                    "requests": 0, "llm_calls": 0, "input_tokens": 0, "cached_input_tokens": 0,
+                    "output_tokens": 0, "cost_usd": 0.0, "embedding_calls": 0,
+                })
+                # Requête et embeddings comptés une seule fois (sur le premier modèle)
+                if index == 0:
+                    bucket["requests"] += 1
+                    bucket["embedding_calls"] += data["embedding_calls"]
+                bucket["llm_calls"] += counts["calls"]
+                bucket["input_tokens"] += counts["input_tokens"]
+                bucket["cached_input_tokens"] += counts["cached_input_tokens"]
+                bucket["output_tokens"] += counts["output_tokens"]
+                bucket["cost_usd"] += llm_cost(
+                    model, counts["input_tokens"], counts["output_tokens"], counts["cached_input_tokens"]
+                )
+            self._prune()
+
+    def _prune(self) -> None:
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=USAGE_STATS_RETENTION_HOURS)).strftime("%Y-%m-%dT%H:00Z")
+        for key in [key for key in self.buckets if key[0] < cutoff]:
+            del self.buckets[key]
+
+    def summary(self) -> Dict:
+        """Totaux par heure, par endpoint et par modèle."""
+        with self.lock:
+            items = [(key, dict(values)) for key, values in self.buckets.items()]
+        by: Dict[str, Dict[str, Dict[str, float]]] = {"by_hour": {}, "by_endpoint": {}, "by_model": {}}
+        totals: Dict[str, float] = {}
+        for (hour, endpoint, model), values in sorted(items):
+            for group, key in (("by_hour", hour), ("by_endpoint", endpoint), ("by_model", model)):
+                target = by[group].setdefault(key, {})
+                for name, value in values.items():
+                    target[name] = target.get(name, 0) + value
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0) + value
+        for group in [*by.values(), {"total": totals}]:
+            for values in group.values():
+                if "cost_usd" in values:
+                    values["cost_usd"] = round(values["cost_usd"], 6)
+        return {"retention_hours": USAGE_STATS_RETENTION_HOURS, "total": totals, **by}
+
+
+usage_stats = UsageStats()
+
+
+@contextmanager
+def track_usage(endpoint: str):
+    """Ouvre le compteur d'usage d'une requête et l'agrège à la sortie."""
+    usage = RequestUsage(endpoint)
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        usage_stats.record(usage)
+
+
+def record_embedding(model: str, chars: int) -> None:
+    """Appel d'embedding (requête en cours + métriques)."""
+    EMBEDDING_CALLS.labels(model).inc()
+    usage = current_usage()
+    if usage is not None:
+        usage.add_embedding(chars)
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain: tokens des réponses LLM et taille des sorties d'outils.
+
+    Les handlers synchrones s'exécutent dans une copie du contexte de la
+    requête, current_usage() y renvoie donc bien le RequestUsage en cours.
+    """
+
+    def __init__(self):
+        self._tools: Dict[UUID, str] = {}
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        usage_data = (response.llm_output or {}).get("token_usage") or {}
+        model = (response.llm_output or {}).get("model_name") or "unknown"
+        input_tokens = usage_data.get("prompt_tokens") or 0
+        output_tokens = usage_data.get("completion_tokens") or 0
+        # Préfixe du prompt servi depuis le cache du fournisseur (OpenAI)
+        cached_input_tokens = (usage_data.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        if not usage_data:
+            # Modèles qui ne renseignent que usage_metadata sur le message
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    meta = getattr(message, "usage_metadata", None) or {}
+                    input_tokens += meta.get("input_tokens", 0)
+                    output_tokens += meta.get("output_tokens", 0)
+                    cached_input_tokens += (meta.get("input_token_details") or {}).get("cache_read", 0)
+                    model = (getattr(message, "response_metadata", None) or {}).get("model_name", model)
+        cost = llm_cost(model, input_tokens, output_tokens, cached_input_tokens)
+        LLM_TOKENS.labels(model, "input").inc(input_tokens)
+        LLM_TOKENS.labels(model, "cached_input").inc(cached_input_tokens)
+        LLM_TOKENS.labels(model, "output").inc(output_tokens)
+        LLM_COST.labels(model).inc(cost)
+        usage = current_usage()
+        if usage is not None:
+            usage.add_llm(model, input_tokens, output_tokens, cost, cached_input_tokens)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        self._tools[run_id] = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        tool = self._tools.pop(run_id, "unknown")
+        chars = len(str(getattr(output, "content", output)))
+        TOOL_OUTPUT_CHARS.labels(tool).observe(chars)
+        usage = current_usage()
+        if usage is not None:
+            usage.add_tool_output(tool, chars)
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        self._tools.pop(run_id, None)
+
+
+# Un seul handler partagé: les entrées sont indexées par run_id
+usage_callback = UsageCallbackHandler()
@@ -0,0 +1,204 @@
+"""
+Warm-up au démarrage et état de disponibilité (/ready).
+
+Après l'ouverture du port, les dépendances sont préparées en parallèle:
+construction de l'agent, requête Qdrant, embedding factice (ou chargement de
+l'index BM25 local si DISABLE_EMBEDDING), ping LLM d'un token et, en option,
+une recherche Tavily. Chaque appel ouvre et garde la connexion du client
+concerné (TLS compris): le premier utilisateur ne paie plus ces coûts.
+
+/health reste un test de vie (toujours 200); /ready renvoie 503 tant que les
+checks requis (READY_REQUIRED) n'ont pas réussi, avec la latence de chacun,
+pour que le load balancer n'envoie du trafic qu'aux instances chaudes. Les
+checks requis en échec sont relancés toutes les WARMUP_RETRY_S secondes.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import news_store
+from metrics import READY, WARMUP_CHECK_DURATION
+from startup import startup_timer
+
+logger = logging.getLogger(__name__)
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+# Tavily facture chaque recherche: non inclus par défaut
+WARMUP_CHECKS = _env_list("WARMUP_CHECKS", "agent,qdrant,embedding,llm")
+READY_REQUIRED = set(_env_list("READY_REQUIRED", "agent,qdrant,embedding,llm"))
+WARMUP_TIMEOUT_S = float(os.getenv("WARMUP_TIMEOUT_S", "30"))
+WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", "15"))
+
+WARMUP_QUERY = "actualité consommation Maroc"
+
+
+# ============================================================
+# Checks (chacun renvoie des détails pour /ready, ou lève une exception)
+# ============================================================
+
+def _check_agent(get_agent: Callable) -> Dict:
+    agent = get_agent()
+    return {"model": agent.llm.model_name}
+
+
+def _check_qdrant(get_agent: Callable) -> Dict:
+    client = news_store.get_qdrant_client()
+    points = client.count(collection_name=news_store.QDRANT_COLLECTION, exact=False).count
+    # Met aussi en cache la détection du vecteur sparse (recherche hybride)
+    return {"points": points, "hybrid": news_store.collection_has_sparse(client)}
+
+
+def _check_embedding(get_agent: Callable) -> Dict:
+    if news_store.DISABLE_EMBEDDING:
+        index = news_store.ensure_lexical_index()
+        if index is None:
+            raise RuntimeError("lexical index unavailable")
+        return {"lexical_docs": len(index)}
+    return {"dimension": len(news_store.embed_text(WARMUP_QUERY))}
+
+
+def _check_llm(get_agent: Callable) -> Dict:
+    from langchain_core.messages import HumanMessage
+
+    # Même client (et pool de connexions) que _call_model
+    llm = get_agent().llm
+    llm.bind(max_tokens=1).invoke([HumanMessage(content="ping")])
+    return {"model": llm.model_name}
+
+
+def _check_tavily(get_agent: Callable) -> Dict:
+    results = get_agent().search_tool.invoke({"query": WARMUP_QUERY})
+    return {"results": len(results) if isinstance(results, list) else 0}
+
+
+CHECKS: Dict[str, Callable[[Callable], Dict]] = {
+    "agent": _check_agent,
+    "qdrant": _check_qdrant,
+    "embedding": _check_embedding,
+    "llm": _check_llm,
+    "tavily": _check_tavily,
+}
+
+
+# ============================================================
+# État de disponibilité
+# ============================================================
+
+class Readiness:
+    """Résultat du dernier passage de chaque check (thread-safe)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checks: Dict[str, Dict] = {}
+        self.status = "pending" if WARMUP_ON_STARTUP else "disabled"
+        self.ready_after_s = None
+
+    def record(self, name: str, ok: bool, latency: float, detail: Dict = None, error: str = None) -> None:
+        result = {
+            "ok": ok,
+            "latency_ms": round(latency * 1000, 1),
+            "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "required": name in READY_REQUIRED,
+        }
+        if detail:
+            result.update(detail)
+        if error:
+            result["error"] = error
+        with self.lock:
+            self.checks[name] = result
+        WARMUP_CHECK_DURATION.labels(name).set(latency)
+
+    def is_ok(self, name: str) -> bool:
+        with self.lock:
+            return self.checks.get(name, {}).get("ok", False)
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("ready", "disabled")
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                "status": self.status,
+                "ready": self.ready,
+                "ready_after_s": self.ready_after_s,
+                "checks": {name: dict(result) for name, result in self.checks.items()},
+            }
+
+
+readiness = Readiness()
+READY.set(1 if readiness.ready else 0)
+
+
+def _run_check(name: str, get_agent: Callable) -> None:
+    started = time.perf_counter()
+    try:
+        detail = CHECKS[name](get_agent)
+    except Exception as e:
+        readiness.record(name, False, time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+        logger.warning(f"⚠️ Warm-up check {name} failed: {e}")
+        return
+    readiness.record(name, True, time.perf_counter() - started, detail)
+
+
+def run_warmup(get_agent: Callable) -> None:
+    """Lance les checks en parallèle et relance les checks requis en échec.
+
+    Tourne dans un thread dédié: un appel bloqué (timeout client long) ne
+    retarde ni les autres checks ni le passage à l'état prêt.
+    """
+    unknown = [name for name in WARMUP_CHECKS if name not in CHECKS]
+    if unknown:
+        logger.warning(f"⚠️ Unknown warm-up checks ignored: {unknown}")
+    names = [name for name in WARMUP_CHECKS if name in CHECKS]
+    required = [name for name in names if name in READY_REQUIRED]
+
+    readiness.status = "warming"
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="warmup")
+    running: Dict[str, Future] = {}
+    pending = names
+    try:
+        while True:
+            for name in pending:
+                # Un check encore en cours (timeout) n'est pas relancé en parallèle
+                if name not in running or running[name].done():
+                    running[name] = pool.submit(_run_check, name, get_agent)
+            wait([running[name] for name in pending], timeout=WARMUP_TIMEOUT_S)
+            for name in pending:
+                if not running[name].done():
+                    readiness.record(name, False, WARMUP_TIMEOUT_S, error="timeout")
+
+            pending = [name for name in required if not readiness.is_ok(name)]
+            if not pending:
+                break
+            readiness.status = "not_ready"
+            logger.warning(f"⚠️ Not ready, retrying {pending} in {WARMUP_RETRY_S:.0f}s")
+            time.sleep(WARMUP_RETRY_S)
+    finally:
+        pool.shutdown(wait=False)
+
+    readiness.ready_after_s = startup_timer.mark("ready")
+    readiness.status = "ready"
+    READY.set(1)
+    logger.info(
+        f"✅ Ready {readiness.ready_after_s:.2f}s after process start "
+        f"(warm-up {time.perf_counter() - started:.2f}s)",
+        extra={"checks": readiness.snapshot()["checks"]},
+    )
+
+
+def start_warmup(get_agent: Callable) -> None:
+    """Démarre le warm-up en arrière-plan (no-op si WARMUP_ON_STARTUP=0)."""
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=run_warmup, args=(get_agent,), name="warmup", daemon=True).start()
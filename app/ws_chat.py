@@ -0,0 +1,223 @@
+"""
+Canal de chat WebSocket du widget: une connexion persistante par widget.
+
+Une seule connexion porte la reprise de session, les messages et la réponse
+en streaming: plus de connexion ni d'en-têtes HTTP par message. Le widget ne
+l'ouvre qu'au premier message; la session est reprise ou créée à ce moment,
+comme dans /session/chat (rien n'est lu ni créé à l'ouverture).
+
+Protocole (trames texte JSON):
+
+Client -> serveur
+- {"type": "message", "id": "...", "message": "...", "session_id": "..."}:
+  question (session_id facultatif: sinon celui de ?session_id=... ou du
+  message précédent); un seul message traité à la fois par connexion (sinon
+  erreur 409)
+- {"type": "reset"}: efface la session, la conversation repart de zéro
+- {"type": "ping"} / {"type": "pong"}: heartbeat
+
+Serveur -> client
+- {"type": "session", "session_id": null, "message_count": 0}: après un reset
+- {"type": "token", "id": ..., "text": "..."}: morceau de la réponse
+- {"type": "done", "id": ..., "response": ..., "session_id": ..., "message_count": n}
+- {"type": "error", "id": ..., "status": 4xx/5xx, "detail": ..., "retry_after": s}
+- {"type": "ping"} toutes les WS_HEARTBEAT_S secondes; sans aucune trame du
+  client pendant WS_IDLE_TIMEOUT_S, la connexion est fermée (1001)
+
+Contre-pression: les envois passent par une file lue par une seule tâche.
+Les tokens en attente y sont fusionnés en une trame: un client lent reçoit
+moins de trames, plus grosses, sans ralentir la génération. Un envoi bloqué
+plus de WS_SEND_TIMEOUT_S (client qui ne lit plus) ferme la connexion.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from metrics import WS_CONNECTIONS, WS_DISCONNECTS, WS_FIRST_TOKEN, WS_FRAMES
+
+logger = logging.getLogger(__name__)
+
+WS_HEARTBEAT_S = float(os.getenv("WS_HEARTBEAT_S", "25"))
+WS_IDLE_TIMEOUT_S = float(os.getenv("WS_IDLE_TIMEOUT_S", "75"))
+WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "10"))
+WS_MAX_FRAME_CHARS = int(os.getenv("WS_MAX_FRAME_CHARS", "8000"))
+
+CLIENT_FRAME_TYPES = {"message", "reset", "ping", "pong"}
+
+# Codes de fermeture (RFC 6455)
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# Marqueur dans la file d'envoi: tokens en attente à fusionner
+_TOKENS = object()
+
+
+class _Closing(Exception):
+    """Fin de connexion décidée par le serveur (heartbeat, client trop lent)."""
+
+    def __init__(self, reason: str, code: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.code = code
+
+
+class ChatSocket:
+    """Connexion WebSocket d'un widget: heartbeat, envois avec contre-pression,
+    un message traité à la fois par `handler(socket, frame)`."""
+
+    def __init__(self, websocket: WebSocket, handler: Callable[["ChatSocket", Dict], Awaitable[None]],
+                 client_ip: Optional[str] = None, session_id: Optional[str] = None):
+        self.websocket = websocket
+        self.handler = handler
+        self.client_ip = client_ip
+        self.session_id = session_id
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._tokens: List[str] = []
+        self._tokens_id = None
+        self._tokens_queued = False
+        self._message_started: Optional[float] = None
+        self._busy: Optional[asyncio.Task] = None
+        self._last_seen = time.monotonic()
+
+    # ------------------------------------------------------------
+    # Envois (non bloquants: file lue par _send_loop)
+    # ------------------------------------------------------------
+
+    def send(self, frame_type: str, **fields) -> None:
+        self._outbox.put_nowait({"type": frame_type, **fields})
+
+    def push_token(self, message_id, text: str) -> None:
+        """Ajoute un morceau de réponse; fusionné avec ceux pas encore envoyés."""
+        if not text:
+            return
+        if self._message_started is not None:
+            WS_FIRST_TOKEN.observe(time.perf_counter() - self._message_started)
+            self._message_started = None
+        self._tokens.append(text)
+        self._tokens_id = message_id
+        if not self._tokens_queued:
+            self._tokens_queued = True
+            self._outbox.put_nowait(_TOKENS)
+
+    def _take_tokens(self) -> Dict:
+        frame = {"type": "token", "id": self._tokens_id, "text": "".join(self._tokens)}
+        self._tokens.clear()
+        self._tokens_queued = False
+        return frame
+
+    async def _send_loop(self) -> None:
+        while True:
+            frame = await self._outbox.get()
+            if frame is _TOKENS:
+                frame = self._take_tokens()
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_text(json.dumps(frame, ensure_ascii=False)), WS_SEND_TIMEOUT_S
+                )
+            except asyncio.TimeoutError:
+                raise _Closing("slow_client", CLOSE_POLICY_VIOLATION) from None
+            WS_FRAMES.labels("out", frame["type"]).inc()
+
+    # ------------------------------------------------------------
+    # Réception et heartbeat
+    # ------------------------------------------------------------
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_S)
+            if time.monotonic() - self._last_seen > WS_IDLE_TIMEOUT_S:
+                raise _Closing("heartbeat", CLOSE_GOING_AWAY)
+            self.send("ping")
+
+    async def _receive_loop(self) -> None:
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            self._last_seen = time.monotonic()
+            raw = message.get("text")
+            if raw is None and message.get("bytes") is not None:
+                raw = message["bytes"].decode("utf-8", errors="replace")
+            self._dispatch(raw or "")
+
+    def _dispatch(self, raw: str) -> None:
+        if len(raw) > WS_MAX_FRAME_CHARS:
+            WS_FRAMES.labels("in", "too_large").inc()
+            self.send("error", id=None, status=413, detail="Message trop long.")
+            return
+        try:
+            frame = json.loads(raw)
+        except ValueError:
+            frame = None
+        if not isinstance(frame, dict) or frame.get("type") not in CLIENT_FRAME_TYPES:
+            WS_FRAMES.labels("in", "invalid").inc()
+            self.send("error", id=None, status=400, detail="Trame invalide.")
+            return
+
+        frame_type = frame["type"]
+        WS_FRAMES.labels("in", frame_type).inc()
+        if frame_type == "ping":
+            self.send("pong")
+        elif frame_type == "pong":
+            pass
+        elif self._busy is not None and not self._busy.done():
+            # Contre-pression côté client: une réponse à la fois
+            self.send("error", id=frame.get("id"), status=409, detail="Une réponse est déjà en cours.")
+        else:
+            if frame_type == "message":
+                self._message_started = time.perf_counter()
+            self._busy = asyncio.create_task(self._handle(frame))
+
+    async def _handle(self, frame: Dict) -> None:
+        try:
+            await self.handler(self, frame)
+        except Exception as e:
+            logger.exception(f"❌ WebSocket frame handling failed: {e}")
+            self.send("error", id=frame.get("id"), status=500, detail="Erreur lors du traitement du message.")
+        finally:
+            self._message_started = None
+
+    # ------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------
+
+    async def serve(self) -> None:
+        """Accepte la connexion et la sert jusqu'à sa fermeture.
+
+        Les trames déjà mises en file avec send() partent dès l'ouverture.
+        """
+        await self.websocket.accept()
+        WS_CONNECTIONS.inc()
+        reason, code = "client", None
+        tasks = [
+            asyncio.create_task(self._receive_loop()),
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._heartbeat_loop()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            error = next(iter(done)).exception()
+            if isinstance(error, _Closing):
+                reason, code = error.reason, error.code
+            elif error is not None and not isinstance(error, WebSocketDisconnect):
+                reason, code = "error", CLOSE_GOING_AWAY
+                logger.warning(f"⚠️ WebSocket connection error: {error!r}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Une réponse en cours va à son terme: la session reste cohérente
+            # (question et réponse enregistrées) pour une reprise à la reconnexion
+            WS_CONNECTIONS.dec()
+            WS_DISCONNECTS.labels(reason).inc()
+            if code is not None:
+                try:
+                    await asyncio.wait_for(self.websocket.close(code=code, reason=reason), WS_SEND_TIMEOUT_S)
+                except Exception:
+                    pass
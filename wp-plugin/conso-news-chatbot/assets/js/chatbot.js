@@ -2,7 +2,14 @@
  * Exemple d'intégration WordPress pour le chatbot Conso News
  * À ajouter dans un plugin WordPress ou via Custom HTML/JavaScript
  * 
- * Utilise le système de sessions pour maintenir l'historique
+ * Utilise le système de sessions pour maintenir l'historique.
+ * Une connexion WebSocket (/ws/chat) porte la reprise de session, les messages
+ * et la réponse en streaming; repli sur HTTP (/session/chat) si WebSocket est
+ * indisponible.
+ * 
+ * Aucun appel réseau avant le premier message: l'ID de session (UUID) est
+ * généré ici et envoyé avec chaque message, le serveur reprend la session ou
+ * la crée à ce moment.
  */
 
 (function() {
@@ -11,7 +18,14 @@
     // Configuration
     const CONFIG = {
         API_URL: 'http://localhost:8000',
-        SESSION_STORAGE_KEY: 'conso_news_chatbot_session'
+        SESSION_STORAGE_KEY: 'conso_news_chatbot_session',
+        // Échecs d'ouverture consécutifs avant de passer en HTTP
+        MAX_CONNECT_FAILURES: 3,
+        // Attente avant une nouvelle ouverture après un échec (doublée à chaque échec)
+        RECONNECT_MIN_MS: 1000,
+        RECONNECT_MAX_MS: 30000,
+        // Connexion considérée morte sans trame du serveur (ping toutes les 25 s)
+        SERVER_SILENCE_MS: 60000
     };
     
     let sessionId = null;
@@ -22,9 +36,23 @@
     class ConsoNewsChatbot {
         constructor(config) {
             this.apiUrl = config.API_URL;
+            this.wsUrl = config.API_URL.replace(/^http/, 'ws') + '/ws/chat';
             this.storageKey = config.SESSION_STORAGE_KEY;
-            this.sessionId = null;
+            this.config = config;
+            this.sessionId = localStorage.getItem(this.storageKey);
             this.isOpen = false;
+            this.markdownLoading = null;
+            
+            this.ws = null;
+            this.wsReady = false;
+            this.useHttp = !('WebSocket' in window);
+            this.connectFailures = 0;
+            this.reconnectDelay = config.RECONNECT_MIN_MS;
+            this.reconnectAt = 0;
+            this.outbox = [];
+            this.silenceTimer = null;
+            this.pending = null;
+            this.messageSeq = 0;
             
             this.init();
         }
@@ -32,18 +60,20 @@
         /**
          * Initialisation du chatbot
          */
-        async init() {
-            await this.loadMarkdownLibrary();
+        init() {
+            // Marked.js et le serveur ne sont contactés qu'au premier message
             this.createChatWidget();
-            await this.initSession();
             this.attachEventListeners();
         }
         
         /**
-         * Charger la bibliothèque Marked.js pour le rendu markdown
+         * Charger la bibliothèque Marked.js pour le rendu markdown (une fois)
          */
-        async loadMarkdownLibrary() {
-            return new Promise((resolve, reject) => {
+        loadMarkdownLibrary() {
+            if (this.markdownLoading) {
+                return this.markdownLoading;
+            }
+            this.markdownLoading = new Promise((resolve, reject) => {
                 // Vérifier si marked est déjà chargé
                 if (window.marked) {
                     resolve();
@@ -59,6 +89,7 @@
                 };
                 document.head.appendChild(script);
             });
+            return this.markdownLoading;
         }
         
         /**
@@ -466,40 +497,220 @@
         }
         
         /**
-         * Initialiser ou récupérer une session
+         * ID de la session, généré localement au premier message
+         */
+        ensureSessionId() {
+            if (!this.sessionId) {
+                this.setSessionId(this.generateUUID());
+            }
+            return this.sessionId;
+        }
+        
+        /**
+         * UUID v4 (crypto.randomUUID n'existe qu'en contexte sécurisé)
          */
-        async initSession() {
-            // Vérifier localStorage
-            const savedSessionId = localStorage.getItem(this.storageKey);
+        generateUUID() {
+            if (window.crypto && crypto.randomUUID) {
+                return crypto.randomUUID();
+            }
+            const bytes = crypto.getRandomValues(new Uint8Array(16));
+            bytes[6] = (bytes[6] & 0x0f) | 0x40;
+            bytes[8] = (bytes[8] & 0x3f) | 0x80;
+            const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+            return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+        }
+        
+        /**
+         * Ouvrir la connexion WebSocket (au premier message, puis à la demande)
+         */
+        connect() {
+            let opened = false;
+            const ws = new WebSocket(this.wsUrl);
+            this.ws = ws;
+            
+            ws.onopen = () => {
+                opened = true;
+                this.connectFailures = 0;
+                this.reconnectDelay = this.config.RECONNECT_MIN_MS;
+                this.wsReady = true;
+                this.watchSilence();
+                // Trames envoyées pendant l'ouverture
+                this.outbox.splice(0).forEach((frame) => this.sendFrame(frame));
+            };
             
-            if (savedSessionId) {
-                // Vérifier si la session est valide
+            ws.onmessage = (event) => {
+                this.watchSilence();
+                let frame;
                 try {
-                    const response = await fetch(`${this.apiUrl}/session/${savedSessionId}/info`);
-                    if (response.ok) {
-                        this.sessionId = savedSessionId;
-                        console.log('[Chatbot] Session existante chargée');
-                        return;
-                    }
+                    frame = JSON.parse(event.data);
                 } catch (error) {
-                    console.log('[Chatbot] Session expirée');
+                    return;
                 }
-            }
+                this.handleFrame(frame);
+            };
             
-            // Créer une nouvelle session
-            try {
-                const response = await fetch(`${this.apiUrl}/session/new`, {
-                    method: 'POST'
-                });
-                const data = await response.json();
-                this.sessionId = data.session_id;
+            ws.onclose = (event) => {
+                if (this.ws !== ws) return;
+                this.ws = null;
+                this.wsReady = false;
+                this.outbox = [];
+                clearTimeout(this.silenceTimer);
+                
+                if (!opened && ++this.connectFailures >= this.config.MAX_CONNECT_FAILURES) {
+                    console.warn('[Chatbot] WebSocket indisponible, repli sur HTTP');
+                    this.useHttp = true;
+                }
+                if (!opened || event.code === 1013) {
+                    // Échec ou serveur saturé: pas de nouvelle ouverture avant
+                    // reconnectDelay, les messages passent en HTTP d'ici là
+                    this.reconnectAt = Date.now() + this.reconnectDelay;
+                    this.reconnectDelay = Math.min(this.reconnectDelay * 2, this.config.RECONNECT_MAX_MS);
+                }
+                
+                if (this.pending && !opened) {
+                    // Connexion impossible: le message part en HTTP
+                    const message = this.pending.message;
+                    this.pending = null;
+                    this.sendMessageHttp(message);
+                } else if (this.pending) {
+                    // Réponse en cours perdue: elle reste enregistrée dans la session
+                    this.failPending('⚠️ Connexion interrompue. Veuillez réessayer.');
+                }
+            };
+        }
+        
+        /**
+         * Fermer une connexion silencieuse (réseau coupé sans fermeture propre)
+         */
+        watchSilence() {
+            clearTimeout(this.silenceTimer);
+            this.silenceTimer = setTimeout(() => {
+                if (this.ws) this.ws.close();
+            }, this.config.SERVER_SILENCE_MS);
+        }
+        
+        /**
+         * Envoyer une trame JSON sur la connexion
+         */
+        sendFrame(frame) {
+            if (!this.wsReady) {
+                this.outbox.push(frame);
+                return;
+            }
+            this.ws.send(JSON.stringify(frame));
+        }
+        
+        /**
+         * Traiter une trame du serveur
+         */
+        handleFrame(frame) {
+            switch (frame.type) {
+                case 'session':
+                    // Confirmation d'un reset, déjà appliqué localement
+                    break;
+                case 'ping':
+                    this.sendFrame({ type: 'pong' });
+                    break;
+                case 'token':
+                    if (this.pending && frame.id === this.pending.id) {
+                        this.appendToken(frame.text);
+                    }
+                    break;
+                case 'done':
+                    if (this.pending && frame.id === this.pending.id) {
+                        this.setSessionId(frame.session_id);
+                        // La réponse complète fait foi
+                        this.pending.text = frame.response;
+                        this.renderPending();
+                        this.finishPending();
+                    }
+                    break;
+                case 'error':
+                    if (this.pending && (frame.id === this.pending.id || frame.id === null)) {
+                        this.failPending(this.errorMessage(frame));
+                    }
+                    break;
+            }
+        }
+        
+        /**
+         * Mémoriser l'id de session (null: aucune session côté serveur)
+         */
+        setSessionId(sessionId) {
+            this.sessionId = sessionId || null;
+            if (this.sessionId) {
                 localStorage.setItem(this.storageKey, this.sessionId);
-                console.log('[Chatbot] Nouvelle session créée');
-            } catch (error) {
-                console.error('[Chatbot] Erreur création session:', error);
+            } else {
+                localStorage.removeItem(this.storageKey);
+            }
+        }
+        
+        /**
+         * Ajouter un morceau de réponse (rendu au plus une fois par frame d'affichage)
+         */
+        appendToken(text) {
+            const pending = this.pending;
+            if (!pending.content) {
+                this.hideTyping();
+                pending.content = this.addMessage('assistant', '');
+            }
+            pending.text += text;
+            if (!pending.renderScheduled) {
+                pending.renderScheduled = true;
+                requestAnimationFrame(() => {
+                    pending.renderScheduled = false;
+                    if (this.pending === pending) this.renderPending();
+                });
             }
         }
         
+        /**
+         * Afficher le texte reçu de la réponse en cours
+         */
+        renderPending() {
+            const pending = this.pending;
+            this.hideTyping();
+            if (!pending.content) {
+                pending.content = this.addMessage('assistant', pending.text);
+                return;
+            }
+            pending.content.innerHTML = this.renderContent('assistant', pending.text);
+            const messagesContainer = document.getElementById('conso-chatbot-messages');
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+        
+        /**
+         * Terminer la réponse en cours et réactiver la saisie
+         */
+        finishPending() {
+            this.pending = null;
+            const input = document.getElementById('conso-chatbot-input');
+            input.disabled = false;
+            input.focus();
+        }
+        
+        /**
+         * Remplacer la réponse en cours par un message d'erreur
+         */
+        failPending(message) {
+            this.hideTyping();
+            if (this.pending.content) {
+                this.pending.content.parentElement.remove();
+            }
+            this.addMessage('assistant', message);
+            this.finishPending();
+        }
+        
+        /**
+         * Message affiché pour une trame d'erreur
+         */
+        errorMessage(frame) {
+            if (frame.status === 429 || frame.status === 503 || frame.status === 504) {
+                return `⏳ ${frame.detail}`;
+            }
+            return '❌ Désolé, une erreur est survenue. Veuillez réessayer.';
+        }
+        
         /**
          * Attacher les event listeners
          */
@@ -540,25 +751,31 @@
             const messageDiv = document.createElement('div');
             messageDiv.className = `conso-chatbot-message ${role}`;
             
+            const htmlContent = this.renderContent(role, content);
+            
+            messageDiv.innerHTML = `
+                <div class="conso-chatbot-message-content">${htmlContent}</div>
+            `;
+            messagesContainer.appendChild(messageDiv);
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            return messageDiv.querySelector('.conso-chatbot-message-content');
+        }
+        
+        /**
+         * HTML d'un message (markdown pour l'assistant)
+         */
+        renderContent(role, content) {
             // Parser le markdown pour les messages de l'assistant
-            let htmlContent;
             if (role === 'assistant' && window.marked) {
                 // Configurer marked
                 window.marked.setOptions({
                     breaks: true,
                     gfm: true,
                 });
-                htmlContent = window.marked.parse(content);
-            } else {
-                // Texte brut pour les utilisateurs ou fallback
-                htmlContent = this.escapeHtml(content);
+                return window.marked.parse(content);
             }
-            
-            messageDiv.innerHTML = `
-                <div class="conso-chatbot-message-content">${htmlContent}</div>
-            `;
-            messagesContainer.appendChild(messageDiv);
-            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            // Texte brut pour les utilisateurs ou fallback
+            return this.escapeHtml(content);
         }
         
         /**
@@ -603,6 +820,33 @@
             // Afficher typing indicator
             this.showTyping();
             
+            this.loadMarkdownLibrary();
+            this.ensureSessionId();
+            
+            if (this.useHttp || (!this.ws && Date.now() < this.reconnectAt)) {
+                await this.sendMessageHttp(message);
+                return;
+            }
+            
+            this.pending = {
+                id: `m${++this.messageSeq}`,
+                message: message,
+                text: '',
+                content: null,
+                renderScheduled: false
+            };
+            if (!this.ws) {
+                this.connect();
+            }
+            this.sendFrame({ type: 'message', id: this.pending.id, message: message, session_id: this.sessionId });
+        }
+        
+        /**
+         * Envoyer un message par HTTP (WebSocket indisponible)
+         */
+        async sendMessageHttp(message) {
+            const input = document.getElementById('conso-chatbot-input');
+            
             try {
                 const response = await fetch(`${this.apiUrl}/session/chat`, {
                     method: 'POST',
@@ -625,8 +869,7 @@
                 
                 // Mettre à jour session_id si nécessaire
                 if (data.session_id !== this.sessionId) {
-                    this.sessionId = data.session_id;
-                    localStorage.setItem(this.storageKey, this.sessionId);
+                    this.setSessionId(data.session_id);
                 }
                 
                 // Afficher la réponse
@@ -650,8 +893,19 @@
                 return;
             }
             
-            // Supprimer la session actuelle
-            if (this.sessionId) {
+            // Réponse en cours abandonnée: le serveur n'accepte pas d'autre
+            // trame avant de l'avoir terminée, on repart d'une connexion neuve
+            const abandoned = this.pending !== null;
+            if (abandoned) {
+                this.hideTyping();
+                this.finishPending();
+                if (this.ws) this.ws.close();
+            }
+            
+            // Supprimer la session actuelle (aucun appel si aucun message envoyé)
+            if (this.wsReady && !abandoned) {
+                this.sendFrame({ type: 'reset' });
+            } else if (this.sessionId) {
                 try {
                     await fetch(`${this.apiUrl}/session/${this.sessionId}`, {
                         method: 'DELETE'
@@ -663,8 +917,7 @@
             }
             
             // Nettoyer localStorage et session
-            localStorage.removeItem(this.storageKey);
-            this.sessionId = null;
+            this.setSessionId(null);
             
             // Vider l'affichage des messages
             const messagesContainer = document.getElementById('conso-chatbot-messages');
@@ -676,9 +929,6 @@
                 </div>
             `;
             
-            // Créer une nouvelle session
-            await this.initSession();
-            
             console.log('[Chatbot] Nouvelle conversation démarrée');
             document.getElementById('conso-chatbot-input').focus();
         }